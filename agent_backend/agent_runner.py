@@ -0,0 +1,182 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+
+from cache import response_cache, agent_cache_key, is_cacheable
+from singleflight import SingleFlight
+from llm_limiter import llm_limiter, estimate_tokens
+from metrics import AGENT_CALLS, AGENT_RUN_SECONDS, AGENT_TOKENS, current_endpoint
+from model_router import model_router
+from openai_client import openai_clients
+from deadline import current_deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Share one in-flight call between concurrent identical agent requests
+COALESCE_AGENT_CALLS = os.getenv("CRAMPLAN_COALESCE_AGENT_CALLS", "true").lower() in ("1", "true", "yes")
+
+agent_calls = SingleFlight()
+
+_llm_main = None
+
+
+def _import_agents():
+    module = importlib.import_module("llm_main")
+    try:
+        openai_clients.install()
+    except Exception as e:
+        # e.g. no API key: leave the SDK default, which reports the same error per call
+        logger.warning(f"Shared OpenAI client not installed: {str(e)}")
+    return module
+
+
+async def load_agents():
+    """
+    Return the llm_main module, importing it on first use and pointing its agents at the
+    shared OpenAI client. It pulls in the agents SDK and the openai types, most of the
+    API's import time, so the import runs in a thread rather than at startup or on the
+    event loop.
+    """
+    global _llm_main
+    if _llm_main is None:
+        _llm_main = await asyncio.to_thread(_import_agents)
+    return _llm_main
+
+
+async def resolve_agent(agent):
+    """
+    Agents can be given by their name in llm_main, so callers don't import it up front.
+    """
+    if isinstance(agent, str):
+        return getattr(await load_agents(), agent)
+    return agent
+
+
+def record_usage(agent, endpoint: str, tier: str, result) -> None:
+    """
+    Count the tokens a run used, as reported by the SDK.
+    """
+    usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+    if usage is None:
+        return
+    AGENT_TOKENS.inc(usage.input_tokens or 0, agent=agent.name, endpoint=endpoint, tier=tier, direction="input")
+    AGENT_TOKENS.inc(usage.output_tokens or 0, agent=agent.name, endpoint=endpoint, tier=tier, direction="output")
+
+
+async def run_agent(agent, input_prompt: str):
+    """
+    Run an agent (or the llm_main agent of that name) and return its validated final_output.
+
+    Cacheable agents are looked up in the response cache first; hits return the
+    stored pydantic object without another LLM round trip or re-validation.
+    Concurrent identical calls (same agent and normalized input) share one
+    in-flight Runner.run. The call runs on the agent's model tier (see model_router)
+    and, inside a request with a deadline, raises DeadlineExceeded when it runs out.
+    """
+    llm_main = await load_agents()
+    agent = await resolve_agent(agent)
+    cache_key = agent_cache_key(agent, input_prompt)
+    cacheable = is_cacheable(agent)
+    endpoint = current_endpoint.get()
+    if cacheable:
+        cached = await response_cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"Response cache hit for {agent.name}")
+            AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="cache_hit")
+            return cached
+
+    async def routed_run():
+        return await model_router.run(llm_main.Runner.run, agent, input_prompt, endpoint)
+
+    async def invoke():
+        try:
+            result, tier = await llm_limiter.run(agent, input_prompt, routed_run)
+        except asyncio.CancelledError:
+            # Nobody is waiting any more (e.g. the client disconnected)
+            AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="cancelled")
+            raise
+        except Exception:
+            AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="error")
+            raise
+        AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="ok")
+        record_usage(agent, endpoint, tier, result)
+        final_output = result.final_output
+        if cacheable:
+            await response_cache.aset(cache_key, final_output)
+        return final_output
+
+    async def call():
+        if not COALESCE_AGENT_CALLS:
+            return await invoke()
+        return await agent_calls.do(cache_key, invoke)
+
+    deadline = current_deadline.get()
+    if deadline is None:
+        return await call()
+    deadline.check(agent.name)
+    # Only this caller gives up at its deadline; a coalesced call keeps running for the others
+    try:
+        async with asyncio.timeout(deadline.remaining()) as timeout:
+            return await call()
+    except TimeoutError:
+        if not timeout.expired():
+            raise
+        raise DeadlineExceeded(f"Request deadline of {deadline.budget:g}s exceeded during {agent.name}")
+
+
+async def stream_agent(agent, input_prompt: str):
+    """
+    Run an agent (or the llm_main agent of that name) in streaming mode.
+
+    Yields ("response_created", None) when the model starts a response,
+    ("delta", text) for every output text delta and finally ("final", final_output).
+    Cache hits yield only the final event. Streams run on the agent's tier without
+    SLO failover, since deltas may already have reached the client.
+    """
+    llm_main = await load_agents()
+    agent = await resolve_agent(agent)
+    cache_key = None
+    endpoint = current_endpoint.get()
+    if is_cacheable(agent):
+        cache_key = agent_cache_key(agent, input_prompt)
+        cached = await response_cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"Response cache hit for {agent.name}")
+            AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="cache_hit")
+            yield "final", cached
+            return
+
+    # Streams hold their admission slot for the whole stream and are not retried,
+    # since deltas may already have reached the client
+    async with llm_limiter.admit(agent, estimate_tokens(agent, input_prompt)):
+        tier = model_router.route(agent.name)["tier"]
+        start = time.perf_counter()
+        result = llm_main.Runner.run_streamed(model_router.agent_for(agent, tier), input_prompt)
+        try:
+            async for event in result.stream_events():
+                if event.type != "raw_response_event":
+                    continue
+                if isinstance(event.data, llm_main.ResponseTextDeltaEvent):
+                    yield "delta", event.data.delta
+                elif isinstance(event.data, llm_main.ResponseCreatedEvent):
+                    yield "response_created", None
+        except asyncio.CancelledError:
+            AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="cancelled")
+            raise
+        except Exception:
+            AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="error")
+            raise
+        finally:
+            AGENT_RUN_SECONDS.observe(time.perf_counter() - start, agent=agent.name, endpoint=endpoint, tier=tier)
+            if not result.is_complete:
+                result.cancel()
+
+    AGENT_CALLS.inc(agent=agent.name, endpoint=endpoint, outcome="ok")
+    model_router.record(agent.name, endpoint, tier, fallback=False)
+    record_usage(agent, endpoint, tier, result)
+    final_output = result.final_output
+    if cache_key is not None:
+        await response_cache.aset(cache_key, final_output)
+    yield "final", final_output
@@ -1,27 +1,46 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 import asyncio
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
 import logging
-import io
+import uuid
+import os
+import json
 
 # Import environment setup to ensure it's loaded
 import env_setup
 
-# Import specific components from llm_main
-from llm_main import (
-    main_topic_outline_agent, 
-    open_quiz_agent, 
-    content_writer_agent,
-    curated_topic_outline_agent,
-    evaluate_quiz_understanding,
-    Runner
-)
+# The agents' output types, which the request/response models below are built from
+from schemas import Topic, QuizQuestions as QuizQuestion, ContentMain
+
+# Agent invocation (response cache, etc.). Agents are passed by name: llm_main and the
+# agents SDK behind it are imported on first use, keeping them out of cold start.
+from agent_runner import agent_calls
+from llm_limiter import llm_limiter, LLMOverloaded
+from openai_client import openai_clients
+from model_router import model_router
+from hedging import hedger
+from cache import response_cache, pdf_cache, content_hash
+from quiz_evaluation import evaluate_quiz_batch
+from session_store import session_store
+from jobs import job_manager, Job, JobQueueFull
+from content_generation import trim_subtopics, topic_buckets, topic_key, section_key, PARALLEL_CONTENT_DEFAULT
+from streaming import stream_content_events, sse_event, error_event, SSE_HEADERS
+from question_bank import question_bank
+from speculation import content_speculator, SPECULATIVE_CONTENT_DEFAULT
+from metrics import registry as metrics_registry, MetricsMiddleware, FLOW_STAGES_CANCELLED, FLOW_DEGRADATIONS, current_endpoint
+from disconnect import cancel_on_disconnect, CLIENT_CLOSED_REQUEST
+from deadline import Deadline, DeadlineExceeded, DEADLINE_HEADER, current_deadline, parse_deadline, skip_curation, content_targets
+from prewarm import prewarm, prewarm_state, PREWARM_ENABLED
+from serialization import FastJSONResponse
+import pipeline
 
 # Import PDF generation utilities
-from pdf_generator import markdown_to_html, html_to_pdf, generate_content_markdown
+from pdf_generator import markdown_to_html, content_to_html, iter_content_html
+from pdf_renderer import pdf_renderer, render_pdf_cached, pdf_cache_key, RenderQueueFull, RenderTimeout, RENDER_WARM_UP
 
 # Set up logging
 logging.basicConfig(
@@ -30,7 +49,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="CramPlan API", description="API for generating learning content based on user understanding")
+# Stages of the complete flow, as reported in job progress
+FLOW_STAGES = ["topics", "quiz", "evaluate", "curate", "content"]
+
+# Size of the chunks PDF responses are streamed in
+PDF_STREAM_CHUNK_SIZE = int(os.getenv("CRAMPLAN_PDF_STREAM_CHUNK_SIZE", str(64 * 1024)))
+
+async def start_render_pool():
+    try:
+        await pdf_renderer.start()
+    except Exception as e:
+        logger.warning(f"PDF render pool warm-up failed: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    eviction_task = asyncio.create_task(session_store.run_eviction())
+    # Cancel speculative content for sessions that expire or are deleted
+    session_store.add_expiry_listener(content_speculator.discard)
+    job_manager.start()
+    # Warm-up runs in the background so the app answers /health as soon as it's imported
+    startup_tasks = []
+    if RENDER_WARM_UP:
+        # Spawn the render workers now; each one parses the stylesheet and loads fonts once
+        startup_tasks.append(asyncio.create_task(start_render_pool()))
+    if PREWARM_ENABLED:
+        # Import the lazily loaded modules before the first request needs them
+        startup_tasks.append(asyncio.create_task(prewarm()))
+    yield
+    for task in startup_tasks:
+        task.cancel()
+    await job_manager.stop()
+    eviction_task.cancel()
+    content_speculator.shutdown()
+    # Stop the PDF render workers
+    pdf_renderer.shutdown()
+    # Close the shared OpenAI connection pool
+    await openai_clients.aclose()
+
+app = FastAPI(title="CramPlan API", description="API for generating learning content based on user understanding", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -39,8 +95,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Degradations"],  # Lets the frontend see how a flow was cut to its deadline
 )
 
+# Per-request latency/status metrics, and endpoint labels for the work each request does
+app.add_middleware(MetricsMiddleware)
+
 class TopicRequest(BaseModel):
     subject: str
 
@@ -51,218 +111,630 @@ class QuizAnswer(BaseModel):
 class QuizSubmission(BaseModel):
     answers: List[QuizAnswer]
 
-class Topic(BaseModel):
-    topic: str
-    description: str
-    subtopics: List[str]
-
+# Request/response bodies. Their items are the agents' own output types (schemas), so
+# the pipeline's objects pass between stages and into responses without conversion.
 class TopicResponse(BaseModel):
     list_of_topics: List[Topic]
-
-class QuizQuestion(BaseModel):
-    topic: str
-    quiz_question: str
-    choice_a: str
-    choice_b: str
-    choice_c: str
-    choice_d: str
-    correct_answer: str
+    session_id: Optional[str] = None
 
 class QuizResponse(BaseModel):
     list_quiz_questions: List[QuizQuestion]
 
-class ContentSub(BaseModel):
-    sub_topic_title: str
-    sub_content_text: str
-
-class ContentMain(BaseModel):
-    topic_title: str
-    main_description: str
-    subtopics: List[ContentSub]
-
 class ContentResponse(BaseModel):
     topic: List[ContentMain]
+    # Set by regenerate mode: titles of the sections served from storage / written again
+    reused_sections: Optional[List[str]] = None
+    regenerated_sections: Optional[List[str]] = None
 
 class UnderstandingScore(BaseModel):
     scores: Dict[str, float]
 
+class BatchQuizSubmission(BaseModel):
+    quiz: QuizResponse
+    submissions: List[QuizSubmission]
+
+class BatchUnderstandingScore(BaseModel):
+    results: List[UnderstandingScore]
+    cohort_scores: Dict[str, float]
+
 class MarkdownContent(BaseModel):
     content: str
     title: Optional[str] = "Study Plan"
 
+async def iter_chunks(data: bytes, chunk_size: int = PDF_STREAM_CHUNK_SIZE):
+    """
+    Yield zero-copy slices of a rendered document for streaming.
+    """
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header (list, weak validators or *) against an ETag.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+async def pdf_response(http_request: Request, html_content: str, filename: str):
+    """
+    Return the PDF for the given HTML with an ETag, or 304 if the client already has it.
+    """
+    etag = f'"{pdf_cache_key(html_content)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    pdf_bytes = await render_pdf_cached(html_content)
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    headers["Content-Length"] = str(len(pdf_bytes))
+    return StreamingResponse(
+        iter_chunks(pdf_bytes),
+        media_type="application/pdf",
+        headers=headers
+    )
+
+async def load_session(session_id: Optional[str]) -> dict:
+    """
+    Load a session's stored artifacts (empty when no session_id was given).
+    """
+    if session_id is None:
+        return {}
+    session = await session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found or expired")
+    return session
+
+def require_input(value, name: str):
+    if value is None:
+        raise HTTPException(status_code=400, detail=f"Missing {name}: send it in the request body or pass a session_id that already has it")
+    return value
+
 @app.post("/generate-topics", response_model=TopicResponse)
-async def generate_topics(request: TopicRequest):
+async def generate_topics(request: TopicRequest, session: bool = True, speculate: Optional[bool] = None):
+    """
+    Generate topics for a subject. Unless session=false, the topics are stored in a new
+    server-side session whose session_id is returned for use by the later endpoints.
+    With speculate=true, the session's content starts generating in the background
+    while the student takes the quiz.
+    """
     try:
-        logger.info(f"Generating topics for subject: {request.subject}")
-        # Create an agent and generate topics
-        input_prompt = request.subject
-
-        main_topic_result = await Runner.run(
-            main_topic_outline_agent,
-            input_prompt,
-        )
-        
-        logger.info(f"Generated {len(main_topic_result.final_output.list_of_topics)} topics")
-        return main_topic_result.final_output
+        main_topic_result = await pipeline.outline_topics(request.subject)
+        session_id = None
+        if session:
+            session_id = await session_store.create(subject=request.subject, topics=main_topic_result)
+            if speculate if speculate is not None else SPECULATIVE_CONTENT_DEFAULT:
+                content_speculator.start(session_id, main_topic_result.list_of_topics)
+        return FastJSONResponse(TopicResponse.model_construct(list_of_topics=main_topic_result.list_of_topics, session_id=session_id))
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating topics: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error generating topics: {str(e)}")
 
 @app.post("/generate-quiz", response_model=QuizResponse)
-async def generate_quiz(topics: TopicResponse):
+async def generate_quiz(topics: Optional[TopicResponse] = None, session_id: Optional[str] = None, fresh: bool = False):
+    """
+    Generate a quiz for the topics. Questions come from the question bank where it covers
+    a topic; the quiz agent only writes questions for the rest (or all of them if fresh=true).
+    """
     try:
-        logger.info(f"Generating quiz for {len(topics.list_of_topics)} topics")
-        # Format topics into string
-        topics_string = "\n".join(
-            f"{i+1}. {topic.topic}\n   Description: {topic.description}\n   Subtopics: {', '.join(topic.subtopics)}" 
-            for i, topic in enumerate(topics.list_of_topics)
-        )
-        
-        # Generate quiz questions
-        quiz_result = await Runner.run(
-            open_quiz_agent,
-            f"Here are the topics:\n{topics_string}"
-        )
-        logger.info(f"Generated {len(quiz_result.final_output.list_quiz_questions)} quiz questions")
-        return quiz_result.final_output
+        session = await load_session(session_id)
+        topics = require_input(topics or session.get("topics"), "topics")
+        quiz_result = await pipeline.write_quiz(topics.list_of_topics, fresh=fresh)
+        if session_id:
+            await session_store.update(session_id, quiz=quiz_result)
+        return FastJSONResponse(quiz_result)
+    except HTTPException:
+        raise
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating quiz: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
 @app.post("/evaluate-quiz", response_model=UnderstandingScore)
-async def evaluate_quiz(topics: TopicResponse, quiz: QuizResponse, submission: QuizSubmission):
+async def evaluate_quiz(submission: QuizSubmission, topics: Optional[TopicResponse] = None, quiz: Optional[QuizResponse] = None, session_id: Optional[str] = None):
     try:
-        logger.info(f"Evaluating quiz with {len(submission.answers)} answers")
-        # Convert submission format
-        user_answers = [{"question_index": ans.question_index, "answer": ans.answer} 
-                       for ans in submission.answers]
-        
-        # Evaluate quiz
-        understanding_scores = evaluate_quiz_understanding(quiz, user_answers)
-        logger.info(f"Evaluated understanding for {len(understanding_scores)} topics")
-        return {"scores": understanding_scores}
+        session = await load_session(session_id)
+        quiz = require_input(quiz or session.get("quiz"), "quiz")
+        understanding = UnderstandingScore(scores=pipeline.score_quiz(quiz, submission.answers))
+        if session_id:
+            await session_store.update(session_id, scores=understanding)
+        return FastJSONResponse(understanding)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error evaluating quiz: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error evaluating quiz: {str(e)}")
 
+@app.post("/evaluate-quiz/batch", response_model=BatchUnderstandingScore)
+async def evaluate_quiz_batch_endpoint(batch: BatchQuizSubmission):
+    """
+    Score a whole cohort's submissions against one quiz in a single call.
+    """
+    try:
+        logger.info(f"Evaluating {len(batch.submissions)} quiz submissions")
+        submissions = [
+            [{"question_index": ans.question_index, "answer": ans.answer} for ans in submission.answers]
+            for submission in batch.submissions
+        ]
+        results, cohort_scores = evaluate_quiz_batch(batch.quiz, submissions)
+        logger.info(f"Evaluated {len(results)} submissions across {len(cohort_scores)} topics")
+        return {"results": [{"scores": scores} for scores in results], "cohort_scores": cohort_scores}
+    except Exception as e:
+        logger.error(f"Error evaluating quiz batch: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error evaluating quiz batch: {str(e)}")
+
 @app.post("/generate-content", response_model=ContentResponse)
-async def generate_content(topics: TopicResponse, understanding: UnderstandingScore):
+async def generate_content(topics: Optional[TopicResponse] = None, understanding: Optional[UnderstandingScore] = None, parallel: Optional[bool] = None, session_id: Optional[str] = None, regenerate: bool = False):
+    """
+    Generate the study content. Each section is pitched at the student's understanding
+    bucket for its topic and stored in the session. With regenerate=true (e.g. after a
+    quiz retake), sections whose topic and bucket are unchanged are reused from the
+    session and only the others are written again.
+    """
     try:
-        logger.info(f"Generating content for {len(topics.list_of_topics)} topics")
-        # Format topics and understanding scores
-        topics_string = "\n".join(
-            f"{i+1}. {topic.topic}\n   Description: {topic.description}\n   Subtopics: {', '.join(topic.subtopics)}" 
-            for i, topic in enumerate(topics.list_of_topics)
-        )
-        understanding_summary = "\nUnderstanding by Topic:\n"
-        understanding_summary += "\n".join(
-            f"{topic}: {score:.1f}%" 
-            for topic, score in understanding.scores.items()
-        )
-        
-        # Generate content
-        content_result = await Runner.run(
-            content_writer_agent,
-            f"""Here are the topics to write content for:\n{topics_string}
-You need to output the main content, its description and the subtopics with the content for each subtopic."""
-        )
-        logger.info(f"Generated content with {len(content_result.final_output.topic)} sections")
-        return content_result.final_output
+        session = await load_session(session_id)
+        # Prefer the curated topics when the session has them
+        topics = require_input(topics or session.get("curated_topics") or session.get("topics"), "topics")
+        understanding = understanding or session.get("scores") or UnderstandingScore(scores={})
+        if parallel is None:
+            parallel = PARALLEL_CONTENT_DEFAULT
+        # Sections pre-generated for this session's topics, if it speculated
+        prefetched = content_speculator.claim(session_id, topics.list_of_topics) if session_id else {}
+        if not (parallel or prefetched or regenerate):
+            content_result = await pipeline.write_content(topics.list_of_topics, parallel=False)
+            if session_id:
+                await session_store.update(session_id, content=content_result)
+            return FastJSONResponse(ContentResponse.model_construct(topic=content_result.topic))
+
+        buckets = topic_buckets(topics.list_of_topics, understanding.scores)
+        sections = dict(session.get("sections") or {})
+        stored = sections if regenerate else {}
+        reused = [topic for topic in topics.list_of_topics if section_key(topic, buckets[topic_key(topic)]) in stored]
+        # One agent call per topic, run concurrently and reassembled in curated order
+        content_result = await pipeline.write_content(topics.list_of_topics, buckets=buckets, prefetched=prefetched, stored=stored)
+        logger.info(f"Reused {len(reused)} stored sections")
+        if session_id:
+            for topic, section in zip(topics.list_of_topics, content_result.topic):
+                key = topic_key(topic)
+                # Speculative sections were written before the scores were known
+                bucket = None if key in prefetched and topic not in reused else buckets[key]
+                sections[section_key(topic, bucket)] = section
+            await session_store.update(session_id, content=content_result, sections=sections)
+        if not regenerate:
+            return FastJSONResponse(ContentResponse.model_construct(topic=content_result.topic))
+        return FastJSONResponse(ContentResponse.model_construct(
+            topic=content_result.topic,
+            reused_sections=[topic.topic for topic in reused],
+            regenerated_sections=[topic.topic for topic in topics.list_of_topics if topic not in reused],
+        ))
+    except HTTPException:
+        raise
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating content: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error generating content: {str(e)}")
 
 @app.post("/curate-topics", response_model=TopicResponse)
-async def curate_topics(request: TopicRequest, understanding: UnderstandingScore):
+async def curate_topics(request: Optional[TopicRequest] = None, understanding: Optional[UnderstandingScore] = None, session_id: Optional[str] = None):
     try:
-        logger.info(f"Curating topics for subject: {request.subject}")
-        # Format understanding scores
-        understanding_string = "\n".join(
-            f"{topic}: {score:.1f}%" 
-            for topic, score in understanding.scores.items()
-        )
-        
-        # Generate curated topics
-        curated_result = await Runner.run(
-            curated_topic_outline_agent,
-            f"Here is the main topic:\n{request.subject}\nHere is the understanding of the topic:\n{understanding_string}"
-        )
-        
-        logger.info(f"Curated {len(curated_result.final_output.list_of_topics)} topics")
-        return curated_result.final_output
+        session = await load_session(session_id)
+        subject = require_input(request.subject if request else session.get("subject"), "subject")
+        understanding = require_input(understanding or session.get("scores"), "understanding")
+        curated_result = await pipeline.curate_outline(subject, understanding.scores)
+        if session_id:
+            await session_store.update(session_id, curated_topics=curated_result)
+            # Stop pre-generating sections for topics curation dropped or changed
+            content_speculator.retain(session_id, curated_result.list_of_topics)
+        return FastJSONResponse(TopicResponse.model_construct(list_of_topics=curated_result.list_of_topics))
+    except HTTPException:
+        raise
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error curating topics: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error curating topics: {str(e)}")
 
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """
+    Return everything stored for a session.
+    """
+    session = await load_session(session_id)
+    return FastJSONResponse({"session_id": session_id, **{field: value for field, value in session.items() if value is not None}})
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    await session_store.delete(session_id)
+    return {"session_id": session_id, "deleted": True}
+
+def readiness_checks() -> dict:
+    """
+    Whether each subsystem can take more work, from the same signals /metrics exports.
+    """
+    job_stats = job_manager.get_stats()
+    return {
+        "job_workers": job_manager.running,
+        "job_queue": job_stats["queued"] < job_stats["max_queued"],
+        "render_queue": pdf_renderer.pending < pdf_renderer.workers + pdf_renderer.max_queue,
+        "llm_admission": all(waiting < llm_limiter.max_waiting for waiting in llm_limiter.get_stats()["waiting"].values()),
+    }
+
+metrics_registry.gauge("cramplan_render_pending", "PDF renders running or queued.", lambda: pdf_renderer.pending)
+metrics_registry.gauge("cramplan_jobs_queued", "Background jobs waiting for a worker.", lambda: job_manager.get_stats()["queued"])
+metrics_registry.gauge("cramplan_llm_waiting", "Agent calls waiting for a concurrency slot.", lambda: sum(llm_limiter.get_stats()["waiting"].values()))
+metrics_registry.gauge("cramplan_openai_connections_active", "OpenAI connections with a request in flight.", lambda: openai_clients.get_stats().get("active_connections", 0))
+metrics_registry.gauge("cramplan_openai_connections_idle", "Idle keep-alive OpenAI connections.", lambda: openai_clients.get_stats().get("idle_connections", 0))
+metrics_registry.gauge("cramplan_openai_requests_queued", "OpenAI requests waiting for a pooled connection.", lambda: openai_clients.get_stats().get("queued_requests", 0))
+metrics_registry.gauge("cramplan_openai_connections_opened", "OpenAI connections opened since start (TCP/TLS handshakes).", lambda: openai_clients.stats["connections_opened"])
+metrics_registry.gauge("cramplan_ready", "1 when every readiness check passes.", lambda: int(all(readiness_checks().values())))
+
 @app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
+async def health_check(response: Response, ready: bool = False):
+    """
+    Liveness plus readiness. With ready=true, answers 503 while any readiness check
+    fails so it can be used as a readiness probe.
+    """
+    checks = readiness_checks()
+    is_ready = all(checks.values())
+    if ready and not is_ready:
+        response.status_code = 503
+    return {"status": "healthy", "ready": is_ready, "checks": checks, "prewarm": prewarm_state}
 
-# Example of a complete flow endpoint
-@app.post("/complete-flow", response_model=Dict)
-async def complete_flow(request: TopicRequest, quiz_submission: QuizSubmission):
+@app.get("/metrics")
+async def metrics():
+    """
+    Metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "response_cache": response_cache.get_stats(),
+        "pdf_cache": pdf_cache.get_stats(),
+        "agent_call_coalescing": agent_calls.get_stats(),
+        "question_bank": await asyncio.to_thread(question_bank.get_stats) if question_bank is not None else None,
+    }
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return {**llm_limiter.get_stats(), "http_pool": openai_clients.get_stats(), "routing": model_router.get_stats(),
+            "hedging": hedger.get_stats()}
+
+@app.get("/speculation/stats")
+async def speculation_stats():
+    return content_speculator.get_stats()
+
+@app.get("/render/stats")
+async def render_stats():
+    return pdf_renderer.get_stats()
+
+def request_deadline(http_request: Request, deadline: Optional[float]) -> Optional[Deadline]:
+    """
+    The deadline a request asked for (query parameter or header), or the configured default.
+    """
+    try:
+        return parse_deadline(http_request.headers.get(DEADLINE_HEADER), deadline)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def flow_checkpoint_key(request: TopicRequest, quiz_submission: QuizSubmission) -> str:
+    """
+    Response cache key for the stages a cancelled complete flow already finished.
+    """
+    payload = json.dumps({"flow": request.model_dump(), "submission": quiz_submission.model_dump()}, sort_keys=True)
+    return content_hash(payload)
+
+async def run_complete_flow(request: TopicRequest, quiz_submission: QuizSubmission, job: Optional[Job] = None,
+                            deadline: Optional[Deadline] = None) -> dict:
+    """
+    Run every pipeline stage in order, reporting per-stage progress on `job` when given.
+    When the flow is cancelled (e.g. the client disconnected) the stages it finished are
+    checkpointed in the response cache, and a retry of the same request resumes after them.
+
+    With a `deadline`, every agent call gives up when it passes (DeadlineExceeded), and
+    the flow degrades to fit what's left: curation is skipped, then content is written
+    shorter and with fewer subtopics. The result lists the degradations applied.
+    """
+    logger.info(f"Starting complete flow for subject: {request.subject}")
+    deadline_token = current_deadline.set(deadline)
+    degradations = []
+    checkpoint_key = flow_checkpoint_key(request, quiz_submission)
+    finished = await response_cache.aget(checkpoint_key) or {}
+    resumed = bool(finished)
+    if resumed:
+        logger.info(f"Resuming complete flow after: {', '.join(finished)}")
+    stage = "topics"
     try:
-        logger.info(f"Starting complete flow for subject: {request.subject}")
-        
         # 1. Generate topics
         logger.info("Step 1: Generating topics")
-        topics_result = await generate_topics(request)
-        
-        # 2. Generate quiz
-        logger.info("Step 2: Generating quiz")
-        quiz_result = await generate_quiz(topics_result)
-        
-        # 3. Evaluate quiz
-        logger.info("Step 3: Evaluating quiz")
-        understanding = await evaluate_quiz(topics_result, quiz_result, quiz_submission)
-        
-        # 4. Curate topics based on understanding
-        logger.info("Step 4: Curating topics")
-        curated_topics = await curate_topics(request, understanding)
-        
-        # 5. Generate content based on curated topics
-        logger.info("Step 5: Generating content with detailed structure")
-        content = await generate_content(curated_topics, understanding)
-        
-        logger.info("Complete flow finished successfully")
-        # Return complete results
-        return {
-            "topics": topics_result,
-            "quiz": quiz_result,
-            "understanding": understanding,
-            "curated_topics": curated_topics,
-            "content": content
-        }
+        if job:
+            job.stage_started("topics")
+        topics_result = finished.get("topics") or await pipeline.outline_topics(request.subject)
+        finished["topics"] = topics_result
+    
+        speculation_key = None
+        try:
+            # 2. Generate quiz
+            logger.info("Step 2: Generating quiz")
+            stage = "quiz"
+            if job:
+                job.stage_finished("topics")
+                job.stage_started("quiz")
+            quiz_result = finished.get("quiz") or await pipeline.write_quiz(topics_result.list_of_topics)
+            finished["quiz"] = quiz_result
+    
+            # 3. Evaluate quiz
+            logger.info("Step 3: Evaluating quiz")
+            stage = "evaluate"
+            if job:
+                job.stage_finished("quiz")
+                job.stage_started("evaluate")
+            if deadline:
+                deadline.check("evaluate")
+            understanding = finished.get("understanding") or UnderstandingScore(scores=pipeline.score_quiz(quiz_result, quiz_submission.answers))
+            finished["understanding"] = understanding
+
+            # Overlap content generation with curation: now that the scores are known,
+            # sections for the outline's topics can be pitched at the right level
+            if SPECULATIVE_CONTENT_DEFAULT:
+                speculation_key = f"flow-{job.id if job else uuid.uuid4().hex}"
+                content_speculator.start(speculation_key, topics_result.list_of_topics,
+                                         topic_buckets(topics_result.list_of_topics, understanding.scores))
+    
+            # 4. Curate topics based on understanding
+            logger.info("Step 4: Curating topics")
+            stage = "curate"
+            if job:
+                job.stage_finished("evaluate")
+                job.stage_started("curate")
+            curated_topics = finished.get("curated_topics")
+            if curated_topics is None and skip_curation(deadline):
+                # Not enough time left for curation and content: keep the original topic order
+                logger.info(f"Skipping curation with {deadline.remaining():.1f}s left")
+                degradations.append("skipped_curation")
+                curated_topics = topics_result
+            elif curated_topics is None:
+                curated_topics = await pipeline.curate_outline(request.subject, understanding.scores)
+                finished["curated_topics"] = curated_topics
+    
+            # 5. Generate content based on curated topics. Sections finished before a
+            # cancellation are in the response cache already, so a retry only writes the rest.
+            logger.info("Step 5: Generating content with detailed structure")
+            stage = "content"
+            if job:
+                job.stage_finished("curate")
+                job.stage_started("content")
+            if deadline:
+                deadline.check("content")
+            words, subtopics, cuts = content_targets(deadline)
+            if cuts:
+                logger.info(f"Degrading content ({', '.join(cuts)}) with {deadline.remaining():.1f}s left")
+                degradations.extend(cuts)
+            if subtopics:
+                curated_topics = curated_topics.model_copy(update={"list_of_topics": trim_subtopics(curated_topics.list_of_topics, subtopics)})
+            # Speculative sections were written at full length for the untrimmed outline
+            prefetched = content_speculator.claim(speculation_key, curated_topics.list_of_topics) if speculation_key and not (words or subtopics) else {}
+            content = await pipeline.write_content(curated_topics.list_of_topics,
+                                                   buckets=topic_buckets(curated_topics.list_of_topics, understanding.scores),
+                                                   prefetched=prefetched, words=words)
+        finally:
+            if speculation_key:
+                content_speculator.discard(speculation_key)
+    except asyncio.CancelledError:
+        FLOW_STAGES_CANCELLED.inc(endpoint=current_endpoint.get(), stage=stage)
+        if finished:
+            logger.info(f"Complete flow cancelled during {stage}; checkpointing {', '.join(finished)}")
+            await response_cache.aset(checkpoint_key, finished)
+        raise
+    finally:
+        current_deadline.reset(deadline_token)
+    if job:
+        job.stage_finished("content")
+    if resumed:
+        await response_cache.adelete(checkpoint_key)
+    for degradation in degradations:
+        FLOW_DEGRADATIONS.inc(endpoint=current_endpoint.get(), degradation=degradation)
+    
+    logger.info("Complete flow finished successfully")
+    # Return complete results
+    return {
+        "topics": topics_result,
+        "quiz": quiz_result,
+        "understanding": understanding,
+        "curated_topics": curated_topics,
+        "content": content,
+        "degradations": degradations,
+    }
+
+# Example of a complete flow endpoint
+@app.post("/complete-flow", response_model=Dict)
+async def complete_flow(request: TopicRequest, quiz_submission: QuizSubmission, http_request: Request, deadline: Optional[float] = None):
+    """
+    Run the whole pipeline. `deadline` (or the X-Request-Deadline header) is the time
+    budget in seconds; the flow degrades to fit it, see `degradations` in the response.
+    """
+    try:
+        flow_deadline = request_deadline(http_request, deadline)
+        # Stop the remaining stages if the client goes away
+        flow_result = await cancel_on_disconnect(http_request, run_complete_flow(request, quiz_submission, deadline=flow_deadline))
+        # Serialized once, straight from the stages' objects
+        return FastJSONResponse(flow_result)
+    except HTTPException:
+        raise
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error in complete flow: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error in complete flow: {str(e)}")
 
+@app.post("/generate-content/stream")
+async def generate_content_stream(topics: Optional[TopicResponse] = None, understanding: Optional[UnderstandingScore] = None, session_id: Optional[str] = None):
+    """
+    Stream content generation as Server-Sent Events: per-topic text deltas followed by
+    a final `content` event carrying the validated ContentResponse. As with /generate-content,
+    each section is pitched at the student's understanding bucket and stored in the session.
+    """
+    session = await load_session(session_id)
+    topics = require_input(topics or session.get("curated_topics") or session.get("topics"), "topics")
+    understanding = understanding or session.get("scores") or UnderstandingScore(scores={})
+    buckets = topic_buckets(topics.list_of_topics, understanding.scores)
+    logger.info(f"Streaming content for {len(topics.list_of_topics)} topics")
+
+    async def event_stream():
+        yield sse_event("stage_started", {"stage": "content"})
+        async for event, data in stream_content_events(topics.list_of_topics, buckets=buckets):
+            yield sse_event(event, data)
+            if event == "content":
+                if session_id:
+                    sections = dict(session.get("sections") or {})
+                    for topic, section in zip(topics.list_of_topics, data.topic):
+                        sections[section_key(topic, buckets[topic_key(topic)])] = section
+                    await session_store.update(session_id, content=data, sections=sections)
+                yield sse_event("stage_finished", {"stage": "content"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/complete-flow/stream")
+async def complete_flow_stream(request: TopicRequest, quiz_submission: QuizSubmission, http_request: Request, deadline: Optional[float] = None):
+    """
+    Complete flow as Server-Sent Events: stage_started/stage_finished for every stage,
+    content deltas while the study plan is written, and a final `content` event.
+    Takes a deadline like /complete-flow; the degradations applied are listed in the
+    content stage_finished event. Failures end the stream with an `overloaded` (with
+    retry_after), `deadline_exceeded` or `error` event. The stages stop if the client
+    disconnects.
+    """
+    flow_deadline = request_deadline(http_request, deadline)
+    logger.info(f"Starting streamed complete flow for subject: {request.subject}")
+
+    async def event_stream():
+        current_deadline.set(flow_deadline)
+        stage = "topics"
+        try:
+            yield sse_event("stage_started", {"stage": "topics"})
+            # Nothing is sent while a stage runs, so watch for the client leaving meanwhile
+            topics_result = await cancel_on_disconnect(http_request, pipeline.outline_topics(request.subject))
+            yield sse_event("stage_finished", {"stage": "topics", "result": topics_result.model_dump()})
+
+            stage = "quiz"
+            yield sse_event("stage_started", {"stage": "quiz"})
+            quiz_result = await cancel_on_disconnect(http_request, pipeline.write_quiz(topics_result.list_of_topics))
+            yield sse_event("stage_finished", {"stage": "quiz", "result": quiz_result.model_dump()})
+
+            stage = "evaluate"
+            yield sse_event("stage_started", {"stage": "evaluate"})
+            if flow_deadline:
+                flow_deadline.check("evaluate")
+            understanding = UnderstandingScore(scores=pipeline.score_quiz(quiz_result, quiz_submission.answers))
+            yield sse_event("stage_finished", {"stage": "evaluate", "result": understanding.model_dump()})
+
+            stage = "curate"
+            degradations = []
+            yield sse_event("stage_started", {"stage": "curate"})
+            if skip_curation(flow_deadline):
+                logger.info(f"Skipping curation with {flow_deadline.remaining():.1f}s left")
+                degradations.append("skipped_curation")
+                curated_topics = topics_result
+            else:
+                curated_topics = await cancel_on_disconnect(http_request, pipeline.curate_outline(request.subject, understanding.scores))
+            yield sse_event("stage_finished", {"stage": "curate", "result": curated_topics.model_dump()})
+
+            # Deltas go out continuously from here, so a disconnect cancels the stream itself
+            stage = "content"
+            yield sse_event("stage_started", {"stage": "content"})
+            if flow_deadline:
+                flow_deadline.check("content")
+            words, subtopics, cuts = content_targets(flow_deadline)
+            degradations.extend(cuts)
+            content_topics = curated_topics.list_of_topics
+            if subtopics:
+                content_topics = trim_subtopics(content_topics, subtopics)
+            buckets = topic_buckets(content_topics, understanding.scores)
+            async for event, data in stream_content_events(content_topics, buckets=buckets, words=words):
+                yield sse_event(event, data)
+                if event == "content":
+                    for degradation in degradations:
+                        FLOW_DEGRADATIONS.inc(endpoint=current_endpoint.get(), degradation=degradation)
+                    yield sse_event("stage_finished", {"stage": "content", "degradations": degradations})
+        except asyncio.CancelledError:
+            FLOW_STAGES_CANCELLED.inc(endpoint=current_endpoint.get(), stage=stage)
+            raise
+        except HTTPException as e:
+            if e.status_code == CLIENT_CLOSED_REQUEST:
+                FLOW_STAGES_CANCELLED.inc(endpoint=current_endpoint.get(), stage=stage)
+                return
+            yield sse_event("error", {"detail": e.detail})
+        except (LLMOverloaded, DeadlineExceeded) as e:
+            yield sse_event(*error_event(e, str(e)))
+        except Exception as e:
+            logger.error(f"Error in streamed complete flow: {str(e)}", exc_info=True)
+            yield sse_event(*error_event(e, f"Error in complete flow: {str(e)}"))
+        finally:
+            # An abandoned stream may be closed from another context, where reset() would fail
+            current_deadline.set(None)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post("/generate-pdf-from-content")
-async def generate_pdf_from_content(content: ContentResponse, title: str = "Study Plan"):
+async def generate_pdf_from_content(http_request: Request, content: Optional[ContentResponse] = None, title: str = "Study Plan", session_id: Optional[str] = None):
     try:
+        session = await load_session(session_id)
+        content = require_input(content or session.get("content"), "content")
         logger.info(f"Generating PDF from content with {len(content.topic)} sections")
         
-        # Generate markdown from content
-        markdown_content = generate_content_markdown(content, title)
-        
-        # Convert markdown to HTML
-        html_content = markdown_to_html(markdown_content, title)
-        
-        # Convert HTML to PDF
-        pdf_bytes = html_to_pdf(html_content)
+        # Convert the content to HTML, topic by topic
+        html_content = content_to_html(content, title)
         
-        # Return the PDF as a downloadable file
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={title.replace(' ', '-').lower()}.pdf"}
-        )
+        # Convert HTML to PDF in the render pool (cached by content hash, 304 if the client has it)
+        return await pdf_response(http_request, html_content, f"{title.replace(' ', '-').lower()}.pdf")
+    except HTTPException:
+        raise
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
 
+@app.post("/export-html")
+async def export_html(content: Optional[ContentResponse] = None, title: str = "Study Plan", session_id: Optional[str] = None):
+    """
+    Export content as a standalone HTML document (print stylesheet embedded), streamed
+    to the client one topic at a time.
+    """
+    session = await load_session(session_id)
+    content = require_input(content or session.get("content"), "content")
+    logger.info(f"Exporting HTML for content with {len(content.topic)} sections")
+    filename = f"{title.replace(' ', '-').lower()}.html"
+    # A plain generator: Starlette runs each step, and so each topic's conversion, in its threadpool
+    return StreamingResponse(
+        iter_content_html(content, title, embed_css=True),
+        media_type="text/html; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @app.post("/generate-pdf-from-file")
-async def generate_pdf_from_file(markdown_file: UploadFile = File(...), title: str = "Study Plan"):
+async def generate_pdf_from_file(http_request: Request, markdown_file: UploadFile = File(...), title: str = "Study Plan"):
     """
     Generate a PDF from a markdown file.
     """
@@ -276,23 +748,20 @@ async def generate_pdf_from_file(markdown_file: UploadFile = File(...), title: s
         # Convert markdown to HTML
         html_content = markdown_to_html(markdown_text, title)
         
-        # Convert HTML to PDF
-        pdf_bytes = html_to_pdf(html_content)
-        
-        # Return the PDF as a downloadable file
         filename = markdown_file.filename.replace('.md', '.pdf') if markdown_file.filename.endswith('.md') else 'study-plan.pdf'
         
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        # Convert HTML to PDF in the render pool (cached by content hash, 304 if the client has it)
+        return await pdf_response(http_request, html_content, filename)
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
 
 @app.post("/generate-pdf-from-text")
-async def generate_pdf_from_text(markdown_data: MarkdownContent):
+async def generate_pdf_from_text(markdown_data: MarkdownContent, http_request: Request):
     """
     Generate a PDF from markdown text.
     """
@@ -302,51 +771,135 @@ async def generate_pdf_from_text(markdown_data: MarkdownContent):
         # Convert markdown to HTML
         html_content = markdown_to_html(markdown_data.content, markdown_data.title)
         
-        # Convert HTML to PDF
-        pdf_bytes = html_to_pdf(html_content)
-        
-        # Return the PDF as a downloadable file
         filename = markdown_data.title.replace(' ', '-').lower() + '.pdf'
         
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        # Convert HTML to PDF in the render pool (cached by content hash, 304 if the client has it)
+        return await pdf_response(http_request, html_content, filename)
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"PDF generation failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
 
 @app.post("/complete-flow-with-pdf")
-async def complete_flow_with_pdf(request: TopicRequest, quiz_submission: QuizSubmission):
+async def complete_flow_with_pdf(request: TopicRequest, quiz_submission: QuizSubmission, http_request: Request, deadline: Optional[float] = None):
     """
-    Complete flow that returns a PDF of the content.
+    Complete flow that returns a PDF of the content. Takes a deadline like /complete-flow;
+    the degradations applied are listed in the X-Degradations header.
     """
     try:
         logger.info(f"Starting complete flow with PDF for subject: {request.subject}")
-        
-        # Run the complete flow
-        flow_result = await complete_flow(request, quiz_submission)
-        
-        # Generate PDF from the content
-        content = flow_result["content"]
-        title = f"{request.subject} Study Plan"
-        
-        # Generate markdown from content
-        markdown_content = generate_content_markdown(content, title)
-        
-        # Convert markdown to HTML
-        html_content = markdown_to_html(markdown_content, title)
-        
-        # Convert HTML to PDF
-        pdf_bytes = html_to_pdf(html_content)
-        
-        # Return the PDF directly
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={title.replace(' ', '-').lower()}.pdf"}
-        )
+        flow_deadline = request_deadline(http_request, deadline)
+
+        async def flow_pdf():
+            # Run the complete flow
+            flow_result = await run_complete_flow(request, quiz_submission, deadline=flow_deadline)
+
+            # Generate PDF from the content
+            content = flow_result["content"]
+            title = f"{request.subject} Study Plan"
+
+            # Convert the content to HTML, topic by topic
+            html_content = content_to_html(content, title)
+
+            # Convert HTML to PDF in the render pool (cached by content hash, 304 if the client has it)
+            response = await pdf_response(http_request, html_content, f"{title.replace(' ', '-').lower()}.pdf")
+            if flow_result["degradations"]:
+                response.headers["X-Degradations"] = ",".join(flow_result["degradations"])
+            return response
+
+        # Stop the remaining stages, and drop a queued render, if the client goes away
+        return await cancel_on_disconnect(http_request, flow_pdf())
+    except HTTPException:
+        raise
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error in complete flow with PDF: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error in complete flow with PDF: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error in complete flow with PDF: {str(e)}") 
+
+async def run_complete_flow_pdf_job(job: Job, request: TopicRequest, quiz_submission: QuizSubmission):
+    """
+    Background version of /complete-flow-with-pdf: stores the flow result and the PDF as job artifacts.
+    """
+    current_endpoint.set("/jobs/complete-flow-with-pdf")
+    flow_result = await run_complete_flow(request, quiz_submission, job)
+    job.artifacts["result"] = flow_result
+
+    job.stage_started("pdf")
+    title = f"{request.subject} Study Plan"
+    html_content = content_to_html(flow_result["content"], title)
+    while True:
+        try:
+            await render_pdf_cached(html_content)
+            break
+        except RenderQueueFull as e:
+            # Background jobs wait for render capacity instead of failing
+            await asyncio.sleep(e.retry_after)
+    job.artifacts["pdf"] = {"html": html_content, "filename": f"{title.replace(' ', '-').lower()}.pdf"}
+    job.stage_finished("pdf")
+
+def load_job(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+def load_job_artifact(job_id: str, name: str):
+    job = load_job(job_id)
+    if name not in job.artifacts:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}; {name} is not ready")
+    return job.artifacts[name]
+
+@app.post("/jobs/complete-flow-with-pdf", status_code=202)
+async def submit_complete_flow_with_pdf(request: TopicRequest, quiz_submission: QuizSubmission, priority: int = 0):
+    """
+    Queue the complete flow with PDF as a background job and return its job ID immediately.
+    Higher priority jobs run first.
+    """
+    try:
+        job = job_manager.submit(
+            "complete-flow-with-pdf",
+            FLOW_STAGES + ["pdf"],
+            lambda job: run_complete_flow_pdf_job(job, request, quiz_submission),
+            priority=priority,
+        )
+        logger.info(f"Queued complete flow job {job.id} for subject: {request.subject}")
+        return job.to_dict()
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+@app.get("/jobs")
+async def job_stats():
+    return job_manager.get_stats()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return load_job(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    return FastJSONResponse(load_job_artifact(job_id, "result"))
+
+@app.get("/jobs/{job_id}/pdf")
+async def get_job_pdf(job_id: str, http_request: Request):
+    pdf = load_job_artifact(job_id, "pdf")
+    try:
+        return await pdf_response(http_request, pdf["html"], pdf["filename"])
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    load_job(job_id)
+    return job_manager.cancel(job_id).to_dict()
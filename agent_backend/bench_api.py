@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import platform
+import resource
+import subprocess
+import tempfile
+
+# Isolate the benchmark from real caches, and keep the LLM rate budgets from throttling
+# the fake model; anything set explicitly in the environment still wins.
+os.environ.setdefault("CRAMPLAN_CACHE_DIR", tempfile.mkdtemp(prefix="cramplan-bench-"))
+os.environ.setdefault("CRAMPLAN_LLM_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("CRAMPLAN_LLM_TOKENS_PER_MINUTE", "1000000000")
+os.environ.setdefault("OPENAI_API_KEY", "bench-not-used")
+
+import httpx2
+
+import api
+from fake_llm import FakeModel, install_fake_model, canned_output
+from llm_main import ListOfTopics, ListOfQuizQuestions, ContentTopic
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MONITOR_INTERVAL = 0.005
+PDF_ENDPOINTS = ("generate-pdf-from-text", "generate-pdf-from-content", "generate-pdf-from-file",
+                 "complete-flow-with-pdf", "jobs-complete-flow-with-pdf")
+
+
+def percentile(values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of `values` (0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(pct / 100 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+def current_rss() -> int:
+    """
+    Resident set size of this process in bytes.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is the peak so far (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Monitor:
+    """
+    Samples event-loop lag and RSS in the background while an endpoint is being driven.
+    """
+
+    def __init__(self, interval: float = MONITOR_INTERVAL):
+        self.interval = interval
+        self.lags = []
+        self.peak_rss = 0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def start(self):
+        self.lags = []
+        self.peak_rss = current_rss()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def sample_topics(i: int) -> dict:
+    return canned_output(ListOfTopics, f"Bench subject {i}", random.Random(i)).model_dump()
+
+
+def sample_quiz(i: int) -> dict:
+    topics = "\n".join(f"{n + 1}. {topic['topic']}" for n, topic in enumerate(sample_topics(i)["list_of_topics"]))
+    return canned_output(ListOfQuizQuestions, topics, random.Random(i)).model_dump()
+
+
+def sample_content(i: int) -> dict:
+    topics = "\n".join(f"{n + 1}. {topic['topic']}\n   Subtopics: {', '.join(topic['subtopics'])}"
+                       for n, topic in enumerate(sample_topics(i)["list_of_topics"]))
+    return canned_output(ContentTopic, topics, random.Random(i)).model_dump()
+
+
+def sample_submission(i: int) -> dict:
+    rng = random.Random(i)
+    return {"answers": [{"question_index": q, "answer": rng.choice("abcd")} for q in range(10)]}
+
+
+def sample_understanding(i: int) -> dict:
+    rng = random.Random(i)
+    return {"scores": {topic["topic"]: rng.choice([0.0, 50.0, 100.0]) for topic in sample_topics(i)["list_of_topics"]}}
+
+
+async def wait_for_job(client, job_id: str, poll: float = 0.05):
+    while True:
+        response = await client.get(f"/jobs/{job_id}")
+        if response.json()["status"] in ("succeeded", "failed", "cancelled"):
+            return await client.get(f"/jobs/{job_id}/pdf")
+        await asyncio.sleep(poll)
+
+
+async def job_request(client, i):
+    response = await client.post("/jobs/complete-flow-with-pdf", json={
+        "request": {"subject": f"Bench subject {i}"}, "quiz_submission": sample_submission(i)})
+    if response.status_code >= 400:
+        return response
+    return await wait_for_job(client, response.json()["job_id"])
+
+
+# Each scenario issues request number `i` against one endpoint; inputs vary with `i`
+# so the response and PDF caches don't turn the run into a cache benchmark.
+SCENARIOS = {
+    "generate-topics": lambda client, i: client.post(
+        "/generate-topics", params={"session": "false"}, json={"subject": f"Bench subject {i}"}),
+    "generate-quiz": lambda client, i: client.post(
+        "/generate-quiz", params={"fresh": "true"}, json=sample_topics(i)),
+    "evaluate-quiz": lambda client, i: client.post(
+        "/evaluate-quiz", json={"submission": sample_submission(i), "quiz": sample_quiz(i)}),
+    "evaluate-quiz-batch": lambda client, i: client.post(
+        "/evaluate-quiz/batch", json={"quiz": sample_quiz(i), "submissions": [sample_submission(i * 100 + s) for s in range(30)]}),
+    "curate-topics": lambda client, i: client.post(
+        "/curate-topics", json={"request": {"subject": f"Bench subject {i}"}, "understanding": sample_understanding(i)}),
+    "generate-content": lambda client, i: client.post(
+        "/generate-content", json={"topics": sample_topics(i), "understanding": sample_understanding(i)}),
+    "generate-content-stream": lambda client, i: client.post(
+        "/generate-content/stream", json={"topics": sample_topics(i), "understanding": sample_understanding(i)}),
+    "complete-flow": lambda client, i: client.post(
+        "/complete-flow", json={"request": {"subject": f"Bench subject {i}"}, "quiz_submission": sample_submission(i)}),
+    "complete-flow-stream": lambda client, i: client.post(
+        "/complete-flow/stream", json={"request": {"subject": f"Bench subject {i}"}, "quiz_submission": sample_submission(i)}),
+    "generate-pdf-from-text": lambda client, i: client.post(
+        "/generate-pdf-from-text", json={"content": f"# Bench {i}\n\n" + "Some *markdown* text.\n\n" * 200, "title": f"Bench {i}"}),
+    "generate-pdf-from-content": lambda client, i: client.post(
+        "/generate-pdf-from-content", params={"title": f"Bench {i}"}, json=sample_content(i)),
+    "generate-pdf-from-file": lambda client, i: client.post(
+        "/generate-pdf-from-file", files={"markdown_file": (f"bench-{i}.md", f"# Bench {i}\n\n" + "Line of text.\n\n" * 200, "text/markdown")}),
+    "complete-flow-with-pdf": lambda client, i: client.post(
+        "/complete-flow-with-pdf", json={"request": {"subject": f"Bench subject {i}"}, "quiz_submission": sample_submission(i)}),
+    "jobs-complete-flow-with-pdf": job_request,
+}
+
+
+async def drive(client, name: str, requests: int, concurrency: int, offset: int) -> dict:
+    """
+    Issue `requests` requests to one endpoint, at most `concurrency` in flight.
+    """
+    scenario = SCENARIOS[name]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await scenario(client, offset + i)
+                if response.status_code >= 400:
+                    errors += 1
+                    logger.warning(f"{name} request {i} failed: {response.status_code} {response.text[:200]}")
+            except Exception as e:
+                errors += 1
+                logger.warning(f"{name} request {i} raised: {str(e)}")
+            latencies.append(time.perf_counter() - start)
+
+    monitor = Monitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "throughput_rps": requests / elapsed if elapsed > 0 else 0.0,
+        "loop_lag_p99_ms": percentile(monitor.lags, 99) * 1000,
+        "loop_lag_max_ms": max(monitor.lags, default=0.0) * 1000,
+        "peak_rss_mb": monitor.peak_rss / (1024 * 1024),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    """
+    Log each endpoint's latency and throughput relative to an earlier results file.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    logger.info(f"Compared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    for name, stats in results["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        ratios = {key: stats[key] / before[key] if before[key] else float("nan")
+                  for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")}
+        logger.info(f"  {name}: p50 x{ratios['p50_ms']:.2f}, p95 x{ratios['p95_ms']:.2f}, "
+                    f"p99 x{ratios['p99_ms']:.2f}, throughput x{ratios['throughput_rps']:.2f}")
+
+
+async def run(args) -> dict:
+    model = FakeModel(latency=args.latency, tokens_per_second=args.token_rate)
+    install_fake_model(model)
+    names = args.endpoints.split(",") if args.endpoints else list(SCENARIOS)
+    if args.skip_pdf:
+        names = [name for name in names if name not in PDF_ENDPOINTS]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "latency": args.latency,
+            "token_rate": args.token_rate,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "endpoints": {},
+    }
+    transport = httpx2.ASGITransport(app=api.app)
+    async with api.lifespan(api.app):
+        async with httpx2.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for n, name in enumerate(names):
+                logger.info(f"Benchmarking {name}: {args.requests} requests, concurrency {args.concurrency}")
+                stats = await drive(client, name, args.requests, args.concurrency, offset=n * args.requests)
+                results["endpoints"][name] = stats
+                logger.info(f"{name}: p50 {stats['p50_ms']:.1f}ms, p95 {stats['p95_ms']:.1f}ms, "
+                            f"p99 {stats['p99_ms']:.1f}ms, {stats['throughput_rps']:.1f} req/s, "
+                            f"loop lag p99 {stats['loop_lag_p99_ms']:.1f}ms, peak RSS {stats['peak_rss_mb']:.0f}MB, "
+                            f"{stats['errors']} errors")
+    results["meta"]["fake_model_calls"] = model.calls
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API's own overhead against a local fake LLM")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake model time to first token, in seconds")
+    parser.add_argument("--token-rate", type=float, default=20000, help="Fake model output tokens per second")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--endpoints", default="", help="Comma-separated endpoints (default: all)")
+    parser.add_argument("--skip-pdf", action="store_true", help="Skip the endpoints that need WeasyPrint")
+    parser.add_argument("--output", default="bench_api_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import platform
+import tempfile
+import tracemalloc
+
+# Isolate the benchmark from real caches, keep the LLM rate budgets from throttling the
+# fake model, and write full-size study plans (5 topics x 3 subtopics x 1000 words).
+os.environ.setdefault("CRAMPLAN_CACHE_DIR", tempfile.mkdtemp(prefix="cramplan-bench-"))
+os.environ.setdefault("CRAMPLAN_LLM_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("CRAMPLAN_LLM_TOKENS_PER_MINUTE", "1000000000")
+os.environ.setdefault("CRAMPLAN_FAKE_LLM_WORDS_PER_SUBTOPIC", "1000")
+os.environ.setdefault("OPENAI_API_KEY", "bench-not-used")
+
+import httpx2
+
+import api
+import cache
+from fake_llm import FakeModel, install_fake_model
+from bench_api import sample_topics, sample_submission, sample_understanding, git_commit, percentile
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# One fixed input per endpoint: after the warm-up every agent call but the quiz's is a
+# response cache hit, so what's measured is the API's own work on large payloads.
+SCENARIOS = {
+    "generate-topics": lambda client: client.post(
+        "/generate-topics", params={"session": "false"}, json={"subject": "Bench subject"}),
+    "curate-topics": lambda client: client.post(
+        "/curate-topics", json={"request": {"subject": "Bench subject"}, "understanding": sample_understanding(0)}),
+    "generate-content": lambda client: client.post(
+        "/generate-content", json={"topics": sample_topics(0), "understanding": sample_understanding(0)}),
+    "complete-flow": lambda client: client.post(
+        "/complete-flow", json={"request": {"subject": "Bench subject"}, "quiz_submission": sample_submission(0)}),
+}
+
+
+def use_legacy_path() -> None:
+    """
+    Put back the serialization path from before responses went out in FastJSONResponse:
+    routes hand their objects to FastAPI, which validates them against the response_model
+    and serializes them again, and every cache key rebuilds the agent's output schema.
+    """
+    api.FastJSONResponse = lambda content: content
+    cache.output_schema = cache.output_schema.__wrapped__
+
+
+async def measure(client, name: str, requests: int) -> dict:
+    """
+    Send `requests` sequential requests, timing the process CPU each one takes; then send
+    them again under tracemalloc for the memory allocated at peak per request.
+    """
+    scenario = SCENARIOS[name]
+    response = await scenario(client)  # warm-up, fills the caches
+    if response.status_code >= 400:
+        raise SystemExit(f"{name} failed: {response.status_code} {response.text[:200]}")
+    response_bytes = len(response.content)
+
+    cpu = []
+    for _ in range(requests):
+        start = time.process_time()
+        await scenario(client)
+        cpu.append(time.process_time() - start)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(requests):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await scenario(client)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": requests,
+        "response_bytes": response_bytes,
+        "cpu_p50_ms": percentile(cpu, 50) * 1000,
+        "cpu_mean_ms": sum(cpu) / len(cpu) * 1000,
+        "alloc_peak_p50_kb": percentile(peaks, 50) / 1024,
+        "alloc_peak_max_kb": max(peaks) / 1024,
+    }
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    """
+    Log each endpoint's CPU time and peak allocations relative to an earlier results file.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    label = "legacy path" if baseline["meta"].get("legacy") else f"commit {baseline['meta'].get('commit')}"
+    logger.info(f"Compared with {baseline_path} ({label}):")
+    for name, stats in results["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        logger.info(f"  {name}: CPU p50 {before['cpu_p50_ms']:.1f}ms -> {stats['cpu_p50_ms']:.1f}ms, "
+                    f"peak alloc p50 {before['alloc_peak_p50_kb']:.0f}KB -> {stats['alloc_peak_p50_kb']:.0f}KB")
+
+
+async def run(args) -> dict:
+    install_fake_model(FakeModel(latency=0.0, tokens_per_second=0.0))
+    if args.legacy:
+        use_legacy_path()
+    names = args.endpoints.split(",") if args.endpoints else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "words_per_subtopic": int(os.environ["CRAMPLAN_FAKE_LLM_WORDS_PER_SUBTOPIC"]),
+            "legacy": args.legacy,
+        },
+        "endpoints": {},
+    }
+    transport = httpx2.ASGITransport(app=api.app)
+    async with api.lifespan(api.app):
+        async with httpx2.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name in names:
+                stats = await measure(client, name, args.requests)
+                results["endpoints"][name] = stats
+                logger.info(f"{name}: CPU p50 {stats['cpu_p50_ms']:.1f}ms (mean {stats['cpu_mean_ms']:.1f}ms), "
+                            f"peak alloc p50 {stats['alloc_peak_p50_kb']:.0f}KB, response {stats['response_bytes'] / 1024:.0f}KB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-request CPU time and peak allocations of the pipeline endpoints")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint (per pass)")
+    parser.add_argument("--endpoints", default="", help="Comma-separated endpoints (default: all)")
+    parser.add_argument("--output", default="bench_pipeline_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--legacy", action="store_true",
+                        help="Measure the previous serialization path (FastAPI response_model, uncached output schemas) as a baseline")
+    args = parser.parse_args()
+
+    # Per-request log lines would dominate the CPU being measured
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import argparse
+import logging
+import statistics
+import sys
+import time
+
+import weasyprint
+
+from llm_main import ContentTopic, ContentMain, ContentSub
+from pdf_generator import (
+    PRINT_CSS,
+    content_to_html,
+    html_to_pdf,
+    warm_up,
+)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def sample_content(topics: int = 5, subtopics: int = 3, words: int = 1000) -> ContentTopic:
+    """
+    Build a synthetic study plan shaped like the content writer's output.
+    """
+    paragraph = ("Linear maps preserve vector addition and scalar multiplication, "
+                 "which is why they can be represented by matrices. ")
+    words_per_paragraph = len(paragraph.split())
+    body = "\n\n".join(paragraph * 8 for _ in range(max(1, words // (words_per_paragraph * 8))))
+    return ContentTopic(topic=[
+        ContentMain(
+            topic_title=f"Topic {t + 1}",
+            main_description=f"Overview of topic {t + 1}.",
+            subtopics=[
+                ContentSub(sub_topic_title=f"Subtopic {t + 1}.{s + 1}", sub_content_text=body)
+                for s in range(subtopics)
+            ],
+        )
+        for t in range(topics)
+    ])
+
+def render_legacy(html_content: str) -> bytes:
+    """
+    The previous render path: stylesheet inlined in the document and parsed, with fonts
+    discovered, on every call.
+    """
+    inline_html = html_content.replace("</head>", f"<style>{PRINT_CSS}</style>\n</head>", 1)
+    return weasyprint.HTML(string=inline_html).write_pdf()
+
+def time_renders(render, html_content: str, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        render(html_content)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF render time for a synthetic study plan")
+    parser.add_argument("--topics", type=int, default=5)
+    parser.add_argument("--subtopics", type=int, default=3)
+    parser.add_argument("--words", type=int, default=1000, help="Words per subtopic")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    content = sample_content(args.topics, args.subtopics, args.words)
+    html_content = content_to_html(content, "Benchmark Plan")
+    logger.info(f"Rendering {args.topics} topics x {args.subtopics} subtopics ({len(html_content)} bytes of HTML), {args.runs} runs each")
+
+    # The first legacy render includes fontconfig/cairo initialization, like a cold worker
+    before = time_renders(render_legacy, html_content, args.runs)
+    warm_up_time = warm_up()
+    after = time_renders(html_to_pdf, html_content, args.runs)
+
+    for label, timings in (("before (inline CSS)", before), ("after (shared CSS/fonts)", after)):
+        logger.info(f"{label}: first {timings[0]:.3f}s, median {statistics.median(timings):.3f}s, "
+                    f"mean {statistics.mean(timings):.3f}s")
+    logger.info(f"warm-up render: {warm_up_time:.3f}s")
+    logger.info(f"median speedup: {statistics.median(before) / statistics.median(after):.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
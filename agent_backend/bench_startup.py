@@ -0,0 +1,198 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import argparse
+import logging
+import platform
+import subprocess
+import tempfile
+import urllib.request
+import urllib.error
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Modules the API process should only load on first use
+LAZY_MODULES = ("agents", "openai", "weasyprint", "markdown", "numpy")
+
+
+def percentile(values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of `values` (0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(pct / 100 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BACKEND_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def child_env(prewarm: bool = False) -> dict:
+    env = dict(os.environ)
+    env.setdefault("CRAMPLAN_CACHE_DIR", tempfile.mkdtemp(prefix="cramplan-startup-"))
+    env.setdefault("OPENAI_API_KEY", "bench-not-used")
+    env["CRAMPLAN_PREWARM"] = "true" if prewarm else "false"
+    return env
+
+
+def import_profile(module: str = "api", top: int = 15) -> dict:
+    """
+    Import `module` in a fresh interpreter under -X importtime and summarize where the time went.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=BACKEND_DIR, env=child_env())
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({"module": name, "depth": (len(indent) - 1) // 2,
+                            "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    total = next((e["cumulative_ms"] for e in entries if e["module"] == module and e["depth"] == 0), 0.0)
+    loaded = {e["module"].split(".")[0] for e in entries}
+    return {
+        "total_ms": total,
+        "modules": len(entries),
+        "lazy_modules_loaded": [name for name in LAZY_MODULES if name in loaded],
+        # Direct imports of the module, the ones it can choose to defer
+        "slowest_direct": sorted(({"module": e["module"], "cumulative_ms": e["cumulative_ms"]}
+                                  for e in entries if e["depth"] == 1),
+                                 key=lambda e: e["cumulative_ms"], reverse=True)[:top],
+        "slowest_overall": sorted(({"module": e["module"], "self_ms": e["self_ms"]} for e in entries),
+                                  key=lambda e: e["self_ms"], reverse=True)[:top],
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_json(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return json.load(response)
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def measure_startup(prewarm: bool, timeout: float) -> dict:
+    """
+    Start uvicorn in a fresh process and time how long until /health answers and,
+    with pre-warm on, until the pre-warm finishes.
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=BACKEND_DIR, env=child_env(prewarm), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"health_ms": None, "prewarm_ms": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise SystemExit(f"uvicorn exited with code {proc.returncode}")
+            health = get_json(url)
+            if health is not None:
+                elapsed = (time.perf_counter() - start) * 1000
+                if result["health_ms"] is None:
+                    result["health_ms"] = elapsed
+                if not prewarm or health.get("prewarm", {}).get("status") in ("done", "failed"):
+                    if prewarm:
+                        result["prewarm_ms"] = elapsed
+                    break
+            time.sleep(0.01)
+        else:
+            raise SystemExit(f"Server not ready within {timeout}s")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return result
+
+
+def summarize(values: list) -> dict:
+    return {"p50_ms": percentile(values, 50), "min_ms": min(values, default=0.0), "max_ms": max(values, default=0.0)}
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    """
+    Log import time and time-to-first-/health relative to an earlier results file.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    logger.info(f"Compared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    before, after = baseline["import"]["total_ms"], results["import"]["total_ms"]
+    logger.info(f"  import api: {before:.0f}ms -> {after:.0f}ms (x{after / before:.2f})" if before else "  import api: n/a")
+    before, after = baseline["startup"]["health"]["p50_ms"], results["startup"]["health"]["p50_ms"]
+    logger.info(f"  first /health p50: {before:.0f}ms -> {after:.0f}ms (x{after / before:.2f})" if before else "  first /health: n/a")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the API's imports and time its cold start to the first /health")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to report")
+    parser.add_argument("--prewarm", action="store_true", help="Start with CRAMPLAN_PREWARM=true and time the pre-warm too")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for each server to come up")
+    parser.add_argument("--output", default="bench_startup_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    profile = import_profile(top=args.top)
+    logger.info(f"import api: {profile['total_ms']:.0f}ms across {profile['modules']} modules; "
+                f"lazy modules loaded at import: {', '.join(profile['lazy_modules_loaded']) or 'none'}")
+    for entry in profile["slowest_direct"]:
+        logger.info(f"  {entry['cumulative_ms']:8.1f}ms  {entry['module']}")
+
+    runs = [measure_startup(args.prewarm, args.timeout) for _ in range(args.runs)]
+    startup = {"health": summarize([run["health_ms"] for run in runs]), "runs": runs}
+    logger.info(f"first /health: p50 {startup['health']['p50_ms']:.0f}ms "
+                f"(min {startup['health']['min_ms']:.0f}ms, max {startup['health']['max_ms']:.0f}ms)")
+    if args.prewarm:
+        startup["prewarm"] = summarize([run["prewarm_ms"] for run in runs])
+        logger.info(f"pre-warm finished: p50 {startup['prewarm']['p50_ms']:.0f}ms after start")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "runs": args.runs,
+            "prewarm": args.prewarm,
+        },
+        "import": profile,
+        "startup": startup,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
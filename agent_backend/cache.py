@@ -0,0 +1,383 @@
+import os
+import time
+import asyncio
+import json
+import pickle
+import hashlib
+import functools
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration (override through the environment / .env file)
+CACHE_DIR = os.getenv("CRAMPLAN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv("CRAMPLAN_RESPONSE_CACHE_MEMORY_ENTRIES", "256"))
+RESPONSE_CACHE_DISK_TTL = float(os.getenv("CRAMPLAN_RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_DISK_MAX_BYTES = int(os.getenv("CRAMPLAN_RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+PDF_CACHE_MEMORY_ENTRIES = int(os.getenv("CRAMPLAN_PDF_CACHE_MEMORY_ENTRIES", "64"))
+PDF_CACHE_MEMORY_MAX_BYTES = int(os.getenv("CRAMPLAN_PDF_CACHE_MEMORY_MAX_BYTES", str(128 * 1024 * 1024)))
+PDF_CACHE_DISK_TTL = float(os.getenv("CRAMPLAN_PDF_CACHE_TTL", str(30 * 24 * 3600)))
+PDF_CACHE_DISK_MAX_BYTES = int(os.getenv("CRAMPLAN_PDF_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Agents whose responses may be cached. The quiz agent is left out by default so
+# retakes get fresh questions.
+RESPONSE_CACHE_AGENTS = {
+    name.strip()
+    for name in os.getenv(
+        "CRAMPLAN_RESPONSE_CACHE_AGENTS",
+        "main_topic_outline_agent,curated_topic_outline_agent,content_writer_agent,topic_content_writer_agent",
+    ).split(",")
+    if name.strip()
+}
+
+
+class MemoryLRU:
+    """
+    Thread-safe in-memory LRU tier bounded by entry count and, optionally, total size.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, sizeof: Callable[[Any], int] = len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def set(self, key: str, value) -> None:
+        if self.max_entries <= 0:
+            return
+        size = self.sizeof(value) if self.max_bytes > 0 else 0
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes > 0 and self.total_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskStore:
+    """
+    On-disk tier storing one file per key, with TTL expiry and size-based eviction
+    (least recently used files are removed first).
+
+    The store's size is tracked as entries are written and removed, so a write only
+    scans the directory when the store outgrows `max_bytes` (it then evicts down to
+    `evict_to` of it) or when expired entries are due for a sweep.
+    """
+
+    evict_to = 0.9
+
+    def __init__(self, directory: str, ttl: float, max_bytes: int, sweep_interval: float = 3600):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._sizes: Optional[dict] = None
+        self.total_bytes = 0
+        self._swept = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _forget(self, key: str) -> None:
+        if self._sizes is not None:
+            self.total_bytes -= self._sizes.pop(key, 0)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl > 0 and time.time() - stat.st_mtime > self.ttl:
+                os.remove(path)
+                with self._lock:
+                    self._forget(key)
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            # Touch the access time so eviction keeps recently used entries
+            os.utime(path, (time.time(), stat.st_mtime))
+            return data
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, data: bytes) -> None:
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._sizes is None:
+                self._scan()
+            else:
+                self._forget(key)
+                self._sizes[key] = len(data)
+                self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes or time.time() - self._swept > self.sweep_interval:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._forget(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(".bin"):
+                    self._remove(os.path.join(self.directory, name))
+            self._sizes = {}
+            self.total_bytes = 0
+
+    def _scan(self) -> list:
+        """
+        Drop expired entries and recount the rest; returns (atime, key) per entry.
+        Called with the lock held.
+        """
+        now = time.time()
+        entries = []
+        self._sizes = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".bin"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if self.ttl > 0 and now - stat.st_mtime > self.ttl:
+                self._remove(path)
+                continue
+            key = name[:-len(".bin")]
+            entries.append((stat.st_atime, key))
+            self._sizes[key] = stat.st_size
+        self.total_bytes = sum(self._sizes.values())
+        self._swept = now
+        return entries
+
+    def _evict(self) -> None:
+        """
+        Drop expired entries, then the least recently used ones until the store fits
+        `evict_to` of max_bytes. Called with the lock held.
+        """
+        entries = self._scan()
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * self.evict_to
+        entries.sort()
+        for _, key in entries:
+            if self.total_bytes <= target:
+                break
+            self._remove(self._path(key))
+            self._forget(key)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class TieredCache:
+    """
+    Memory LRU in front of a disk store. Values are kept as live objects in memory
+    and serialized (pickle by default) on disk. Code on the event loop uses aget(),
+    aset() and adelete(), which run the disk tier in a thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        memory: MemoryLRU,
+        disk: Optional[DiskStore] = None,
+        dumps: Callable[[Any], bytes] = pickle.dumps,
+        loads: Callable[[bytes], Any] = pickle.loads,
+    ):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+        self.dumps = dumps
+        self.loads = loads
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def _get_disk(self, key: str):
+        try:
+            data = self.disk.get(key)
+            if data is not None:
+                value = self.loads(data)
+                self.memory.set(key, value)
+                self.stats["disk_hits"] += 1
+                return value
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"{self.name} cache read failed for {key}: {str(e)}")
+            self.disk.delete(key)
+        self.stats["misses"] += 1
+        return None
+
+    def _set_disk(self, key: str, value) -> None:
+        try:
+            self.disk.set(key, self.dumps(value))
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"{self.name} cache write failed for {key}: {str(e)}")
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.disk is None:
+            self.stats["misses"] += 1
+            return None
+        return self._get_disk(key)
+
+    def set(self, key: str, value) -> None:
+        self.memory.set(key, value)
+        self.stats["stores"] += 1
+        if self.disk is not None:
+            self._set_disk(key, value)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    async def aget(self, key: str):
+        """
+        get() for the event loop: memory hits are answered inline, disk reads run in a thread.
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.disk is None:
+            self.stats["misses"] += 1
+            return None
+        return await asyncio.to_thread(self._get_disk, key)
+
+    async def aset(self, key: str, value) -> None:
+        """
+        set() for the event loop, writing the disk tier in a thread.
+        """
+        self.memory.set(key, value)
+        self.stats["stores"] += 1
+        if self.disk is not None:
+            await asyncio.to_thread(self._set_disk, key, value)
+
+    async def adelete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.delete, key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.total_bytes,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+def normalize_input(text: str) -> str:
+    """
+    Collapse whitespace so cosmetically different prompts share a cache entry.
+    """
+    return " ".join(text.split())
+
+
+@functools.lru_cache(maxsize=None)
+def output_schema(output_type):
+    """
+    JSON schema of an agent's output type. Generating it costs more than the rest of a
+    cache lookup, so it's done once per type; callers must not modify the result.
+    """
+    return output_type.model_json_schema() if hasattr(output_type, "model_json_schema") else repr(output_type)
+
+
+def agent_cache_key(agent, input_prompt: str) -> str:
+    """
+    Content-addressed key for an agent call: agent name, instructions, output schema and normalized input.
+    """
+    schema = output_schema(getattr(agent, "output_type", None))
+    payload = json.dumps(
+        {
+            "agent": agent.name,
+            "instructions": agent.instructions if isinstance(agent.instructions, str) else repr(agent.instructions),
+            "model": repr(getattr(agent, "model", None)),
+            "output_schema": schema,
+            "input": normalize_input(input_prompt),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash of a rendered document, used both as the PDF cache key and as its ETag.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(agent) -> bool:
+    return agent.name in RESPONSE_CACHE_AGENTS
+
+
+response_cache = TieredCache(
+    "response",
+    MemoryLRU(RESPONSE_CACHE_MEMORY_ENTRIES),
+    DiskStore(os.path.join(CACHE_DIR, "responses"), RESPONSE_CACHE_DISK_TTL, RESPONSE_CACHE_DISK_MAX_BYTES),
+)
+
+# Rendered PDFs, keyed by content_hash of the final HTML. Stored as raw bytes on disk.
+pdf_cache = TieredCache(
+    "pdf",
+    MemoryLRU(PDF_CACHE_MEMORY_ENTRIES, PDF_CACHE_MEMORY_MAX_BYTES),
+    DiskStore(os.path.join(CACHE_DIR, "pdfs"), PDF_CACHE_DISK_TTL, PDF_CACHE_DISK_MAX_BYTES),
+    dumps=bytes,
+    loads=bytes,
+)
@@ -0,0 +1,173 @@
+import os
+import asyncio
+import random
+import logging
+from typing import Dict, List, Optional
+
+from schemas import ContentTopic
+from agent_runner import run_agent
+from cache import content_hash
+from deadline import DeadlineExceeded
+from llm_limiter import is_final
+
+logger = logging.getLogger(__name__)
+
+# Parallel content generation settings
+PARALLEL_CONTENT_DEFAULT = os.getenv("CRAMPLAN_PARALLEL_CONTENT", "true").lower() in ("1", "true", "yes")
+CONTENT_CONCURRENCY = int(os.getenv("CRAMPLAN_CONTENT_CONCURRENCY", "5"))
+CONTENT_TOPIC_RETRIES = int(os.getenv("CRAMPLAN_CONTENT_TOPIC_RETRIES", "2"))
+CONTENT_RETRY_BASE_DELAY = float(os.getenv("CRAMPLAN_CONTENT_RETRY_BASE_DELAY", "1.0"))
+
+# Understanding bands content is pitched at: (name, upper bound of the score in percent)
+UNDERSTANDING_BUCKETS = (("beginner", 40.0), ("intermediate", 75.0), ("advanced", 100.0))
+
+
+def format_topic(topic, index: int = 0) -> str:
+    """
+    Format a single topic the same way the endpoints format topic lists.
+    """
+    return f"{index+1}. {topic.topic}\n   Description: {topic.description}\n   Subtopics: {', '.join(topic.subtopics)}"
+
+
+def format_topics(topics) -> str:
+    return "\n".join(format_topic(topic, i) for i, topic in enumerate(topics))
+
+
+def topic_content_prompt(topic, bucket: Optional[str] = None, words: Optional[int] = None) -> str:
+    prompt = f"""Here is the topic to write content for:\n{format_topic(topic)}
+You need to output the main content, its description and the subtopics with the content for each subtopic."""
+    if bucket:
+        prompt += f"\nThe student's understanding of this topic is {bucket}; pitch the content at that level."
+    if words:
+        prompt += f"\nThis study plan is needed quickly: keep each subtopic to about {words} words rather than 1000+."
+    return prompt
+
+
+def trim_subtopics(topics: List, limit: int) -> List:
+    """
+    The topics with at most `limit` subtopics each, to cut content generation time.
+    """
+    return [topic if len(topic.subtopics) <= limit else topic.model_copy(update={"subtopics": topic.subtopics[:limit]})
+            for topic in topics]
+
+
+def topic_key(topic) -> str:
+    """
+    Identity of a topic for reusing its generated section: same title, description
+    and subtopics means the same prompt, wherever the topic sits in the list.
+    """
+    return content_hash(format_topic(topic))
+
+
+def title_key(title: str) -> str:
+    """
+    A topic title with case and spacing normalized, for matching topics across outlines
+    (quiz scores, curated topics) that an LLM may have rewritten.
+    """
+    return " ".join(title.split()).lower()
+
+
+def outline_key(topic) -> str:
+    """
+    A topic's title and subtopics with title_key() applied, for matching a section to a
+    topic whose description was rewritten; a section is only reused when both match.
+    """
+    return "\n".join(title_key(title) for title in [topic.topic, *topic.subtopics])
+
+
+def understanding_bucket(score: Optional[float]) -> Optional[str]:
+    if score is None:
+        return None
+    for name, upper in UNDERSTANDING_BUCKETS:
+        if score < upper:
+            return name
+    return UNDERSTANDING_BUCKETS[-1][0]
+
+
+def topic_buckets(topics: List, scores: Dict[str, float]) -> Dict[str, Optional[str]]:
+    """
+    Understanding bucket per topic_key(); scores are matched to topics by title,
+    ignoring case and spacing. Topics without a score get None.
+    """
+    by_title = {title_key(title): score for title, score in scores.items()}
+    return {topic_key(topic): understanding_bucket(by_title.get(title_key(topic.topic))) for topic in topics}
+
+
+def section_key(topic, bucket: Optional[str]) -> str:
+    """
+    Storage key of a generated section: the topic (with its subtopics) and the bucket it was written for.
+    """
+    return f"{topic_key(topic)}:{bucket or 'any'}"
+
+
+async def generate_topic_content(topic, bucket: Optional[str] = None, retries: int = CONTENT_TOPIC_RETRIES,
+                                 words: Optional[int] = None):
+    """
+    Generate the ContentMain for a single topic, retrying only this topic on failure.
+    `words` overrides the usual length per subtopic.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await run_agent("topic_content_writer_agent", topic_content_prompt(topic, bucket, words))
+        except (asyncio.CancelledError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            # Rejections and provider errors already went through the limiter's retries
+            if attempt >= retries or is_final(e):
+                logger.error(f"Content generation failed for topic '{topic.topic}' after {attempt + 1} attempts")
+                raise
+            delay = CONTENT_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"Content generation failed for topic '{topic.topic}' (attempt {attempt + 1}): {str(e)}; retrying in {delay:.1f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def generate_content_parallel(topics: List, concurrency: Optional[int] = None,
+                                    prefetched: Optional[Dict[str, asyncio.Future]] = None,
+                                    buckets: Optional[Dict[str, Optional[str]]] = None,
+                                    stored: Optional[Dict[str, object]] = None,
+                                    words: Optional[int] = None) -> ContentTopic:
+    """
+    Generate content with one agent call per topic, at most `concurrency` at a time.
+
+    `buckets` maps topic_key() to the understanding bucket each topic is written for.
+    `stored` maps section_key() to sections generated earlier, which are reused as is.
+    `prefetched` maps topic_key() to sections already being generated (speculatively);
+    those are awaited instead of generated again. `words` shortens newly generated
+    sections; prefetched sections were written at full length, so they are cancelled
+    and generated again. Sections are returned in the same order as the given (curated) topics.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or CONTENT_CONCURRENCY))
+    prefetched = prefetched or {}
+    if words:
+        for future in prefetched.values():
+            future.cancel()
+        prefetched = {}
+    buckets = buckets or {}
+    stored = stored or {}
+
+    async def bounded(topic):
+        bucket = buckets.get(topic_key(topic))
+        section = stored.get(section_key(topic, bucket))
+        if section is not None:
+            return section
+        future = prefetched.get(topic_key(topic))
+        if future is not None:
+            try:
+                return await future
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            except Exception as e:
+                logger.warning(f"Pre-generated content for topic '{topic.topic}' failed ({str(e)}); regenerating")
+        async with semaphore:
+            return await generate_topic_content(topic, bucket, words=words)
+
+    # Let every topic finish (successful ones land in the response cache) before
+    # surfacing the first failure, so a retried request only redoes failed topics.
+    sections = await asyncio.gather(*(bounded(topic) for topic in topics), return_exceptions=True)
+    for section in sections:
+        if isinstance(section, BaseException):
+            raise section
+    return ContentTopic(topic=list(sections))
@@ -0,0 +1,88 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+# Request deadlines, in seconds from arrival: the X-Request-Deadline header or the
+# deadline query parameter. CRAMPLAN_FLOW_DEADLINE applies when neither is sent (0: none).
+DEADLINE_HEADER = "X-Request-Deadline"
+FLOW_DEADLINE_DEFAULT = float(os.getenv("CRAMPLAN_FLOW_DEADLINE", "0"))
+
+# How long the later flow stages usually take, used to decide what to cut when the
+# remaining budget runs short: curation, full content, and shortened content.
+CURATE_ESTIMATE = float(os.getenv("CRAMPLAN_DEADLINE_CURATE_SECONDS", "15"))
+CONTENT_ESTIMATE = float(os.getenv("CRAMPLAN_DEADLINE_CONTENT_SECONDS", "120"))
+SHORT_CONTENT_ESTIMATE = float(os.getenv("CRAMPLAN_DEADLINE_SHORT_CONTENT_SECONDS", "60"))
+# What degraded content is cut to: words per subtopic and subtopics per topic
+DEGRADED_CONTENT_WORDS = int(os.getenv("CRAMPLAN_DEGRADED_CONTENT_WORDS", "400"))
+DEGRADED_SUBTOPICS = int(os.getenv("CRAMPLAN_DEGRADED_SUBTOPICS", "2"))
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request's deadline passes before its work is done; callers should answer 504.
+    """
+
+
+class Deadline:
+    """
+    A point in time a request must finish by, carried through every stage via current_deadline.
+    """
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, stage: str) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Request deadline of {self.budget:g}s exceeded before {stage}")
+
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def parse_deadline(header: Optional[str], query: Optional[float]) -> Optional[Deadline]:
+    """
+    The request's deadline from the query parameter, else the header, else the default.
+    """
+    seconds = query
+    if seconds is None and header:
+        try:
+            seconds = float(header)
+        except ValueError:
+            raise ValueError(f"Invalid {DEADLINE_HEADER} header {header!r}: expected seconds")
+    if seconds is None:
+        seconds = FLOW_DEADLINE_DEFAULT or None
+    if seconds is None:
+        return None
+    if seconds <= 0:
+        raise ValueError(f"Deadline must be positive, got {seconds:g}s")
+    return Deadline(seconds)
+
+
+def skip_curation(deadline: Optional[Deadline]) -> bool:
+    """
+    Whether to skip curation (keeping the original topic order) to leave time for the content.
+    """
+    return deadline is not None and deadline.remaining() < CURATE_ESTIMATE + CONTENT_ESTIMATE
+
+
+def content_targets(deadline: Optional[Deadline]) -> Tuple[Optional[int], Optional[int], List[str]]:
+    """
+    (words per subtopic, subtopics per topic, degradations) for the content stage given
+    the time left. None means the agent's usual targets.
+    """
+    if deadline is None:
+        return None, None, []
+    remaining = deadline.remaining()
+    if remaining >= CONTENT_ESTIMATE:
+        return None, None, []
+    if remaining >= SHORT_CONTENT_ESTIMATE:
+        return DEGRADED_CONTENT_WORDS, None, ["short_content"]
+    return DEGRADED_CONTENT_WORDS, DEGRADED_SUBTOPICS, ["short_content", "fewer_subtopics"]
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from typing import Awaitable
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+# Non-standard "client closed request" status, recorded in the HTTP metrics for abandoned requests
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """
+    Return once the client has gone away. The request body must already have been read.
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable):
+    """
+    Await `work`, cancelling it (and every agent call and render under it) if the client
+    disconnects first. Raises a 499 HTTPException in that case; the client never sees it,
+    but the request is counted with that status.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        # We were cancelled ourselves (e.g. shutdown, or the server noticed the disconnect
+        # first): take the work down with us
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task.done():
+        return task.result()
+    if watcher.exception() is not None:
+        logger.warning(f"Disconnect detection failed for {request.url.path}: {str(watcher.exception())}")
+        return await task
+
+    logger.info(f"Client disconnected from {request.url.path}; cancelling its work")
+    task.cancel()
+    try:
+        # Let the work clean up (save partial results, release slots) before answering
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.warning(f"Cancelled work for {request.url.path} failed: {str(e)}")
+    raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
@@ -0,0 +1,294 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, List, Optional
+
+from agents import Model, Usage, set_tracing_disabled
+from agents.items import ModelResponse
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseCreatedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+import llm_main
+from llm_main import ListOfTopics, Topic, ListOfQuizQuestions, QuizQuestions, ContentTopic, ContentMain, ContentSub
+
+logger = logging.getLogger(__name__)
+
+# Fake model settings
+FAKE_LLM_LATENCY = float(os.getenv("CRAMPLAN_FAKE_LLM_LATENCY", "0.2"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("CRAMPLAN_FAKE_LLM_TOKENS_PER_SECOND", "2000"))
+FAKE_LLM_TOPICS = int(os.getenv("CRAMPLAN_FAKE_LLM_TOPICS", "5"))
+FAKE_LLM_WORDS_PER_SUBTOPIC = int(os.getenv("CRAMPLAN_FAKE_LLM_WORDS_PER_SUBTOPIC", "300"))
+
+FILLER = ("A linear map preserves addition and scaling, so it is fully described by where it sends "
+          "a basis, which is exactly what the columns of its matrix record. ").split()
+
+TOPIC_LINE = re.compile(r"^\s*\d+\.\s+(.+)$")
+SUBTOPICS_LINE = re.compile(r"^\s*Subtopics:\s*(.*)$")
+SCORE_LINE = re.compile(r"^(.+): ([0-9.]+)%$")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def parse_topics(text: str) -> List[tuple]:
+    """
+    Recover (title, subtopics) pairs from a prompt built by format_topics().
+    """
+    topics = []
+    for line in text.splitlines():
+        match = TOPIC_LINE.match(line)
+        if match:
+            topics.append((match.group(1).strip(), []))
+            continue
+        match = SUBTOPICS_LINE.match(line)
+        if match and topics:
+            topics[-1][1].extend(s.strip() for s in match.group(1).split(",") if s.strip())
+    return topics
+
+
+def filler_text(rng: random.Random, words: int) -> str:
+    start = rng.randrange(len(FILLER))
+    return " ".join(FILLER[(start + i) % len(FILLER)] for i in range(words))
+
+
+def canned_output(output_type, prompt: str, rng: random.Random):
+    """
+    A structurally valid output for each agent's output type, shaped by the prompt.
+    """
+    if output_type is ListOfTopics:
+        # Curation keeps the scored topics' titles, weakest first, like the real agent;
+        # otherwise vary titles with the prompt so different prompts lead to different content calls
+        scored = [match.groups() for match in map(SCORE_LINE.match, prompt.splitlines()) if match]
+        tag = rng.randrange(10 ** 6)
+        titles = ([title for title, score in sorted(scored, key=lambda item: float(item[1]))] or
+                  [f"Topic {i + 1} ({tag})" for i in range(FAKE_LLM_TOPICS)])
+        return ListOfTopics(list_of_topics=[
+            Topic(topic=title, description=filler_text(rng, 20),
+                  subtopics=[f"Concept {i + 1}.{j + 1}" for j in range(3)])
+            for i, title in enumerate(titles)
+        ])
+    topics = parse_topics(prompt) or [("General", ["Overview"])]
+    if output_type is ListOfQuizQuestions:
+        return ListOfQuizQuestions(list_quiz_questions=[
+            QuizQuestions(topic=topics[i % len(topics)][0],
+                          quiz_question=f"Question {rng.randrange(10 ** 6)} on {topics[i % len(topics)][0]}?",
+                          choice_a="first", choice_b="second", choice_c="third", choice_d="fourth",
+                          correct_answer=rng.choice("abcd"))
+            for i in range(10)
+        ])
+
+    def section(title, subtopics):
+        return ContentMain(topic_title=title, main_description=filler_text(rng, 40), subtopics=[
+            ContentSub(sub_topic_title=name, sub_content_text=filler_text(rng, FAKE_LLM_WORDS_PER_SUBTOPIC))
+            for name in subtopics or ["Overview"]
+        ])
+
+    if output_type is ContentMain:
+        return section(*topics[0])
+    if output_type is ContentTopic:
+        return ContentTopic(topic=[section(title, subtopics) for title, subtopics in topics])
+    raise ValueError(f"No canned output for {output_type!r}")
+
+
+def prompt_text(system_instructions, input) -> str:
+    if isinstance(input, str):
+        return input
+    parts = []
+    for item in input:
+        content = item.get("content") if isinstance(item, dict) else getattr(item, "content", None)
+        parts.append(content if isinstance(content, str) else json.dumps(content, default=str))
+    return "\n".join(parts)
+
+
+def fake_completion(output_type, system_instructions, prompt: str):
+    """
+    Canned output JSON for a call plus its (input, output) token estimates.
+    Deterministic for a given prompt.
+    """
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    output = canned_output(output_type, prompt, rng).model_dump_json()
+    return output, estimate_tokens((system_instructions or "") + prompt), estimate_tokens(output)
+
+
+class FakeModel(Model):
+    """
+    Local stand-in for the LLM: sleeps for `latency` plus the output's tokens at
+    `tokens_per_second`, then returns canned structured output for the agent's
+    output type. Outputs are deterministic for a given prompt.
+    """
+
+    def __init__(self, latency: float = FAKE_LLM_LATENCY, tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+
+    def __repr__(self) -> str:
+        return f"FakeModel(latency={self.latency}, tokens_per_second={self.tokens_per_second})"
+
+    def _generate(self, system_instructions, input, output_schema):
+        self.calls += 1
+        return fake_completion(output_schema.output_type, system_instructions, prompt_text(system_instructions, input))
+
+    def _generation_time(self, output_tokens: int) -> float:
+        return output_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    @staticmethod
+    def _message(text: str) -> ResponseOutputMessage:
+        return ResponseOutputMessage(
+            id="msg_fake", type="message", role="assistant", status="completed",
+            content=[ResponseOutputText(type="output_text", text=text, annotations=[])],
+        )
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, *, previous_response_id=None, conversation_id=None, prompt=None) -> ModelResponse:
+        text, input_tokens, output_tokens = self._generate(system_instructions, input, output_schema)
+        await asyncio.sleep(self.latency + self._generation_time(output_tokens))
+        usage = Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                      total_tokens=input_tokens + output_tokens)
+        return ModelResponse(output=[self._message(text)], usage=usage, response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, *, previous_response_id=None, conversation_id=None,
+                              prompt=None) -> AsyncIterator:
+        text, input_tokens, output_tokens = self._generate(system_instructions, input, output_schema)
+        response = Response.model_construct(
+            id="resp_fake", object="response", created_at=time.time(), model="fake", status="in_progress",
+            output=[], tools=[], tool_choice="auto", parallel_tool_calls=False,
+        )
+        sequence = 0
+        yield ResponseCreatedEvent.model_construct(type="response.created", sequence_number=sequence, response=response)
+        await asyncio.sleep(self.latency)
+
+        # Deltas of ~16 tokens, paced at the configured token rate
+        chunk = 64
+        for offset in range(0, len(text), chunk):
+            delta = text[offset:offset + chunk]
+            await asyncio.sleep(self._generation_time(estimate_tokens(delta)))
+            sequence += 1
+            yield ResponseTextDeltaEvent.model_construct(
+                type="response.output_text.delta", sequence_number=sequence, item_id="msg_fake",
+                output_index=0, content_index=0, delta=delta, logprobs=[],
+            )
+
+        completed = response.model_copy(update={
+            "status": "completed",
+            "output": [self._message(text)],
+            "usage": ResponseUsage.model_construct(
+                input_tokens=input_tokens, output_tokens=output_tokens, total_tokens=input_tokens + output_tokens,
+                input_tokens_details=InputTokensDetails.model_construct(cached_tokens=0),
+                output_tokens_details=OutputTokensDetails.model_construct(reasoning_tokens=0),
+            ),
+        })
+        yield ResponseCompletedEvent.model_construct(type="response.completed", sequence_number=sequence + 1,
+                                                     response=completed)
+
+
+def install_fake_model(model: FakeModel) -> None:
+    """
+    Point every agent in llm_main at `model`, with tracing off so nothing leaves the machine.
+    """
+    set_tracing_disabled(True)
+    for value in vars(llm_main).values():
+        if isinstance(value, llm_main.Agent):
+            value.model = model
+    logger.info(f"Agents now use {model!r}")
+
+
+def create_stub_app(latency: float = FAKE_LLM_LATENCY, tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND):
+    """
+    A stand-in for the OpenAI Responses API (POST /v1/responses, plain and streamed)
+    serving the same canned output as FakeModel. Point the API at it with
+    CRAMPLAN_OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 to exercise the real
+    client and connection pool without calling OpenAI.
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    # The agent is recognized by its instructions, which every request carries
+    output_types = {value.instructions: value.output_type
+                    for value in vars(llm_main).values() if isinstance(value, llm_main.Agent)}
+    timing = FakeModel(latency=latency, tokens_per_second=tokens_per_second)
+    app = FastAPI(title="Stub OpenAI Responses API")
+    app.state.stats = {"requests": 0, "streams": 0, "models": {}}
+
+    def response_body(model: str, status: str, text: Optional[str] = None, usage: Optional[dict] = None) -> dict:
+        output = [] if text is None else [{
+            "id": "msg_stub", "type": "message", "role": "assistant", "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }]
+        return {"id": "resp_stub", "object": "response", "created_at": time.time(), "model": model,
+                "status": status, "output": output, "parallel_tool_calls": False, "tool_choice": "auto",
+                "tools": [], "usage": usage}
+
+    def sse(event: dict) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        body = await request.json()
+        output_type = output_types.get(body.get("instructions"))
+        if output_type is None:
+            return JSONResponse({"error": {"message": "Unknown agent instructions", "type": "invalid_request_error"}},
+                                status_code=400)
+        text, input_tokens, output_tokens = fake_completion(output_type, body.get("instructions"),
+                                                            prompt_text(None, body.get("input", "")))
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens,
+                 "input_tokens_details": {"cached_tokens": 0}, "output_tokens_details": {"reasoning_tokens": 0}}
+        model = body.get("model", "stub")
+        app.state.stats["requests"] += 1
+        app.state.stats["models"][model] = app.state.stats["models"].get(model, 0) + 1
+        if not body.get("stream"):
+            await asyncio.sleep(timing.latency + timing._generation_time(output_tokens))
+            return JSONResponse(response_body(model, "completed", text, usage))
+
+        app.state.stats["streams"] += 1
+
+        async def events():
+            sequence = 0
+            yield sse({"type": "response.created", "sequence_number": sequence,
+                       "response": response_body(model, "in_progress")})
+            await asyncio.sleep(timing.latency)
+            chunk = 64
+            for offset in range(0, len(text), chunk):
+                delta = text[offset:offset + chunk]
+                await asyncio.sleep(timing._generation_time(estimate_tokens(delta)))
+                sequence += 1
+                yield sse({"type": "response.output_text.delta", "sequence_number": sequence, "item_id": "msg_stub",
+                           "output_index": 0, "content_index": 0, "delta": delta, "logprobs": []})
+            yield sse({"type": "response.completed", "sequence_number": sequence + 1,
+                       "response": response_body(model, "completed", text, usage)})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a stub OpenAI Responses API with canned output")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=FAKE_LLM_LATENCY, help="Time to first token, in seconds")
+    parser.add_argument("--token-rate", type=float, default=FAKE_LLM_TOKENS_PER_SECOND, help="Output tokens per second")
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(args.latency, args.token_rate), host="127.0.0.1", port=args.port)
@@ -0,0 +1,165 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import AGENT_HEDGES
+
+logger = logging.getLogger(__name__)
+
+# Hedging settings. Only the agents listed in CRAMPLAN_HEDGE_AGENTS are hedged.
+HEDGE_AGENTS = {name.strip() for name in os.getenv("CRAMPLAN_HEDGE_AGENTS", "").split(",") if name.strip()}
+HEDGE_PERCENTILE = float(os.getenv("CRAMPLAN_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("CRAMPLAN_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("CRAMPLAN_HEDGE_MIN_DELAY", "0.5"))
+HEDGE_WINDOW = int(os.getenv("CRAMPLAN_HEDGE_WINDOW", "200"))
+# Extra requests allowed per hedgeable call (0.05: at most ~5% more requests), with a small burst
+HEDGE_BUDGET_RATIO = float(os.getenv("CRAMPLAN_HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_BURST = float(os.getenv("CRAMPLAN_HEDGE_BUDGET_BURST", "5"))
+
+
+def percentile(values, pct: float) -> float:
+    """
+    Nearest-rank percentile of a non-empty sequence.
+    """
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class Hedger:
+    """
+    Hedged requests: when a call hasn't finished by the HEDGE_PERCENTILE of its recent
+    latency, a duplicate is started and whichever finishes first is used; the other is
+    cancelled. Latencies are those of first attempts only; a first attempt that loses to
+    its hedge counts with the time it had taken when cancelled. Every hedgeable call earns HEDGE_BUDGET_RATIO of a hedge, so hedges stay
+    a bounded fraction of traffic even when the provider is slow across the board.
+    A hedge is a real request, so it is only fired when the caller's `admit` hook
+    (LLMLimiter.admit_extra) finds it a concurrency slot and rate budget right away.
+    """
+
+    def __init__(self, agents=HEDGE_AGENTS, pct: float = HEDGE_PERCENTILE, min_samples: int = HEDGE_MIN_SAMPLES,
+                 min_delay: float = HEDGE_MIN_DELAY, window: int = HEDGE_WINDOW,
+                 budget_ratio: float = HEDGE_BUDGET_RATIO, budget_burst: float = HEDGE_BUDGET_BURST):
+        self.agents = set(agents)
+        self.pct = pct
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window = window
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self.budget = budget_burst
+        self._latencies: Dict[str, deque] = {}
+        self.stats: Dict[str, dict] = {}
+
+    def enabled(self, agent_name: str) -> bool:
+        return agent_name in self.agents
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """
+        How long to wait before hedging calls under `key`, or None while there are too
+        few samples to know what slow looks like.
+        """
+        latencies = self._latencies.get(key)
+        if not latencies or len(latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(latencies, self.pct))
+
+    def _observe(self, key: str, elapsed: float) -> None:
+        latencies = self._latencies.get(key)
+        if latencies is None:
+            latencies = self._latencies[key] = deque(maxlen=self.window)
+        latencies.append(elapsed)
+
+    def _count(self, agent_name: str, event: str) -> None:
+        stats = self.stats.setdefault(agent_name, {"calls": 0, "fired": 0, "won": 0, "budget_exhausted": 0, "throttled": 0})
+        stats[event] += 1
+        if event != "calls":
+            AGENT_HEDGES.inc(agent=agent_name, event=event)
+
+    async def _timed(self, key: str, call: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        result = await call()
+        self._observe(key, time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    async def _released(call: Callable[[], Awaitable], release: Callable[[], None]):
+        try:
+            return await call()
+        finally:
+            release()
+
+    async def run(self, agent_name: str, key: str, call: Callable[[], Awaitable],
+                  admit: Optional[Callable[[], Awaitable[Optional[Callable[[], None]]]]] = None):
+        """
+        Await `call()`, hedging it with a second `call()` if the agent is enabled and the
+        first is slower than usual. `key` groups latencies (e.g. agent and model tier).
+        `admit` is awaited before hedging and returns a function releasing what the
+        hedge holds, or None to skip the hedge.
+        """
+        if not self.enabled(agent_name):
+            return await call()
+        self._count(agent_name, "calls")
+        self.budget = min(self.budget_burst, self.budget + self.budget_ratio)
+        delay = self.hedge_delay(key)
+        # Only primaries are sampled, hedges aren't: they'd only be seen when they win
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(self._timed(key, call))
+        tasks = [primary]
+        hedge = None
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            if self.budget < 1:
+                self._count(agent_name, "budget_exhausted")
+                return await primary
+            release = await admit() if admit is not None else (lambda: None)
+            if release is None:
+                # No slot or rate budget to spare: a hedge would only add to the overload
+                self._count(agent_name, "throttled")
+                return await primary
+            self.budget -= 1
+            self._count(agent_name, "fired")
+            logger.info(f"Hedging {agent_name}: no response after {delay:.2f}s")
+            hedge = asyncio.ensure_future(self._released(call, release))
+            tasks.append(hedge)
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # The first success wins; a failure only counts once both have finished
+                winner = next((task for task in done if not task.cancelled() and task.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        self._count(agent_name, "won")
+                        if not primary.done():
+                            # The slow primary is the tail the delay is meant to track: record
+                            # it as taking at least as long as it has so far (a censored sample)
+                            self._observe(key, time.perf_counter() - started)
+                    return winner.result()
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # retrieved, so a failed loser isn't logged as unhandled
+
+    def get_stats(self) -> dict:
+        return {
+            "agents": sorted(self.agents),
+            "percentile": self.pct,
+            "budget": round(self.budget, 2),
+            "per_agent": {name: dict(stats) for name, stats in self.stats.items()},
+            "hedge_delays": {key: self.hedge_delay(key) for key in self._latencies},
+        }
+
+
+hedger = Hedger()
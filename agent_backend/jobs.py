@@ -0,0 +1,191 @@
+import os
+import time
+import uuid
+import asyncio
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import JOB_QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Job subsystem settings
+JOB_CONCURRENCY = int(os.getenv("CRAMPLAN_JOB_CONCURRENCY", "4"))
+JOB_MAX_QUEUED = int(os.getenv("CRAMPLAN_JOB_MAX_QUEUED", "100"))
+JOB_RETENTION = float(os.getenv("CRAMPLAN_JOB_RETENTION", str(3600)))
+JOB_RETRY_AFTER = int(os.getenv("CRAMPLAN_JOB_RETRY_AFTER", "30"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when too many jobs are waiting; callers should answer 503 with Retry-After.
+    """
+
+    def __init__(self, retry_after: int = JOB_RETRY_AFTER):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    A unit of background work with per-stage progress and named artifacts.
+    """
+
+    def __init__(self, kind: str, stages: List[str], priority: int = 0):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.priority = priority
+        self.status = QUEUED
+        self.stages: Dict[str, dict] = {name: {"status": "pending"} for name in stages}
+        self.artifacts: Dict[str, object] = {}
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def stage_started(self, name: str) -> None:
+        self.stages[name] = {"status": "running", "started_at": time.time()}
+
+    def stage_finished(self, name: str) -> None:
+        stage = self.stages.setdefault(name, {})
+        stage["status"] = "finished"
+        stage["finished_at"] = time.time()
+        if "started_at" in stage:
+            stage["duration"] = stage["finished_at"] - stage["started_at"]
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "stages": self.stages,
+            "artifacts": sorted(self.artifacts),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Priority queue of jobs drained by a fixed number of workers, which is also the
+    global limit on concurrently running jobs. Higher priority runs first; ties run
+    in submission order.
+    """
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, max_queued: int = JOB_MAX_QUEUED,
+                 retention: float = JOB_RETENTION):
+        self.concurrency = max(1, concurrency)
+        self.max_queued = max_queued
+        self.retention = retention
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._counter = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._queued = 0
+        self._stopping = False
+
+    def start(self) -> None:
+        self._stopping = False
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logger.info(f"Job manager started with {self.concurrency} workers")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for job in self.jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, kind: str, stages: List[str], run: Callable[[Job], Awaitable[None]], priority: int = 0) -> Job:
+        """
+        Queue `run(job)` for execution; it reports progress and stores artifacts on the job.
+        """
+        if self._queue is None:
+            raise RuntimeError("Job manager is not running")
+        if self._queued >= self.max_queued:
+            raise JobQueueFull()
+        self._purge()
+        job = Job(kind, stages, priority)
+        self.jobs[job.id] = job
+        self._queued += 1
+        self._queue.put_nowait((-priority, next(self._counter), job, run))
+        return job
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None and not self._stopping and any(not worker.done() for worker in self._workers)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        if job.status == QUEUED:
+            # Frees its queue place now; the worker that dequeues it will skip it
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self._queued -= 1
+        elif job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            _, _, job, run = await self._queue.get()
+            if job.status != QUEUED:
+                # Cancelled while queued, and already uncounted then
+                continue
+            self._queued -= 1
+            job.status = RUNNING
+            job.started_at = time.time()
+            JOB_QUEUE_WAIT_SECONDS.observe(job.started_at - job.created_at, kind=job.kind)
+            job.task = asyncio.create_task(run(job))
+            try:
+                await job.task
+                job.status = SUCCEEDED
+            except asyncio.CancelledError:
+                job.status = CANCELLED
+                # Propagate if the worker itself is being stopped
+                if self._stopping or not job.task.cancelled():
+                    raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+                logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}", exc_info=True)
+            finally:
+                job.finished_at = time.time()
+                job.task = None
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.status in FINISHED_STATES and job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get_stats(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"concurrency": self.concurrency, "queued": self._queued, "max_queued": self.max_queued, "jobs": counts}
+
+
+job_manager = JobManager()
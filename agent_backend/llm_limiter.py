@@ -0,0 +1,261 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import LLM_ADMISSION_WAIT_SECONDS, LLM_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# Admission control settings
+LLM_CONCURRENCY_PER_AGENT = int(os.getenv("CRAMPLAN_LLM_CONCURRENCY_PER_AGENT", "8"))
+LLM_MAX_WAITING_PER_AGENT = int(os.getenv("CRAMPLAN_LLM_MAX_WAITING_PER_AGENT", "32"))
+LLM_ADMISSION_TIMEOUT = float(os.getenv("CRAMPLAN_LLM_ADMISSION_TIMEOUT", "10"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("CRAMPLAN_LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("CRAMPLAN_LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_RETRIES = int(os.getenv("CRAMPLAN_LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("CRAMPLAN_LLM_RETRY_BASE_DELAY", "1.0"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("CRAMPLAN_LLM_RETRY_MAX_DELAY", "30"))
+
+# Expected output tokens per agent, used to estimate a call's token cost up front
+EXPECTED_OUTPUT_TOKENS = {
+    "main_topic_outline_agent": 800,
+    "curated_topic_outline_agent": 800,
+    "open_quiz_agent": 1500,
+    "topic_content_writer_agent": 6000,
+    "content_writer_agent": 25000,
+}
+DEFAULT_OUTPUT_TOKENS = 2000
+
+
+class LLMOverloaded(Exception):
+    """
+    Raised instead of queueing when an agent call can't be admitted soon enough;
+    callers should answer 503 with Retry-After.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` tokens per minute, holding at most
+    one minute's worth. Reservations may put the bucket into debt; the caller then
+    waits until the debt would have been refilled.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` tokens could be taken.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens (possibly into debt) and return how long to wait before using them.
+        """
+        wait = self.wait_time(amount)
+        self.tokens -= min(amount, self.capacity)
+        return wait
+
+    def refund(self, amount: float) -> None:
+        """
+        Return (or, if negative, additionally charge) tokens once a call's real cost is known.
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def estimate_tokens(agent, input_prompt: str) -> int:
+    """
+    Rough token estimate for a call: ~4 characters per input token plus the agent's expected output.
+    """
+    instructions = agent.instructions if isinstance(agent.instructions, str) else ""
+    return (len(input_prompt) + len(instructions)) // 4 + EXPECTED_OUTPUT_TOKENS.get(agent.name, DEFAULT_OUTPUT_TOKENS)
+
+
+def is_retryable(error: Exception) -> bool:
+    # Already loaded by the time an agent call fails; imported here to keep it out of startup
+    import openai
+
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+def is_final(error: Exception) -> bool:
+    """
+    Whether the limiter has already dealt with `error`, so callers shouldn't retry it:
+    its own rejections (answer 503 with Retry-After), and provider errors, which it
+    either retried already or found not worth retrying (4xx).
+    """
+    if isinstance(error, LLMOverloaded):
+        return True
+    import openai
+
+    return isinstance(error, openai.APIError)
+
+
+def retry_after_from(error: Exception) -> Optional[float]:
+    """
+    Provider-suggested delay from a Retry-After header, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMLimiter:
+    """
+    Shared admission control for every agent invocation: a concurrency semaphore per
+    agent with a bounded wait list, plus request and token budgets per minute.
+    Calls that can't be admitted within `admission_timeout` fail fast with LLMOverloaded.
+    """
+
+    def __init__(self):
+        self.admission_timeout = LLM_ADMISSION_TIMEOUT
+        self.max_waiting = LLM_MAX_WAITING_PER_AGENT
+        self.request_bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self.token_bucket = TokenBucket(LLM_TOKENS_PER_MINUTE)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._waiting: Dict[str, int] = {}
+        self.stats = {"admitted": 0, "rejected": 0, "retries": 0, "throttled_seconds": 0.0}
+
+    def _semaphore(self, agent_name: str) -> asyncio.Semaphore:
+        if agent_name not in self._semaphores:
+            limit = int(os.getenv(f"CRAMPLAN_LLM_CONCURRENCY_{agent_name.upper()}", str(LLM_CONCURRENCY_PER_AGENT)))
+            self._semaphores[agent_name] = asyncio.Semaphore(max(1, limit))
+        return self._semaphores[agent_name]
+
+    def _reject(self, agent_name: str, message: str, retry_after: float):
+        self.stats["rejected"] += 1
+        LLM_REJECTED.inc(agent=agent_name)
+        logger.warning(f"LLM admission rejected: {message}")
+        raise LLMOverloaded(message, retry_after)
+
+    async def _acquire_budget(self, agent_name: str, tokens: int) -> None:
+        wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+        if wait > self.admission_timeout:
+            self._reject(agent_name, f"rate budget exhausted for {agent_name}", wait)
+        wait = max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+        if wait > 0:
+            self.stats["throttled_seconds"] += wait
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def admit(self, agent, tokens: int):
+        """
+        Hold a concurrency slot for `agent` and spend `tokens` of the per-minute budgets.
+        """
+        semaphore = self._semaphore(agent.name)
+        start = time.perf_counter()
+        if semaphore.locked():
+            if self._waiting.get(agent.name, 0) >= self.max_waiting:
+                self._reject(agent.name, f"too many queued calls for {agent.name}", self.admission_timeout)
+            self._waiting[agent.name] = self._waiting.get(agent.name, 0) + 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.admission_timeout)
+            except asyncio.TimeoutError:
+                self._reject(agent.name, f"no free slot for {agent.name}", self.admission_timeout)
+            finally:
+                self._waiting[agent.name] -= 1
+        else:
+            await semaphore.acquire()
+        try:
+            await self._acquire_budget(agent.name, tokens)
+            self.stats["admitted"] += 1
+            LLM_ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, agent=agent.name)
+            yield
+        finally:
+            semaphore.release()
+
+    async def admit_extra(self, agent, tokens: int) -> Optional[Callable[[], None]]:
+        """
+        Admit a duplicate of a call that is already running (a hedge), but only if there
+        is headroom right now: a free slot for `agent` and budget without waiting. Returns
+        a function that releases the slot, or None when nothing was taken.
+        """
+        semaphore = self._semaphore(agent.name)
+        if semaphore.locked() or max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens)) > 0:
+            return None
+        await semaphore.acquire()
+        self.request_bucket.reserve(1)
+        self.token_bucket.reserve(tokens)
+        self.stats["admitted"] += 1
+        return semaphore.release
+
+    async def charge(self, agent, tokens: int) -> None:
+        """
+        Spend budget for another request made under an admission already held (e.g. a
+        failover to another tier), waiting or raising LLMOverloaded like a retry does.
+        """
+        await self._acquire_budget(agent.name, tokens)
+
+    async def run(self, agent, input_prompt: str, call: Callable[[], Awaitable]):
+        """
+        Run `call` under admission control, retrying 429/5xx/connection errors with
+        exponential backoff and full jitter (honoring Retry-After when the provider sends one).
+        """
+        tokens = estimate_tokens(agent, input_prompt)
+        async with self.admit(agent, tokens):
+            attempt = 0
+            while True:
+                try:
+                    result = await call()
+                    break
+                except Exception as e:
+                    if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                        raise
+                    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+                    delay = max(delay, retry_after_from(e) or 0.0)
+                    attempt += 1
+                    self.stats["retries"] += 1
+                    logger.warning(f"{agent.name} call failed ({str(e)}); retry {attempt}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    # Each retry is another request against the provider's budgets
+                    await self._acquire_budget(agent.name, tokens)
+        self._reconcile(tokens, result)
+        return result
+
+    def _reconcile(self, estimated: int, result) -> None:
+        usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if isinstance(actual, int) and actual > 0:
+            self.token_bucket.refund(estimated - actual)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "waiting": dict(self._waiting),
+            "request_budget": round(self.request_bucket.tokens, 1),
+            "token_budget": round(self.token_bucket.tokens, 1),
+        }
+
+
+llm_limiter = LLMLimiter()
@@ -12,16 +12,11 @@ from openai.types.responses import (
 # Import environment setup to ensure it's loaded
 import env_setup
 
+from schemas import Topic, ListOfTopics, QuizQuestions, ListOfQuizQuestions, ContentSub, ContentMain, ContentTopic
+from quiz_evaluation import evaluate_quiz_understanding
+
 # Remove duplicate load_dotenv and environment variable setting
 # since it's now handled by env_setup
-class Topic(BaseModel):
-    topic: str
-    description: str
-    subtopics: list[str]
-
-class ListOfTopics(BaseModel):
-    list_of_topics: list[Topic]  # Now it's a list of strings
-
 main_topic_outline_agent = Agent(
     name="main_topic_outline_agent",
     instructions="""
@@ -41,83 +36,23 @@ curated_topic_outline_agent = Agent(
     output_type=ListOfTopics
 )
 
-class QuizQuestions(BaseModel):
-     topic: str
-     quiz_question: str
-     choice_a: str
-     choice_b: str
-     choice_c: str
-     choice_d: str
-     correct_answer: str
-
-class ListOfQuizQuestions(BaseModel):
-     list_quiz_questions: list[QuizQuestions]
-
-
 open_quiz_agent = Agent(
     name="open_quiz_agent",
     instructions="Read the given list of topics, and create 10 multiple choice quiz of a,b,c,d that covers all the topics. The correct answer should be a,b,c,d",
     output_type=ListOfQuizQuestions,
 )
 
-class ContentSub(BaseModel):
-    sub_topic_title: str
-    sub_content_text: str
-
-class ContentMain(BaseModel):
-    topic_title: str
-    main_description: str
-    subtopics: list[ContentSub]
-
-class ContentTopic(BaseModel):
-     topic: list[ContentMain] 
-
-
-
 content_writer_agent = Agent(
     name="content_writer_agent",
     instructions="""You will be given a list of topics, for each topic, you will write a general main description for the topic. For each of the topics, you will be given a list of subtopics, you will write the subtopic title and the content for the subtopic. Focus on writing the content of the subtopics to be 1000+ words. In the content of the subtopics, try to add understanding of the key concepts, practical examples, real life applications (if applicable), summary of the subtopic and its connection to other subtopics.""",
     output_type=ContentTopic
 )
 
-def evaluate_quiz_understanding(quiz_results, user_answers):
-    """
-    Evaluate user's understanding of each topic based on quiz answers.
-    
-    Args:
-        quiz_results: ListOfQuizQuestions object from AI
-        user_answers: list of answers in format [{'question_index': 0, 'answer': 'a'}, ...]
-    
-    Returns:
-        dict: Topic understanding scores {topic: percentage}
-    """
-    # Initialize topic understanding dictionary
-    topic_understanding = {}
-    topic_question_count = {}
-    
-    # Process each question and answer
-    for i, question in enumerate(quiz_results.list_quiz_questions):
-        topic = question.topic
-        
-        # Initialize topic if not seen before
-        if topic not in topic_understanding:
-            topic_understanding[topic] = 0
-            topic_question_count[topic] = 0
-            
-        # Get user's answer for this question
-        user_answer = next((ans['answer'] for ans in user_answers if ans['question_index'] == i), None)
-        
-        # Compare answers
-        if user_answer and user_answer.lower() == question.correct_answer.lower():
-            topic_understanding[topic] += 1
-        topic_question_count[topic] += 1
-    
-    # Calculate percentages for each topic
-    for topic in topic_understanding:
-        if topic_question_count[topic] > 0:
-            topic_understanding[topic] = (topic_understanding[topic] / topic_question_count[topic]) * 100
-            
-    return topic_understanding
+topic_content_writer_agent = Agent(
+    name="topic_content_writer_agent",
+    instructions="""You will be given a single topic with its description and a list of subtopics. Write a general main description for the topic, then for each subtopic, in the given order, write the subtopic title and the content for the subtopic. Focus on writing the content of the subtopics to be 1000+ words. In the content of the subtopics, try to add understanding of the key concepts, practical examples, real life applications (if applicable), summary of the subtopic and its connection to other subtopics.""",
+    output_type=ContentMain
+)
 
 async def main():
     input_prompt = input("What is the main subject of the content? ")
@@ -0,0 +1,239 @@
+import time
+import bisect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Tuple
+
+# Latency buckets in seconds, from a cache hit to a full content generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = tuple(kb * 1024 for kb in (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384))
+
+# The endpoint (request path) whose handling is running, used to label work done on its behalf
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="background")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with labels. Updates are a dict lookup and an add, cheap enough
+    for every request; all updates happen on the event loop thread.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with labels; observing is a bisect plus three adds.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    Gauge read from a callback at scrape time, so it costs nothing between scrapes.
+    """
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(self.read())}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "cramplan_http_requests_total", "HTTP requests by route, method and status.", ("endpoint", "method", "status"))
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "cramplan_http_request_seconds", "Time to fully send an HTTP response.", ("endpoint", "method"))
+AGENT_CALLS = registry.counter(
+    "cramplan_agent_calls_total", "Agent calls by outcome (ok, error, cache_hit, cancelled).",
+    ("agent", "endpoint", "outcome"))
+AGENT_RUN_SECONDS = registry.histogram(
+    "cramplan_agent_run_seconds", "Duration of Runner.run / Runner.run_streamed per agent and model tier.",
+    ("agent", "endpoint", "tier"))
+AGENT_TOKENS = registry.counter(
+    "cramplan_agent_tokens_total", "LLM tokens used, by model tier and direction (input, output).",
+    ("agent", "endpoint", "tier", "direction"))
+MODEL_TIER_CALLS = registry.counter(
+    "cramplan_model_tier_calls_total", "Agent calls by the model tier that served them.",
+    ("agent", "endpoint", "tier", "fallback"))
+AGENT_HEDGES = registry.counter(
+    "cramplan_agent_hedges_total", "Hedged agent requests: fired, won (hedge finished first), budget_exhausted.",
+    ("agent", "event"))
+AGENT_SLO_MISSES = registry.counter(
+    "cramplan_agent_slo_misses_total", "Agent calls that exceeded their latency SLO on a tier.", ("agent", "tier"))
+LLM_ADMISSION_WAIT_SECONDS = registry.histogram(
+    "cramplan_llm_admission_wait_seconds", "Time agent calls wait for a concurrency slot and rate budget.", ("agent",))
+LLM_REJECTED = registry.counter(
+    "cramplan_llm_rejected_total", "Agent calls rejected by admission control.", ("agent",))
+MARKDOWN_SECONDS = registry.histogram(
+    "cramplan_markdown_seconds", "Markdown assembly (markdown) and conversion to HTML (html).", ("endpoint", "step"))
+PDF_RENDER_SECONDS = registry.histogram(
+    "cramplan_pdf_render_seconds", "WeasyPrint render time inside a render worker.", ("endpoint",))
+PDF_QUEUE_WAIT_SECONDS = registry.histogram(
+    "cramplan_pdf_queue_wait_seconds", "Time a render spends queued for (or shipping to) a render worker.", ("endpoint",))
+PDF_BYTES = registry.histogram(
+    "cramplan_pdf_bytes", "Size of rendered PDFs.", ("endpoint",), buckets=SIZE_BUCKETS)
+PDF_RENDERS_CANCELLED = registry.counter(
+    "cramplan_pdf_renders_cancelled_total", "PDF renders abandoned by their caller, by whether they were still queued.",
+    ("endpoint", "state"))
+FLOW_STAGES_CANCELLED = registry.counter(
+    "cramplan_flow_stages_cancelled_total", "Complete flows cancelled (e.g. the client disconnected), by the stage they were in.",
+    ("endpoint", "stage"))
+FLOW_DEGRADATIONS = registry.counter(
+    "cramplan_flow_degradations_total", "Complete flows cut short to meet their deadline, by degradation applied.",
+    ("endpoint", "degradation"))
+JOB_QUEUE_WAIT_SECONDS = registry.histogram(
+    "cramplan_job_queue_wait_seconds", "Time background jobs wait before a worker picks them up.", ("kind",))
+
+
+def route_template(scope) -> str:
+    """
+    The path template of the app route a request will be handled by (e.g.
+    /jobs/{job_id}/pdf), or "unmatched". Resolved up front, since scope["route"] is
+    only set once the router runs.
+    """
+    from starlette.routing import Match
+
+    partial = None
+    for route in getattr(getattr(scope.get("app"), "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", None)
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request and sets current_endpoint for the
+    work done while handling it. Requests are labeled by route template so ids in
+    paths don't create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint = route_template(scope)
+        token = current_endpoint.set(endpoint)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or endpoint
+            HTTP_REQUESTS.inc(endpoint=route, method=scope["method"], status=status)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=route, method=scope["method"])
+            current_endpoint.reset(token)
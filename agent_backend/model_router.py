@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict
+
+from openai_client import openai_clients, agent_timeout
+from hedging import hedger
+from llm_limiter import llm_limiter, estimate_tokens
+from metrics import AGENT_RUN_SECONDS, AGENT_SLO_MISSES, MODEL_TIER_CALLS
+
+logger = logging.getLogger(__name__)
+
+# Model per tier. CRAMPLAN_MODEL_QUALITY unset means the agents SDK default model.
+TIER_MODELS = {
+    "quality": os.getenv("CRAMPLAN_MODEL_QUALITY") or None,
+    "fast": os.getenv("CRAMPLAN_MODEL_FAST", "gpt-4.1-mini"),
+}
+
+# Per agent: the tier it runs on, its output token cap, its latency SLO in seconds and
+# the tier it fails over to when a call exceeds the SLO (None: no failover, the SLO is
+# only recorded). Overridden by CRAMPLAN_MODEL_TIER_<AGENT>, CRAMPLAN_MAX_TOKENS_<AGENT>,
+# CRAMPLAN_SLO_<AGENT> and CRAMPLAN_FALLBACK_TIER_<AGENT> ("none" disables failover).
+AGENT_ROUTES = {
+    "main_topic_outline_agent": {"tier": "fast", "max_tokens": 2000, "slo": 20.0, "fallback": None},
+    "curated_topic_outline_agent": {"tier": "fast", "max_tokens": 2000, "slo": 20.0, "fallback": None},
+    "open_quiz_agent": {"tier": "fast", "max_tokens": 4000, "slo": 30.0, "fallback": None},
+    "topic_content_writer_agent": {"tier": "quality", "max_tokens": 16000, "slo": 120.0, "fallback": "fast"},
+    "content_writer_agent": {"tier": "quality", "max_tokens": 32000, "slo": 300.0, "fallback": "fast"},
+}
+DEFAULT_ROUTE = {"tier": "quality", "max_tokens": None, "slo": 120.0, "fallback": None}
+
+
+def agent_route(agent_name: str) -> dict:
+    route = dict(AGENT_ROUTES.get(agent_name, DEFAULT_ROUTE))
+    suffix = agent_name.upper()
+    route["tier"] = os.getenv(f"CRAMPLAN_MODEL_TIER_{suffix}", route["tier"])
+    max_tokens = os.getenv(f"CRAMPLAN_MAX_TOKENS_{suffix}")
+    if max_tokens:
+        route["max_tokens"] = int(max_tokens)
+    route["slo"] = float(os.getenv(f"CRAMPLAN_SLO_{suffix}", str(route["slo"])))
+    fallback = os.getenv(f"CRAMPLAN_FALLBACK_TIER_{suffix}")
+    if fallback is not None:
+        route["fallback"] = None if fallback.lower() in ("", "none") else fallback
+    for tier in (route["tier"], route["fallback"]):
+        if tier is not None and tier not in TIER_MODELS:
+            raise ValueError(f"Unknown model tier {tier!r} for {agent_name} (choose from {', '.join(TIER_MODELS)})")
+    return route
+
+
+class ModelRouter:
+    """
+    Runs each agent on its configured model tier with its output token cap. A call
+    that exceeds its latency SLO is cancelled and retried once on the fallback tier.
+    Calls run under an admission from llm_limiter; failovers and hedges are charged to
+    its budgets as the extra requests they are.
+    Which tier served each call is counted per agent and exported as metrics.
+    """
+
+    def __init__(self):
+        self._routes: Dict[str, dict] = {}
+        self._agents: Dict[tuple, object] = {}
+        self.stats: Dict[str, dict] = {}
+
+    def route(self, agent_name: str) -> dict:
+        route = self._routes.get(agent_name)
+        if route is None:
+            route = self._routes[agent_name] = agent_route(agent_name)
+        return route
+
+    def _model(self, agent, tier: str):
+        from agents import Model, OpenAIResponsesModel
+        from agents.models import get_default_model
+
+        if isinstance(agent.model, Model):
+            # An explicit Model instance (e.g. the bench's fake model) serves every tier
+            return agent.model
+        name = TIER_MODELS[tier] or agent.model or get_default_model()
+        try:
+            client = openai_clients.client
+        except Exception as e:
+            # e.g. no API key: let the SDK's default provider resolve the name and report it
+            logger.warning(f"Shared OpenAI client unavailable for {agent.name}: {str(e)}")
+            return name
+        # with_options copies the client but keeps its connection pool
+        return OpenAIResponsesModel(model=name, openai_client=client.with_options(timeout=agent_timeout(agent.name)))
+
+    def agent_for(self, agent, tier: str):
+        """
+        A copy of `agent` bound to `tier`'s model and the agent's token cap, built once
+        per model the agent is configured with (install_fake_model swaps it at runtime).
+        """
+        key = (agent.name, tier, agent.model)
+        routed = self._agents.get(key)
+        if routed is None:
+            from agents import Model, ModelSettings
+            from agents.models import get_default_model_settings
+
+            model = self._model(agent, tier)
+            settings = agent.model_settings
+            if not isinstance(model, Model) and settings == get_default_model_settings():
+                # The SDK's implicit defaults are model specific (e.g. reasoning options)
+                settings = get_default_model_settings(model if isinstance(model, str) else model.model)
+            max_tokens = self.route(agent.name)["max_tokens"]
+            if max_tokens:
+                settings = settings.resolve(ModelSettings(max_tokens=max_tokens))
+            routed = self._agents[key] = agent.clone(model=model, model_settings=settings)
+        return routed
+
+    def record(self, agent_name: str, endpoint: str, tier: str, fallback: bool) -> None:
+        stats = self.stats.setdefault(agent_name, {"served": {}, "slo_misses": 0, "fallbacks": 0})
+        stats["served"][tier] = stats["served"].get(tier, 0) + 1
+        MODEL_TIER_CALLS.inc(agent=agent_name, endpoint=endpoint, tier=tier, fallback=str(fallback).lower())
+
+    async def _attempt(self, run, agent, tier: str, input_prompt: str, endpoint: str):
+        routed = self.agent_for(agent, tier)
+        start = time.perf_counter()
+        try:
+            # Hedged with a duplicate request if it's slow and hedging is on for this agent;
+            # the duplicate needs its own slot and budget from the limiter
+            return await hedger.run(agent.name, f"{agent.name}:{tier}", lambda: run(routed, input_prompt),
+                                    admit=lambda: llm_limiter.admit_extra(agent, estimate_tokens(agent, input_prompt)))
+        finally:
+            AGENT_RUN_SECONDS.observe(time.perf_counter() - start, agent=agent.name, endpoint=endpoint, tier=tier)
+
+    async def run(self, run, agent, input_prompt: str, endpoint: str):
+        """
+        Call `run(routed_agent, input_prompt)` (Runner.run) on the agent's tier, failing
+        over to its fallback tier past the SLO. Returns (result, tier that served it).
+        """
+        route = self.route(agent.name)
+        tier, fallback = route["tier"], route["fallback"]
+        start = time.perf_counter()
+        if fallback is None:
+            result = await self._attempt(run, agent, tier, input_prompt, endpoint)
+            if time.perf_counter() - start > route["slo"]:
+                self._slo_miss(agent.name, tier)
+            self.record(agent.name, endpoint, tier, fallback=False)
+            return result, tier
+
+        try:
+            async with asyncio.timeout(route["slo"]) as timeout:
+                result = await self._attempt(run, agent, tier, input_prompt, endpoint)
+        except TimeoutError:
+            # Only the SLO fails over; SDK, network and deadline timeouts propagate
+            if not timeout.expired():
+                raise
+            self._slo_miss(agent.name, tier)
+            self.stats[agent.name]["fallbacks"] += 1
+            logger.warning(f"{agent.name} exceeded its {route['slo']:g}s SLO on the {tier} tier; "
+                           f"failing over to {fallback}")
+            # The failover keeps the call's admission slot but is another request against the budgets
+            await llm_limiter.charge(agent, estimate_tokens(agent, input_prompt))
+            result = await self._attempt(run, agent, fallback, input_prompt, endpoint)
+            self.record(agent.name, endpoint, fallback, fallback=True)
+            return result, fallback
+        self.record(agent.name, endpoint, tier, fallback=False)
+        return result, tier
+
+    def _slo_miss(self, agent_name: str, tier: str) -> None:
+        self.stats.setdefault(agent_name, {"served": {}, "slo_misses": 0, "fallbacks": 0})["slo_misses"] += 1
+        AGENT_SLO_MISSES.inc(agent=agent_name, tier=tier)
+
+    def get_stats(self) -> dict:
+        return {
+            "tiers": {tier: model or "sdk-default" for tier, model in TIER_MODELS.items()},
+            "agents": {name: {**self.route(name), **self.stats.get(name, {"served": {}, "slo_misses": 0, "fallbacks": 0})}
+                       for name in sorted(set(AGENT_ROUTES) | set(self.stats))},
+        }
+
+
+model_router = ModelRouter()
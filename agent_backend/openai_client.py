@@ -0,0 +1,156 @@
+import os
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Shared OpenAI client settings. The base URL can point at a local stub server
+# (see fake_llm.py); unset means the SDK default (OPENAI_BASE_URL or api.openai.com).
+OPENAI_BASE_URL = os.getenv("CRAMPLAN_OPENAI_BASE_URL") or None
+OPENAI_MAX_CONNECTIONS = int(os.getenv("CRAMPLAN_OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("CRAMPLAN_OPENAI_MAX_KEEPALIVE", "50"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("CRAMPLAN_OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_HTTP2 = os.getenv("CRAMPLAN_OPENAI_HTTP2", "true").lower() in ("1", "true", "yes")
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("CRAMPLAN_OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_POOL_TIMEOUT = float(os.getenv("CRAMPLAN_OPENAI_POOL_TIMEOUT", "30"))
+OPENAI_TIMEOUT = float(os.getenv("CRAMPLAN_OPENAI_TIMEOUT", "120"))
+# Retries happen in llm_limiter, with backoff and rate budgets; SDK retries would multiply them
+OPENAI_MAX_RETRIES = int(os.getenv("CRAMPLAN_OPENAI_MAX_RETRIES", "0"))
+
+# Request timeouts per agent in seconds, sized to how much each one writes.
+# CRAMPLAN_OPENAI_TIMEOUT_<AGENT> overrides; other agents use OPENAI_TIMEOUT.
+AGENT_TIMEOUTS = {
+    "main_topic_outline_agent": 60,
+    "curated_topic_outline_agent": 60,
+    "open_quiz_agent": 90,
+    "topic_content_writer_agent": 300,
+    "content_writer_agent": 900,
+}
+
+
+def agent_timeout(agent_name: str) -> float:
+    default = AGENT_TIMEOUTS.get(agent_name, OPENAI_TIMEOUT)
+    return float(os.getenv(f"CRAMPLAN_OPENAI_TIMEOUT_{agent_name.upper()}", str(default)))
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def pool_stats(pool) -> Optional[dict]:
+    """
+    Connection and request counts of an httpcore-style connection pool, or None when the
+    pool doesn't expose them: they come from pool internals, not a public API.
+    """
+    try:
+        connections = list(pool.connections)
+        requests = list(pool._requests)
+        active = sum(1 for connection in connections if not connection.is_idle())
+        queued = sum(1 for request in requests if request.is_queued())
+    except (AttributeError, TypeError):
+        return None
+    return {
+        "connections": len(connections),
+        "active_connections": active,
+        "idle_connections": len(connections) - active,
+        "active_requests": len(requests) - queued,
+        "queued_requests": queued,
+    }
+
+
+class OpenAIClientPool:
+    """
+    One AsyncOpenAI client for the whole process, on a single tuned httpx connection
+    pool, so every agent reuses warm keep-alive (and, with h2 installed, HTTP/2)
+    connections instead of paying for new TLS handshakes.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self.http2 = False
+        self.stats = {"connections_opened": 0}
+
+    def _build(self):
+        import httpx2
+        from openai import AsyncOpenAI
+
+        self.http2 = OPENAI_HTTP2 and http2_available()
+        if OPENAI_HTTP2 and not self.http2:
+            logger.warning("HTTP/2 requested for the OpenAI client but h2 is not installed; using HTTP/1.1")
+        transport = httpx2.AsyncHTTPTransport(
+            http2=self.http2,
+            limits=httpx2.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                 max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                                 keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+        )
+        # Count new connections (each one a TCP + TLS handshake) to make churn visible.
+        # The connection pool isn't public API, so a transport without one just isn't counted.
+        pool = getattr(transport, "_pool", None)
+        create_connection = getattr(pool, "create_connection", None)
+        if callable(create_connection):
+            def counted_create_connection(origin):
+                self.stats["connections_opened"] += 1
+                return create_connection(origin)
+
+            pool.create_connection = counted_create_connection
+        else:
+            logger.warning("OpenAI HTTP transport has no connection pool to inspect; pool stats are unavailable")
+        timeout = httpx2.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT, pool=OPENAI_POOL_TIMEOUT)
+        client = AsyncOpenAI(
+            base_url=OPENAI_BASE_URL,
+            timeout=timeout,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=httpx2.AsyncClient(transport=transport, timeout=timeout),
+        )
+        self._pool = pool
+        logger.info(f"OpenAI client ready: base_url={client.base_url}, http2={self.http2}, "
+                    f"max_connections={OPENAI_MAX_CONNECTIONS}, max_keepalive={OPENAI_MAX_KEEPALIVE}")
+        return client
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._build()
+            return self._client
+
+    def install(self) -> None:
+        """
+        Make the shared client the agents SDK default. Per-agent models bound to it
+        (with each agent's timeout) are built by model_router.
+        """
+        from agents import set_default_openai_client
+
+        set_default_openai_client(self.client)
+
+    async def aclose(self) -> None:
+        client, self._client, self._pool = self._client, None, None
+        if client is not None:
+            await client.close()
+            logger.info("OpenAI client closed")
+
+    def get_stats(self) -> dict:
+        stats = {
+            "configured": self._client is not None,
+            "base_url": str(self._client.base_url) if self._client is not None else OPENAI_BASE_URL,
+            "http2": self.http2,
+            "max_connections": OPENAI_MAX_CONNECTIONS,
+            "max_keepalive": OPENAI_MAX_KEEPALIVE,
+            **self.stats,
+        }
+        details = pool_stats(self._pool)
+        if details is not None:
+            stats.update(details,
+                         utilization=round(details["active_connections"] / OPENAI_MAX_CONNECTIONS, 3)
+                         if OPENAI_MAX_CONNECTIONS else 0.0)
+        return stats
+
+
+openai_clients = OpenAIClientPool()
@@ -1,197 +1,279 @@
-import markdown
 import io
-import weasyprint
-import tempfile
+import html
+import time
+import hashlib
 import os
 import logging
+import threading
+from typing import Iterator
+
+from metrics import MARKDOWN_SECONDS, current_endpoint
 
 logger = logging.getLogger(__name__)
 
+# WeasyPrint (cairo/pango) and markdown are imported on first use: only the render
+# workers need WeasyPrint, and the API process shouldn't pay for either at startup.
+
+# Print stylesheet applied to every PDF. Parsed once per process (see get_print_stylesheet)
+# instead of being inlined into each document and re-parsed by WeasyPrint.
+PRINT_CSS = """
+@page {
+    size: A4;
+    margin: 2cm;
+}
+body {
+    font-family: 'Arial', sans-serif;
+    line-height: 1.6;
+    color: #333;
+    max-width: 100%;
+}
+h1 {
+    color: #2563eb;
+    font-size: 28px;
+    margin-top: 40px;
+    margin-bottom: 20px;
+    page-break-before: always;
+    border-bottom: 1px solid #e5e7eb;
+    padding-bottom: 10px;
+}
+h1:first-of-type {
+    page-break-before: avoid;
+}
+h2 {
+    color: #3b82f6;
+    font-size: 22px;
+    margin-top: 30px;
+    margin-bottom: 15px;
+}
+h3 {
+    color: #60a5fa;
+    font-size: 18px;
+    margin-top: 25px;
+    margin-bottom: 10px;
+}
+h4 {
+    color: #93c5fd;
+    font-size: 16px;
+    margin-top: 20px;
+    margin-bottom: 10px;
+}
+p {
+    margin-bottom: 16px;
+}
+ul, ol {
+    margin-bottom: 20px;
+    padding-left: 20px;
+}
+li {
+    margin-bottom: 8px;
+}
+code {
+    background-color: #f1f5f9;
+    padding: 2px 4px;
+    border-radius: 4px;
+    font-family: 'Courier New', monospace;
+    font-size: 90%;
+}
+pre {
+    background-color: #f1f5f9;
+    padding: 15px;
+    border-radius: 8px;
+    overflow-x: auto;
+    margin-bottom: 20px;
+}
+blockquote {
+    border-left: 4px solid #e5e7eb;
+    padding-left: 16px;
+    margin-left: 0;
+    margin-right: 0;
+    font-style: italic;
+    color: #6b7280;
+}
+table {
+    border-collapse: collapse;
+    width: 100%;
+    margin-bottom: 20px;
+}
+th, td {
+    border: 1px solid #e5e7eb;
+    padding: 12px;
+    text-align: left;
+}
+th {
+    background-color: #f1f5f9;
+    font-weight: bold;
+}
+img {
+    max-width: 100%;
+    height: auto;
+}
+.page-break {
+    page-break-after: always;
+}
+.header {
+    text-align: center;
+    margin-bottom: 40px;
+}
+.footer {
+    text-align: center;
+    font-size: 12px;
+    color: #6b7280;
+    margin-top: 40px;
+    border-top: 1px solid #e5e7eb;
+    padding-top: 20px;
+}
+strong {
+    color: #4b5563;
+    font-weight: bold;
+}
+a {
+    color: #2563eb;
+    text-decoration: none;
+}
+a:hover {
+    text-decoration: underline;
+}
+"""
+
+# Changes whenever the stylesheet does, so cached PDFs are not reused across style changes
+PRINT_CSS_HASH = hashlib.sha256(PRINT_CSS.encode("utf-8")).hexdigest()[:16]
+
+# Base URL for relative links and images in rendered documents
+PDF_BASE_URL = os.getenv("CRAMPLAN_PDF_BASE_URL", os.path.dirname(os.path.abspath(__file__)) + os.sep)
+
+# Extensions every markdown conversion uses
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite', 'tables', 'toc']
+
+_font_config = None
+_print_stylesheet = None
+_markdown_local = threading.local()
+
+def get_font_config() -> "FontConfiguration":
+    """
+    Return the process-wide FontConfiguration, creating it on first use.
+    """
+    global _font_config
+    if _font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+    return _font_config
+
+def get_print_stylesheet() -> "weasyprint.CSS":
+    """
+    Return the pre-parsed print stylesheet, parsing it on first use.
+    """
+    global _print_stylesheet
+    if _print_stylesheet is None:
+        import weasyprint
+        _print_stylesheet = weasyprint.CSS(string=PRINT_CSS, font_config=get_font_config())
+    return _print_stylesheet
+
+def warm_up() -> float:
+    """
+    Parse the stylesheet and render a tiny document so fontconfig/cairo initialization
+    happens at boot rather than on the first user request. Returns the time taken.
+    """
+    start = time.perf_counter()
+    html_to_pdf(markdown_to_html("# Warm-up\n\nCramPlan renderer warm-up.", "Warm-up"))
+    elapsed = time.perf_counter() - start
+    logger.info(f"PDF renderer warmed up in {elapsed:.2f}s")
+    return elapsed
+
+def get_markdown() -> "markdown.Markdown":
+    """
+    Return this thread's Markdown converter, creating it on first use. Building one loads
+    the extensions, so each thread keeps its own (they are not thread-safe) and resets
+    it between documents instead.
+    """
+    converter = getattr(_markdown_local, "converter", None)
+    if converter is None:
+        import markdown
+        converter = _markdown_local.converter = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return converter
+
+def convert_markdown(markdown_text: str) -> str:
+    """
+    Convert a markdown fragment to HTML with the shared converter.
+    """
+    return get_markdown().reset().convert(markdown_text)
+
+def html_header(title: str, embed_css: bool = False) -> str:
+    """
+    Start of the HTML document, up to the body content. PDFs get PRINT_CSS at render time
+    (see html_to_pdf); documents served as they are embed it with embed_css.
+    """
+    style = f"\n    <style>{PRINT_CSS}</style>" if embed_css else ""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>{html.escape(title)}</title>{style}
+</head>
+<body>
+    <div class="header">
+        <h1>CramPlan</h1>
+        <p>Follow your plan to success and good luck!</p>
+    </div>
+"""
+
+HTML_FOOTER = """
+    <div class="footer">
+        <p>Generated by CramPlan - Your personalized study assistant</p>
+    </div>
+</body>
+</html>
+"""
+
 def markdown_to_html(markdown_text: str, title: str = "Study Plan") -> str:
     """
-    Convert markdown text to HTML with styling.
+    Convert markdown text to an HTML document. Styling comes from PRINT_CSS,
+    which html_to_pdf applies as a pre-parsed stylesheet.
     """
+    start = time.perf_counter()
     try:
-        # Convert markdown to HTML
-        html_body = markdown.markdown(
-            markdown_text,
-            extensions=['extra', 'codehilite', 'tables', 'toc']
-        )
-        
-        # Create a complete HTML document with CSS styling
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{title}</title>
-            <style>
-                @page {{
-                    size: A4;
-                    margin: 2cm;
-                }}
-                body {{
-                    font-family: 'Arial', sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 100%;
-                }}
-                h1 {{
-                    color: #2563eb;
-                    font-size: 28px;
-                    margin-top: 40px;
-                    margin-bottom: 20px;
-                    page-break-before: always;
-                    border-bottom: 1px solid #e5e7eb;
-                    padding-bottom: 10px;
-                }}
-                h1:first-of-type {{
-                    page-break-before: avoid;
-                }}
-                h2 {{
-                    color: #3b82f6;
-                    font-size: 22px;
-                    margin-top: 30px;
-                    margin-bottom: 15px;
-                }}
-                h3 {{
-                    color: #60a5fa;
-                    font-size: 18px;
-                    margin-top: 25px;
-                    margin-bottom: 10px;
-                }}
-                h4 {{
-                    color: #93c5fd;
-                    font-size: 16px;
-                    margin-top: 20px;
-                    margin-bottom: 10px;
-                }}
-                p {{
-                    margin-bottom: 16px;
-                }}
-                ul, ol {{
-                    margin-bottom: 20px;
-                    padding-left: 20px;
-                }}
-                li {{
-                    margin-bottom: 8px;
-                }}
-                code {{
-                    background-color: #f1f5f9;
-                    padding: 2px 4px;
-                    border-radius: 4px;
-                    font-family: 'Courier New', monospace;
-                    font-size: 90%;
-                }}
-                pre {{
-                    background-color: #f1f5f9;
-                    padding: 15px;
-                    border-radius: 8px;
-                    overflow-x: auto;
-                    margin-bottom: 20px;
-                }}
-                blockquote {{
-                    border-left: 4px solid #e5e7eb;
-                    padding-left: 16px;
-                    margin-left: 0;
-                    margin-right: 0;
-                    font-style: italic;
-                    color: #6b7280;
-                }}
-                table {{
-                    border-collapse: collapse;
-                    width: 100%;
-                    margin-bottom: 20px;
-                }}
-                th, td {{
-                    border: 1px solid #e5e7eb;
-                    padding: 12px;
-                    text-align: left;
-                }}
-                th {{
-                    background-color: #f1f5f9;
-                    font-weight: bold;
-                }}
-                img {{
-                    max-width: 100%;
-                    height: auto;
-                }}
-                .page-break {{
-                    page-break-after: always;
-                }}
-                .header {{
-                    text-align: center;
-                    margin-bottom: 40px;
-                }}
-                .footer {{
-                    text-align: center;
-                    font-size: 12px;
-                    color: #6b7280;
-                    margin-top: 40px;
-                    border-top: 1px solid #e5e7eb;
-                    padding-top: 20px;
-                }}
-                strong {{
-                    color: #4b5563;
-                    font-weight: bold;
-                }}
-                a {{
-                    color: #2563eb;
-                    text-decoration: none;
-                }}
-                a:hover {{
-                    text-decoration: underline;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>CramPlan</h1>
-                <p>Follow your plan to success and good luck!</p>
-            </div>
-            
-            {html_body}
-            
-            <div class="footer">
-                <p>Generated by CramPlan - Your personalized study assistant</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return html
+        html_content = "".join((html_header(title), convert_markdown(markdown_text), HTML_FOOTER))
+        MARKDOWN_SECONDS.observe(time.perf_counter() - start, endpoint=current_endpoint.get(), step="html")
+        return html_content
     except Exception as e:
         logger.error(f"Error converting markdown to HTML: {str(e)}")
         raise
 
 def html_to_pdf(html_content: str) -> bytes:
     """
-    Convert HTML to PDF using WeasyPrint.
+    Convert HTML to PDF bytes using WeasyPrint, entirely in memory.
     """
+    import weasyprint
+
     try:
-        # Create a temporary HTML file
-        with tempfile.NamedTemporaryFile(suffix='.html', delete=False) as temp_html:
-            temp_html.write(html_content.encode('utf-8'))
-            temp_html_path = temp_html.name
-        
+        # Convert HTML to PDF; relative URLs resolve against PDF_BASE_URL
         try:
-            # Convert HTML to PDF
-            try:
-                pdf = weasyprint.HTML(filename=temp_html_path).write_pdf()
-                return pdf
-            except Exception as weasy_error:
-                logger.error(f"WeasyPrint error: {str(weasy_error)}")
-                logger.info("If you're on macOS, try running the setup_weasyprint.sh script to set environment variables")
-                logger.info("Command: source agent_backend/setup_weasyprint.sh")
-                raise Exception(f"WeasyPrint error: {str(weasy_error)}. If on macOS, run 'source agent_backend/setup_weasyprint.sh'")
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_html_path):
-                os.remove(temp_html_path)
+            return weasyprint.HTML(string=html_content, base_url=PDF_BASE_URL).write_pdf(
+                stylesheets=[get_print_stylesheet()],
+                font_config=get_font_config(),
+            )
+        except Exception as weasy_error:
+            logger.error(f"WeasyPrint error: {str(weasy_error)}")
+            logger.info("If you're on macOS, try running the setup_weasyprint.sh script to set environment variables")
+            logger.info("Command: source agent_backend/setup_weasyprint.sh")
+            raise Exception(f"WeasyPrint error: {str(weasy_error)}. If on macOS, run 'source agent_backend/setup_weasyprint.sh'")
     except Exception as e:
         logger.error(f"Error converting HTML to PDF: {str(e)}")
         raise
 
+def iter_content_markdown(content_response, title="Study Plan") -> Iterator[str]:
+    """
+    Yield the markdown for a ContentResponse object: the title, then one chunk per main
+    topic (its description and subtopics, followed by a page break).
+    """
+    yield f"# {title}\n\n"
+    for main_topic in content_response.topic:
+        parts = [f"## {main_topic.topic_title}\n\n", f"{main_topic.main_description}\n\n"]
+        for subtopic in main_topic.subtopics:
+            parts.append(f"### {subtopic.sub_topic_title}\n\n")
+            parts.append(f"{subtopic.sub_content_text}\n\n")
+        parts.append("<div class='page-break'></div>\n\n")
+        yield "".join(parts)
+
 def generate_content_markdown(content_response, title="Study Plan") -> str:
     """
     Generate markdown content from the ContentResponse object.
@@ -203,23 +285,41 @@ def generate_content_markdown(content_response, title="Study Plan") -> str:
     Returns:
         Markdown formatted string
     """
+    start = time.perf_counter()
     try:
-        markdown_content = f"# {title}\n\n"
-        
-        # Add each main topic
-        for main_topic in content_response.topic:
-            markdown_content += f"## {main_topic.topic_title}\n\n"
-            markdown_content += f"{main_topic.main_description}\n\n"
-            
-            # Add subtopics
-            for subtopic in main_topic.subtopics:
-                markdown_content += f"### {subtopic.sub_topic_title}\n\n"
-                markdown_content += f"{subtopic.sub_content_text}\n\n"
-            
-            # Add a page break after each main topic
-            markdown_content += "<div class='page-break'></div>\n\n"
-        
+        markdown_content = "".join(iter_content_markdown(content_response, title))
+        MARKDOWN_SECONDS.observe(time.perf_counter() - start, endpoint=current_endpoint.get(), step="markdown")
         return markdown_content
     except Exception as e:
         logger.error(f"Error generating markdown content: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
+
+def iter_content_html(content_response, title="Study Plan", embed_css: bool = False) -> Iterator[str]:
+    """
+    Yield the HTML document for a ContentResponse object piece by piece: the header, the
+    title, each main topic converted on its own, then the footer. Only one topic's
+    markdown and HTML are held at a time, so large study plans can be streamed.
+
+    Topics are converted separately, so heading ids are only unique within a topic.
+    """
+    yield html_header(title, embed_css)
+    converted = 0.0
+    try:
+        for chunk in iter_content_markdown(content_response, title):
+            start = time.perf_counter()
+            # The converter is fetched per chunk: a streaming response may resume this
+            # generator on a different thread
+            html_chunk = convert_markdown(chunk)
+            converted += time.perf_counter() - start
+            yield html_chunk + "\n"
+    except Exception as e:
+        logger.error(f"Error converting content to HTML: {str(e)}")
+        raise
+    MARKDOWN_SECONDS.observe(converted, endpoint=current_endpoint.get(), step="html")
+    yield HTML_FOOTER
+
+def content_to_html(content_response, title="Study Plan") -> str:
+    """
+    HTML document for a ContentResponse object, assembled topic by topic (see iter_content_html).
+    """
+    return "".join(iter_content_html(content_response, title))
@@ -0,0 +1,261 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pdf_generator import html_to_pdf, warm_up, PRINT_CSS_HASH
+from cache import pdf_cache, content_hash
+from metrics import PDF_RENDER_SECONDS, PDF_QUEUE_WAIT_SECONDS, PDF_BYTES, PDF_RENDERS_CANCELLED, current_endpoint
+
+logger = logging.getLogger(__name__)
+
+# Rendering executor settings
+RENDER_WORKERS = int(os.getenv("CRAMPLAN_RENDER_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+RENDER_MAX_QUEUE = int(os.getenv("CRAMPLAN_RENDER_MAX_QUEUE", "16"))
+RENDER_TIMEOUT = float(os.getenv("CRAMPLAN_RENDER_TIMEOUT", "120"))
+RENDER_MAX_TASKS_PER_WORKER = int(os.getenv("CRAMPLAN_RENDER_MAX_TASKS_PER_WORKER", "50"))
+RENDER_RETRY_AFTER = int(os.getenv("CRAMPLAN_RENDER_RETRY_AFTER", "5"))
+RENDER_WARM_UP = os.getenv("CRAMPLAN_RENDER_WARM_UP", "true").lower() in ("1", "true", "yes")
+# How often a waiting render checks whether its job has started in a worker
+RENDER_START_POLL = float(os.getenv("CRAMPLAN_RENDER_START_POLL", "0.05"))
+
+# Set in each worker by _init_worker: shared arrays, indexed by job slot, in which a
+# worker records which job it started and when (see PdfRenderer.render)
+_started_jobs = None
+_started_at = None
+
+
+def _init_worker(started_jobs=None, started_at=None) -> None:
+    """
+    Render pool initializer: keep the job start arrays and load the stylesheet and fonts
+    before the worker takes jobs.
+    """
+    global _started_jobs, _started_at
+    _started_jobs, _started_at = started_jobs, started_at
+    if not RENDER_WARM_UP:
+        return
+    try:
+        warm_up()
+    except Exception as e:
+        # Let real jobs surface the error instead of breaking the whole pool
+        logger.warning(f"PDF worker warm-up failed: {str(e)}")
+
+
+def _render_timed(html_content: str, slot: int = -1, job_id: int = 0):
+    """
+    Render in a worker and report how long WeasyPrint itself took. The start is recorded
+    in the job's slot first, so the parent times out the render rather than the queue wait.
+    """
+    if slot >= 0 and _started_at is not None:
+        _started_at[slot] = time.time()
+        _started_jobs[slot] = job_id
+    start = time.perf_counter()
+    pdf_bytes = html_to_pdf(html_content)
+    return pdf_bytes, time.perf_counter() - start
+
+
+class RenderQueueFull(Exception):
+    """
+    Raised when the render queue is at capacity; callers should answer 503 with Retry-After.
+    """
+
+    def __init__(self, retry_after: int = RENDER_RETRY_AFTER):
+        super().__init__("PDF render queue is full")
+        self.retry_after = retry_after
+
+
+class RenderTimeout(Exception):
+    """
+    Raised when a render job exceeds its time budget.
+    """
+
+
+class RenderFailed(Exception):
+    """
+    Raised when the worker running a render dies.
+    """
+
+
+class PdfRenderer:
+    """
+    Runs WeasyPrint in a dedicated process pool so renders never block the event loop.
+
+    Admission is bounded: at most `workers` jobs run and `max_queue` more wait;
+    anything beyond that is rejected immediately. Workers are replaced after
+    `max_tasks_per_worker` renders to cap WeasyPrint memory growth.
+
+    The timeout counts from when a worker starts the job, not from submission: only a
+    render that has really run that long means a hung worker and recycles the pool.
+    Renders that lose their worker to the recycle are resubmitted once.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, max_queue: int = RENDER_MAX_QUEUE,
+                 timeout: float = RENDER_TIMEOUT, max_tasks_per_worker: int = RENDER_MAX_TASKS_PER_WORKER):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        # Job slots for the start arrays; `pending` never exceeds their number
+        self._slots = list(range(self.workers + self.max_queue))
+        self._next_job_id = 0
+        self._started_jobs = None
+        self._started_at = None
+        self.stats = {"rendered": 0, "rejected": 0, "timeouts": 0, "failed": 0, "cancelled": 0, "resubmitted": 0, "pool_restarts": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # max_tasks_per_child is incompatible with fork, so always spawn workers
+                context = multiprocessing.get_context("spawn")
+                if self._started_at is None:
+                    # Kept across pool restarts: every new pool gets the same arrays
+                    slots = self.workers + self.max_queue
+                    self._started_jobs = context.Array("q", slots, lock=False)
+                    self._started_at = context.Array("d", slots, lock=False)
+                kwargs = {"mp_context": context, "initializer": _init_worker,
+                          "initargs": (self._started_jobs, self._started_at)}
+                if self.max_tasks_per_worker > 0:
+                    kwargs["max_tasks_per_child"] = self.max_tasks_per_worker
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, **kwargs)
+            return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Tear down a pool whose worker is hung or dead; the next job starts a fresh one.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.stats["pool_restarts"] += 1
+        # ProcessPoolExecutor cannot kill a single busy worker, so terminate them all
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def start(self) -> None:
+        """
+        Spawn (and thereby warm up) every worker at boot so the first request doesn't pay for it.
+        """
+        executor = self._get_executor()
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(os.getpid)) for _ in range(self.workers)))
+        logger.info(f"PDF render pool started with {self.workers} workers")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def render(self, html_content: str) -> bytes:
+        """
+        Render HTML to PDF bytes in the pool.
+        """
+        if self._pending >= self.workers + self.max_queue:
+            self.stats["rejected"] += 1
+            raise RenderQueueFull()
+        self._pending += 1
+        slot = self._slots.pop()
+        try:
+            submitted = time.perf_counter()
+            try:
+                pdf_bytes, render_seconds = await self._submit(html_content, slot)
+            except BrokenProcessPool:
+                # The pool was recycled under this render (another job hung): try once more
+                self.stats["resubmitted"] += 1
+                pdf_bytes, render_seconds = await self._submit(html_content, slot)
+            self.stats["rendered"] += 1
+            endpoint = current_endpoint.get()
+            PDF_RENDER_SECONDS.observe(render_seconds, endpoint=endpoint)
+            PDF_QUEUE_WAIT_SECONDS.observe(max(0.0, time.perf_counter() - submitted - render_seconds), endpoint=endpoint)
+            PDF_BYTES.observe(len(pdf_bytes), endpoint=endpoint)
+            return pdf_bytes
+        finally:
+            self._slots.append(slot)
+            self._pending -= 1
+
+    async def _submit(self, html_content: str, slot: int):
+        """
+        Run one render in the pool and wait for it, timing out only once it has been
+        running in a worker for longer than the timeout.
+        """
+        executor = self._get_executor()
+        self._next_job_id += 1
+        job_id = self._next_job_id
+        future = executor.submit(_render_timed, html_content, slot, job_id)
+        waiter = asyncio.wrap_future(future)
+        try:
+            while not waiter.done():
+                if self._started_jobs[slot] == job_id:
+                    remaining = self._started_at[slot] + self.timeout - time.time()
+                    if remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        logger.error(f"PDF render ran for more than {self.timeout}s, recycling render pool")
+                        self._restart(executor)
+                        waiter.cancel()
+                        raise RenderTimeout(f"PDF render exceeded {self.timeout}s")
+                    wait = remaining
+                else:
+                    wait = RENDER_START_POLL
+                await asyncio.wait({waiter}, timeout=wait)
+            return waiter.result()
+        except BrokenProcessPool:
+            with self._lock:
+                # Only count and recycle a pool that broke on its own, not one _restart tore down
+                recycled = self._executor is not executor
+            if not recycled:
+                self.stats["failed"] += 1
+                logger.error("PDF render worker died, recycling render pool")
+                self._restart(executor)
+                raise RenderFailed("PDF render worker died")
+            raise
+        except asyncio.CancelledError:
+            # A queued render is dropped; one already running finishes and is discarded
+            state = "queued" if future.cancel() else "running"
+            self.stats["cancelled"] += 1
+            PDF_RENDERS_CANCELLED.inc(endpoint=current_endpoint.get(), state=state)
+            raise
+        except RenderTimeout:
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "pending": self._pending, "workers": self.workers, "max_queue": self.max_queue}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+pdf_renderer = PdfRenderer()
+
+
+def pdf_cache_key(html_content: str) -> str:
+    """
+    Cache key / ETag for a document: the final HTML plus the print stylesheet version.
+    """
+    return content_hash(PRINT_CSS_HASH + html_content)
+
+
+async def render_pdf_cached(html_content: str) -> bytes:
+    """
+    Render HTML to PDF, reusing a cached artifact for identical HTML. The cache's disk
+    tier is read and written in a thread, so large PDFs don't stall the event loop.
+    """
+    key = pdf_cache_key(html_content)
+    pdf_bytes = await pdf_cache.aget(key)
+    if pdf_bytes is not None:
+        logger.info(f"PDF cache hit for {key[:12]}")
+        return pdf_bytes
+    pdf_bytes = await pdf_renderer.render(html_content)
+    await pdf_cache.aset(key, pdf_bytes)
+    return pdf_bytes
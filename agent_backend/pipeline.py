@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from schemas import Topic, ListOfTopics, ListOfQuizQuestions, ContentTopic
+from agent_runner import run_agent
+from content_generation import generate_content_parallel, format_topics, PARALLEL_CONTENT_DEFAULT
+from question_bank import question_bank, build_quiz
+from quiz_evaluation import evaluate_quiz_understanding
+
+logger = logging.getLogger(__name__)
+
+# The flow's stages as plain functions on the agents' output objects. The routes and
+# the complete flow both call these and pass results along by reference; only the
+# HTTP edge validates input and serializes output (see serialization.FastJSONResponse).
+
+
+async def outline_topics(subject: str) -> ListOfTopics:
+    """
+    Topic outline for a subject.
+    """
+    logger.info(f"Generating topics for subject: {subject}")
+    topics = await run_agent("main_topic_outline_agent", subject)
+    logger.info(f"Generated {len(topics.list_of_topics)} topics")
+    return topics
+
+
+async def write_quiz(topics: List[Topic], fresh: bool = False) -> ListOfQuizQuestions:
+    """
+    Quiz for the topics. Questions come from the question bank where it covers a topic;
+    the quiz agent only writes questions for the rest (or all of them if fresh).
+    """
+    logger.info(f"Generating quiz for {len(topics)} topics")
+    if question_bank is not None and not fresh:
+        quiz = await build_quiz(topics, question_bank)
+    else:
+        quiz = await run_agent("open_quiz_agent", f"Here are the topics:\n{format_topics(topics)}")
+    logger.info(f"Generated {len(quiz.list_quiz_questions)} quiz questions")
+    return quiz
+
+
+def score_quiz(quiz: ListOfQuizQuestions, answers: List) -> Dict[str, float]:
+    """
+    Understanding score per topic (percent) for a submission's answers.
+    """
+    logger.info(f"Evaluating quiz with {len(answers)} answers")
+    user_answers = [{"question_index": answer.question_index, "answer": answer.answer} for answer in answers]
+    scores = evaluate_quiz_understanding(quiz, user_answers)
+    logger.info(f"Evaluated understanding for {len(scores)} topics")
+    return scores
+
+
+async def curate_outline(subject: str, scores: Dict[str, float]) -> ListOfTopics:
+    """
+    Topic outline for a subject, curated to the student's understanding scores.
+    """
+    logger.info(f"Curating topics for subject: {subject}")
+    understanding_string = "\n".join(f"{topic}: {score:.1f}%" for topic, score in scores.items())
+    curated = await run_agent(
+        "curated_topic_outline_agent",
+        f"Here is the main topic:\n{subject}\nHere is the understanding of the topic:\n{understanding_string}"
+    )
+    logger.info(f"Curated {len(curated.list_of_topics)} topics")
+    return curated
+
+
+async def write_content(topics: List[Topic], parallel: bool = PARALLEL_CONTENT_DEFAULT,
+                        buckets: Optional[Dict[str, Optional[str]]] = None,
+                        prefetched: Optional[Dict[str, asyncio.Future]] = None,
+                        stored: Optional[Dict[str, object]] = None,
+                        words: Optional[int] = None) -> ContentTopic:
+    """
+    Study content for the topics: one agent call per topic (see generate_content_parallel
+    for the options), or a single content_writer_agent call when parallel is off and
+    nothing is prefetched, stored or shortened.
+    """
+    logger.info(f"Generating content for {len(topics)} topics")
+    if parallel or prefetched or stored or words:
+        content = await generate_content_parallel(topics, prefetched=prefetched, buckets=buckets, stored=stored, words=words)
+        logger.info(f"Generated content with {len(content.topic)} sections in parallel")
+        return content
+    content = await run_agent(
+        "content_writer_agent",
+        f"""Here are the topics to write content for:\n{format_topics(topics)}
+You need to output the main content, its description and the subtopics with the content for each subtopic."""
+    )
+    logger.info(f"Generated content with {len(content.topic)} sections")
+    return content
@@ -0,0 +1,45 @@
+import os
+import time
+import asyncio
+import logging
+import importlib
+
+from agent_runner import load_agents
+
+logger = logging.getLogger(__name__)
+
+# Import the lazily loaded modules in the background right after startup
+PREWARM_ENABLED = os.getenv("CRAMPLAN_PREWARM", "false").lower() in ("1", "true", "yes")
+
+# Loaded on first use elsewhere: markdown and its extensions (markdown_to_html) and
+# numpy (batch quiz scoring). llm_main goes through load_agents.
+PREWARM_MODULES = (
+    "markdown",
+    "markdown.extensions.extra",
+    "markdown.extensions.codehilite",
+    "markdown.extensions.tables",
+    "markdown.extensions.toc",
+    "numpy",
+)
+
+prewarm_state = {"status": "disabled" if not PREWARM_ENABLED else "pending", "seconds": None}
+
+
+async def prewarm() -> None:
+    """
+    Import the agents SDK and the other heavy modules in a worker thread so the first
+    request that needs them doesn't pay for the import. Failures are only logged; the
+    module is then imported again by whichever request uses it.
+    """
+    prewarm_state["status"] = "running"
+    start = time.perf_counter()
+    try:
+        await load_agents()
+        for name in PREWARM_MODULES:
+            await asyncio.to_thread(importlib.import_module, name)
+    except Exception as e:
+        prewarm_state["status"] = "failed"
+        logger.warning(f"Pre-warm failed: {str(e)}")
+        return
+    prewarm_state.update(status="done", seconds=round(time.perf_counter() - start, 3))
+    logger.info(f"Pre-warmed lazily loaded modules in {prewarm_state['seconds']:.2f}s")
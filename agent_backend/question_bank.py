@@ -0,0 +1,250 @@
+import os
+import time
+import random
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Dict, List
+
+from schemas import ListOfQuizQuestions, QuizQuestions
+from agent_runner import run_agent
+from cache import CACHE_DIR, normalize_input, content_hash
+from content_generation import format_topics
+
+logger = logging.getLogger(__name__)
+
+# Question bank settings
+QUESTION_BANK_ENABLED = os.getenv("CRAMPLAN_QUESTION_BANK", "true").lower() in ("1", "true", "yes")
+QUESTION_BANK_DB_PATH = os.getenv("CRAMPLAN_QUESTION_BANK_DB", os.path.join(CACHE_DIR, "question_bank.sqlite3"))
+QUESTION_BANK_MAX_PER_TOPIC = int(os.getenv("CRAMPLAN_QUESTION_BANK_MAX_PER_TOPIC", "200"))
+# Questions a topic needs in stock before quizzes are served from the bank alone, so
+# students and retakes draw different quizzes rather than the first quiz ever written
+QUESTION_BANK_MIN_PER_TOPIC = int(os.getenv("CRAMPLAN_QUESTION_BANK_MIN_PER_TOPIC", "30"))
+# Fraction of quizzes that still ask the agent for new questions on stocked topics
+# (below the cap), so the bank keeps growing after it reaches the minimum
+QUESTION_BANK_TOP_UP_RATE = float(os.getenv("CRAMPLAN_QUESTION_BANK_TOP_UP_RATE", "0.1"))
+QUIZ_SIZE = int(os.getenv("CRAMPLAN_QUIZ_SIZE", "10"))
+
+VALID_ANSWERS = ("a", "b", "c", "d")
+
+
+def normalize_topic(name: str) -> str:
+    """
+    Key a topic or subtopic name so casing, spacing and trailing punctuation don't matter.
+    """
+    return normalize_input(name).lower().strip(" .:;-")
+
+
+def question_hash(question: QuizQuestions) -> str:
+    return content_hash(normalize_input(question.quiz_question).lower())
+
+
+def is_valid_question(question: QuizQuestions) -> bool:
+    return bool(question.quiz_question.strip()) and question.correct_answer.strip().lower() in VALID_ANSWERS
+
+
+def match_subtopic(question: QuizQuestions, subtopics: List[str]) -> str:
+    """
+    The subtopic a question is about: the first one named in the question text, else "".
+    """
+    text = normalize_topic(question.quiz_question)
+    for subtopic in subtopics:
+        key = normalize_topic(subtopic)
+        if key and key in text:
+            return key
+    return ""
+
+
+def topic_quotas(topic_count: int, quiz_size: int = QUIZ_SIZE) -> List[int]:
+    """
+    Split the quiz evenly across topics, earlier topics taking the remainder.
+    Every topic gets at least one question.
+    """
+    if topic_count == 0:
+        return []
+    base, extra = divmod(max(quiz_size, topic_count), topic_count)
+    return [base + (1 if i < extra else 0) for i in range(topic_count)]
+
+
+class QuestionBank:
+    """
+    Persistent store of validated quiz questions, indexed by normalized topic and subtopic
+    and deduplicated by normalized question text.
+    """
+
+    def __init__(self, path: str, max_per_topic: int = QUESTION_BANK_MAX_PER_TOPIC,
+                 min_per_topic: int = QUESTION_BANK_MIN_PER_TOPIC, top_up_rate: float = QUESTION_BANK_TOP_UP_RATE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_per_topic = max_per_topic
+        self.min_per_topic = min(min_per_topic, max_per_topic)
+        self.top_up_rate = top_up_rate
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self.stats = {"bank_hits": 0, "partial_hits": 0, "misses": 0, "top_ups": 0,
+                      "questions_added": 0, "questions_rejected": 0}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "topic_key TEXT NOT NULL, subtopic_key TEXT NOT NULL, question_hash TEXT NOT NULL, "
+                "question TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (topic_key, question_hash))"
+            )
+
+    def count(self, topic_keys: List[str]) -> Dict[str, int]:
+        if not topic_keys:
+            return {}
+        placeholders = ",".join("?" * len(topic_keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT topic_key, COUNT(*) FROM questions WHERE topic_key IN ({placeholders}) GROUP BY topic_key",
+                topic_keys,
+            ).fetchall()
+        counts = dict.fromkeys(topic_keys, 0)
+        counts.update(rows)
+        return counts
+
+    def add(self, topic, questions: List[QuizQuestions]) -> int:
+        """
+        Bank the valid questions written for `topic`; returns how many were new.
+        """
+        topic_key = normalize_topic(topic.topic)
+        now = time.time()
+        rows = []
+        for question in questions:
+            if not is_valid_question(question):
+                self.stats["questions_rejected"] += 1
+                continue
+            rows.append((topic_key, match_subtopic(question, topic.subtopics), question_hash(question),
+                         question.model_dump_json(), now))
+        if not rows:
+            return 0
+        with self._lock:
+            room = self.max_per_topic - self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE topic_key = ?", (topic_key,)
+            ).fetchone()[0]
+            if room <= 0:
+                return 0
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO questions (topic_key, subtopic_key, question_hash, question, created_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows[:room]
+            )
+            added = self._conn.total_changes - before
+        self.stats["questions_added"] += added
+        return added
+
+    def sample(self, topic, count: int, exclude: set) -> List[QuizQuestions]:
+        """
+        Draw up to `count` distinct questions for `topic`, spread round-robin over its
+        subtopics and skipping question hashes in `exclude` (which is updated).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT subtopic_key, question_hash, question FROM questions WHERE topic_key = ?",
+                (normalize_topic(topic.topic),),
+            ).fetchall()
+        by_subtopic: Dict[str, list] = {}
+        for subtopic_key, qhash, question in rows:
+            if qhash not in exclude:
+                by_subtopic.setdefault(subtopic_key, []).append((qhash, question))
+        pools = list(by_subtopic.values())
+        for pool in pools:
+            random.shuffle(pool)
+        random.shuffle(pools)
+
+        picked = []
+        while len(picked) < count and pools:
+            for pool in list(pools):
+                if len(picked) >= count:
+                    break
+                qhash, question = pool.pop()
+                exclude.add(qhash)
+                # Label with the topic as asked now so scores line up with the topic list
+                picked.append(QuizQuestions.model_validate_json(question).model_copy(update={"topic": topic.topic}))
+                if not pool:
+                    pools.remove(pool)
+        return picked
+
+    def needs_questions(self, count: int, quota: int) -> bool:
+        """
+        Whether a topic with `count` banked questions should get new ones from the agent:
+        always below the stock minimum (or its quota), sometimes below the cap.
+        """
+        if count < max(quota, self.min_per_topic):
+            return True
+        return count < self.max_per_topic and random.random() < self.top_up_rate
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total, topics = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT topic_key) FROM questions").fetchone()
+        return {**self.stats, "questions": total, "topics": topics}
+
+
+def assign_questions(topics: List, questions: List[QuizQuestions]) -> Dict[str, List[QuizQuestions]]:
+    """
+    Group generated questions under the requested topics they were written for.
+    """
+    by_key = {normalize_topic(topic.topic): [] for topic in topics}
+    for question in questions:
+        key = normalize_topic(question.topic)
+        if key in by_key:
+            by_key[key].append(question)
+    return by_key
+
+
+async def build_quiz(topics: List, bank: QuestionBank) -> ListOfQuizQuestions:
+    """
+    Assemble a quiz for `topics` from the bank, calling the quiz agent only for topics
+    whose stock is low (or, now and then, to top one up). Everything the agent writes is
+    banked for next time. SQLite work runs in a thread, off the event loop.
+    """
+    quotas = topic_quotas(len(topics))
+    counts = await asyncio.to_thread(bank.count, list({normalize_topic(topic.topic) for topic in topics}))
+    missing = [topic for topic, quota in zip(topics, quotas)
+               if bank.needs_questions(counts[normalize_topic(topic.topic)], quota)]
+
+    generated: Dict[str, List[QuizQuestions]] = {}
+    unmatched: List[QuizQuestions] = []
+    if missing:
+        result = await run_agent("open_quiz_agent", f"Here are the topics:\n{format_topics(missing)}")
+        generated = assign_questions(missing, result.list_quiz_questions)
+        matched = {id(q) for questions in generated.values() for q in questions}
+        unmatched = [q for q in result.list_quiz_questions if id(q) not in matched]
+
+        def bank_generated() -> None:
+            for topic in missing:
+                bank.add(topic, generated[normalize_topic(topic.topic)])
+
+        await asyncio.to_thread(bank_generated)
+        stocked = all(counts[normalize_topic(topic.topic)] >= max(quota, bank.min_per_topic)
+                      for topic, quota in zip(topics, quotas))
+        bank.stats["top_ups" if stocked else "partial_hits" if len(missing) < len(topics) else "misses"] += 1
+    else:
+        bank.stats["bank_hits"] += 1
+
+    def sample_all() -> List[QuizQuestions]:
+        seen: set = set()
+        questions = []
+        for topic, quota in zip(topics, quotas):
+            picked = bank.sample(topic, quota, seen)
+            if len(picked) < quota:
+                # Bank still short (e.g. capped or invalid questions): use fresh ones directly
+                for question in generated.get(normalize_topic(topic.topic), []):
+                    if len(picked) >= quota:
+                        break
+                    if question_hash(question) not in seen:
+                        seen.add(question_hash(question))
+                        picked.append(question)
+            questions.extend(picked)
+        return questions
+
+    questions = await asyncio.to_thread(sample_all)
+    # Questions the agent didn't attribute to a requested topic still count as before
+    questions.extend(unmatched[:max(0, QUIZ_SIZE - len(questions))])
+    return ListOfQuizQuestions(list_quiz_questions=questions)
+
+
+question_bank = QuestionBank(QUESTION_BANK_DB_PATH) if QUESTION_BANK_ENABLED else None
@@ -0,0 +1,138 @@
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Answer codes in the answer matrix
+MISSING_ANSWER = -1
+UNKNOWN_ANSWER = -2
+
+
+def _normalize_answer(answer) -> str:
+    return answer.lower() if answer else ""
+
+
+def build_quiz_arrays(quiz_results):
+    """
+    Precompute the per-quiz arrays used for bulk scoring.
+
+    Returns (topics, answer_codes, correct_codes, topic_matrix) where topic_matrix is a
+    (questions x topics) one-hot matrix and answer_codes maps normalized answers to ints.
+    """
+    # Imported on first use: the API process only needs numpy for batch scoring
+    import numpy as np
+
+    questions = quiz_results.list_quiz_questions
+    topics = []
+    topic_index = {}
+    answer_codes = {}
+    correct_codes = np.empty(len(questions), dtype=np.int32)
+    question_topics = np.empty(len(questions), dtype=np.int32)
+
+    for i, question in enumerate(questions):
+        if question.topic not in topic_index:
+            topic_index[question.topic] = len(topics)
+            topics.append(question.topic)
+        question_topics[i] = topic_index[question.topic]
+        correct = _normalize_answer(question.correct_answer)
+        correct_codes[i] = answer_codes.setdefault(correct, len(answer_codes)) if correct else UNKNOWN_ANSWER
+
+    topic_matrix = np.zeros((len(questions), len(topics)), dtype=np.float64)
+    topic_matrix[np.arange(len(questions)), question_topics] = 1.0
+    return topics, answer_codes, correct_codes, topic_matrix
+
+
+def build_answer_matrix(submissions: List[List[dict]], question_count: int, answer_codes: Dict[str, int]) -> "np.ndarray":
+    """
+    Encode submissions as a (students x questions) int matrix.
+
+    Each submission is a list of {'question_index': int, 'answer': str}. Unanswered
+    questions are MISSING_ANSWER, answers that match no correct answer are
+    UNKNOWN_ANSWER, and the first answer given for a question wins.
+    """
+    import numpy as np
+
+    matrix = np.full((len(submissions), question_count), MISSING_ANSWER, dtype=np.int32)
+    for row, user_answers in enumerate(submissions):
+        # Reverse so the first answer for a question is written last
+        for ans in reversed(user_answers):
+            index = ans['question_index']
+            if 0 <= index < question_count:
+                answer = _normalize_answer(ans['answer'])
+                matrix[row, index] = answer_codes.get(answer, UNKNOWN_ANSWER) if answer else MISSING_ANSWER
+    return matrix
+
+
+def evaluate_quiz_batch(quiz_results, submissions: List[List[dict]]):
+    """
+    Score many submissions against one quiz.
+
+    Args:
+        quiz_results: ListOfQuizQuestions object from AI
+        submissions: one list of answers per student, each in the format
+            [{'question_index': 0, 'answer': 'a'}, ...]
+
+    Returns:
+        tuple: (per-student list of {topic: percentage}, cohort {topic: mean percentage})
+    """
+    import numpy as np
+
+    topics, answer_codes, correct_codes, topic_matrix = build_quiz_arrays(quiz_results)
+    if not topics or not submissions:
+        return [{topic: 0.0 for topic in topics} for _ in submissions], {topic: 0.0 for topic in topics}
+
+    answers = build_answer_matrix(submissions, len(correct_codes), answer_codes)
+    correct = (answers == correct_codes) & (answers >= 0)
+
+    # (students x questions) @ (questions x topics) -> correct answers per topic
+    topic_correct = correct.astype(np.float64) @ topic_matrix
+    topic_scores = topic_correct / topic_matrix.sum(axis=0) * 100
+    cohort_scores = topic_scores.mean(axis=0)
+
+    results = [dict(zip(topics, row)) for row in topic_scores.tolist()]
+    return results, dict(zip(topics, cohort_scores.tolist()))
+
+
+def evaluate_quiz_understanding(quiz_results, user_answers):
+    """
+    Evaluate user's understanding of each topic based on quiz answers.
+    
+    Args:
+        quiz_results: ListOfQuizQuestions object from AI
+        user_answers: list of answers in format [{'question_index': 0, 'answer': 'a'}, ...]
+    
+    Returns:
+        dict: Topic understanding scores {topic: percentage}
+    """
+    # Initialize topic understanding dictionary
+    topic_understanding = {}
+    topic_question_count = {}
+
+    # Index answers by question so each lookup is O(1); the first answer for a question wins
+    answers_by_index = {}
+    for ans in user_answers:
+        answers_by_index.setdefault(ans['question_index'], ans['answer'])
+    
+    # Process each question and answer
+    for i, question in enumerate(quiz_results.list_quiz_questions):
+        topic = question.topic
+        
+        # Initialize topic if not seen before
+        if topic not in topic_understanding:
+            topic_understanding[topic] = 0
+            topic_question_count[topic] = 0
+            
+        # Get user's answer for this question
+        user_answer = answers_by_index.get(i)
+        
+        # Compare answers
+        if user_answer and user_answer.lower() == question.correct_answer.lower():
+            topic_understanding[topic] += 1
+        topic_question_count[topic] += 1
+    
+    # Calculate percentages for each topic
+    for topic in topic_understanding:
+        if topic_question_count[topic] > 0:
+            topic_understanding[topic] = (topic_understanding[topic] / topic_question_count[topic]) * 100
+            
+    return topic_understanding
@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+
+# Structured outputs of the agents in llm_main. Kept separate so modules that only
+# need the types don't import the agents SDK.
+
+class Topic(BaseModel):
+    topic: str
+    description: str
+    subtopics: list[str]
+
+class ListOfTopics(BaseModel):
+    list_of_topics: list[Topic]  # Now it's a list of strings
+
+class QuizQuestions(BaseModel):
+     topic: str
+     quiz_question: str
+     choice_a: str
+     choice_b: str
+     choice_c: str
+     choice_d: str
+     correct_answer: str
+
+class ListOfQuizQuestions(BaseModel):
+     list_quiz_questions: list[QuizQuestions]
+
+class ContentSub(BaseModel):
+    sub_topic_title: str
+    sub_content_text: str
+
+class ContentMain(BaseModel):
+    topic_title: str
+    main_description: str
+    subtopics: list[ContentSub]
+
+class ContentTopic(BaseModel):
+     topic: list[ContentMain] 
@@ -0,0 +1,17 @@
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded in a single pass by pydantic-core's Rust serializer.
+
+    Routes return the pipeline's pydantic objects (the agents' outputs) in it as they
+    are: returning a Response skips FastAPI's dump, re-validation against the
+    response_model and second serialization, so large study plans are walked once.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
@@ -0,0 +1,231 @@
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Session store settings
+SESSION_BACKEND = os.getenv("CRAMPLAN_SESSION_BACKEND", "memory").lower()
+SESSION_DB_PATH = os.getenv("CRAMPLAN_SESSION_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite3"))
+SESSION_TTL = float(os.getenv("CRAMPLAN_SESSION_TTL", str(2 * 3600)))
+SESSION_EVICT_INTERVAL = float(os.getenv("CRAMPLAN_SESSION_EVICT_INTERVAL", "60"))
+
+# What a session holds: the pipeline artifacts, stored as the validated objects
+SESSION_FIELDS = ("subject", "topics", "quiz", "scores", "curated_topics", "content", "sections")
+
+
+class MemorySessionBackend:
+    """
+    Sessions kept as live objects in a dict; fastest, but per-process and lost on restart.
+    """
+
+    # Calls only take a lock briefly, so they run on the event loop
+    blocking = False
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str, now: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._sessions[session_id]
+                return None
+            return dict(entry[1])
+
+    def save(self, session_id: str, fields: dict, expires_at: float) -> None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            data = entry[1] if entry is not None else {}
+            data.update(fields)
+            self._sessions[session_id] = (expires_at, data)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_expired(self, now: float) -> list:
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return expired
+
+
+class SQLiteSessionBackend:
+    """
+    Sessions persisted in SQLite, one row per artifact so updating a field doesn't
+    rewrite the whole session. Values are pickled so loads skip pydantic validation.
+    """
+
+    # Calls do SQLite I/O, so SessionStore runs them in a thread
+    blocking = True
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_fields ("
+                "session_id TEXT NOT NULL, field TEXT NOT NULL, value BLOB NOT NULL, "
+                "PRIMARY KEY (session_id, field))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def load(self, session_id: str, now: float) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[0] <= now:
+                return None
+            rows = self._conn.execute(
+                "SELECT field, value FROM session_fields WHERE session_id = ?", (session_id,)
+            ).fetchall()
+        return {field: pickle.loads(value) for field, value in rows}
+
+    def save(self, session_id: str, fields: dict, expires_at: float) -> None:
+        rows = [(session_id, field, pickle.dumps(value)) for field, value in fields.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (session_id, expires_at) VALUES (?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET expires_at = excluded.expires_at",
+                    (session_id, expires_at),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO session_fields (session_id, field, value) VALUES (?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_fields WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def evict_expired(self, now: float) -> list:
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE expires_at <= ?", (now,)
+            ).fetchall()]
+            if expired:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("DELETE FROM session_fields WHERE session_id = ?", [(sid,) for sid in expired])
+                self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(sid,) for sid in expired])
+                self._conn.execute("COMMIT")
+        return expired
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SessionStore:
+    """
+    Server-side storage for a student's pipeline artifacts, addressed by session_id.
+    Every read or write slides the session's expiry forward by `ttl` seconds.
+    """
+
+    def __init__(self, backend, ttl: float = SESSION_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {"created": 0, "hits": 0, "misses": 0, "evicted": 0}
+        self._expiry_listeners: List[Callable[[str], None]] = []
+
+    def add_expiry_listener(self, listener: Callable[[str], None]) -> None:
+        """
+        Call `listener(session_id)` when a session is found expired, is evicted or is deleted.
+        Listeners run on the event loop thread, so they may cancel tasks.
+        """
+        self._expiry_listeners.append(listener)
+
+    def _notify_expired(self, session_ids) -> None:
+        for session_id in session_ids:
+            for listener in self._expiry_listeners:
+                try:
+                    listener(session_id)
+                except Exception as e:
+                    logger.warning(f"Session expiry listener failed for {session_id}: {str(e)}")
+
+    async def _call(self, method, *args):
+        """
+        Run a backend call, in a worker thread if the backend blocks on I/O.
+        """
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def create(self, **fields) -> str:
+        session_id = uuid.uuid4().hex
+        await self._call(self.backend.save, session_id, fields, time.time() + self.ttl)
+        self.stats["created"] += 1
+        return session_id
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        data = await self._call(self.backend.load, session_id, now)
+        if data is None:
+            self.stats["misses"] += 1
+            self._notify_expired([session_id])
+            return None
+        self.stats["hits"] += 1
+        # Slide the expiry without rewriting any artifacts
+        await self._call(self.backend.save, session_id, {}, now + self.ttl)
+        return data
+
+    async def update(self, session_id: str, **fields) -> None:
+        await self._call(self.backend.save, session_id, fields, time.time() + self.ttl)
+
+    async def delete(self, session_id: str) -> None:
+        await self._call(self.backend.delete, session_id)
+        self._notify_expired([session_id])
+
+    def evict_expired(self) -> list:
+        expired = self.backend.evict_expired(time.time())
+        self.stats["evicted"] += len(expired)
+        return expired
+
+    async def run_eviction(self, interval: float = SESSION_EVICT_INTERVAL) -> None:
+        """
+        Periodically drop expired sessions; run as a background task for the app's lifetime.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                expired = await asyncio.to_thread(self.evict_expired)
+                if expired:
+                    logger.info(f"Evicted {len(expired)} expired sessions")
+                    self._notify_expired(expired)
+            except Exception as e:
+                logger.warning(f"Session eviction failed: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "backend": type(self.backend).__name__, "ttl": self.ttl}
+
+
+def create_session_store() -> SessionStore:
+    if SESSION_BACKEND == "sqlite":
+        return SessionStore(SQLiteSessionBackend(SESSION_DB_PATH))
+    return SessionStore(MemorySessionBackend())
+
+
+session_store = create_session_store()
@@ -0,0 +1,167 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from content_generation import generate_topic_content, topic_key, outline_key
+
+logger = logging.getLogger(__name__)
+
+# Speculative content settings
+SPECULATIVE_CONTENT_DEFAULT = os.getenv("CRAMPLAN_SPECULATIVE_CONTENT", "false").lower() in ("1", "true", "yes")
+SPECULATION_MAX_SESSIONS = int(os.getenv("CRAMPLAN_SPECULATION_MAX_SESSIONS", "20"))
+SPECULATION_MAX_TOPICS = int(os.getenv("CRAMPLAN_SPECULATION_MAX_TOPICS", "8"))
+SPECULATION_CONCURRENCY = int(os.getenv("CRAMPLAN_SPECULATION_CONCURRENCY", "4"))
+# How long finished sections wait to be claimed before they are dropped
+SPECULATION_IDLE_TTL = float(os.getenv("CRAMPLAN_SPECULATION_IDLE_TTL", "600"))
+
+
+class ContentSpeculator:
+    """
+    Pre-generates per-topic content for a session while the student takes the quiz.
+
+    Work is capped three ways: at most `max_sessions` sessions have sections in flight
+    at once, each on at most `max_topics` topics, and at most `concurrency` speculative
+    agent calls run at a time across all sessions. A session stops counting toward the
+    cap once its sections are done; done sections nobody claims within `idle_ttl` are
+    dropped. Sections that curation drops, and everything left when a session expires,
+    are cancelled.
+
+    Sections are matched to the topics they are claimed for by normalized title and
+    subtopics (outline_key()), since curation usually rewrites a topic's description.
+    A topic whose subtopics changed gets a fresh section instead of one written for
+    the old outline.
+    """
+
+    def __init__(self, max_sessions: int = SPECULATION_MAX_SESSIONS, max_topics: int = SPECULATION_MAX_TOPICS,
+                 concurrency: int = SPECULATION_CONCURRENCY, idle_ttl: float = SPECULATION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.max_topics = max_topics
+        self.concurrency = max(1, concurrency)
+        self.idle_ttl = idle_ttl
+        # Per session: sections by outline_key(), and when the session last did anything
+        self._sessions: Dict[str, Dict[str, asyncio.Task]] = {}
+        self._touched: Dict[str, float] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {"started": 0, "reused": 0, "wasted": 0, "rejected": 0, "expired": 0}
+
+    async def _generate(self, topic, bucket: Optional[str] = None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await generate_topic_content(topic, bucket)
+
+    def _retrieve(self, key: str):
+        def done(task: asyncio.Task) -> None:
+            # Failures are only reported to whoever claims the section
+            if not task.cancelled():
+                task.exception()
+            if key in self._touched:
+                self._touched[key] = time.monotonic()
+        return done
+
+    def _in_flight(self, tasks: Dict[str, asyncio.Task]) -> bool:
+        return any(not task.done() for task in tasks.values())
+
+    def _expire_idle(self) -> None:
+        """
+        Drop sessions whose sections are all done and have gone unclaimed for idle_ttl.
+        """
+        cutoff = time.monotonic() - self.idle_ttl
+        for key in [key for key, tasks in self._sessions.items()
+                    if self._touched[key] <= cutoff and not self._in_flight(tasks)]:
+            self.stats["expired"] += 1
+            self.discard(key)
+
+    def active_sessions(self) -> int:
+        """
+        Sessions holding a slot: those with sections still being generated.
+        """
+        return sum(1 for tasks in self._sessions.values() if self._in_flight(tasks))
+
+    def start(self, key: str, topics: List, buckets: Optional[Dict[str, Optional[str]]] = None) -> int:
+        """
+        Start generating content for `topics` under `key` (a session id); returns how many
+        topics are being speculated on. `buckets` (by topic_key()) pitches each section at
+        the student's understanding when the scores are already known.
+        """
+        self._expire_idle()
+        buckets = buckets or {}
+        if key in self._sessions:
+            return len(self._sessions[key])
+        active = self.active_sessions()
+        if active >= self.max_sessions:
+            self.stats["rejected"] += 1
+            logger.info(f"Not speculating for {key}: {active} sessions already speculating")
+            return 0
+        tasks = {}
+        for topic in topics[:self.max_topics]:
+            okey = outline_key(topic)
+            if okey in tasks:
+                continue
+            task = asyncio.create_task(self._generate(topic, buckets.get(topic_key(topic))))
+            task.add_done_callback(self._retrieve(key))
+            tasks[okey] = task
+        self._sessions[key] = tasks
+        self._touched[key] = time.monotonic()
+        self.stats["started"] += len(tasks)
+        logger.info(f"Speculating on content for {len(tasks)} topics for {key}")
+        return len(tasks)
+
+    def _cancel(self, tasks) -> None:
+        for task in tasks:
+            self.stats["wasted"] += 1
+            if not task.done():
+                task.cancel()
+
+    def retain(self, key: str, topics: List) -> None:
+        """
+        Keep only the sections whose topic and subtopics are still in `topics` (e.g. after curation).
+        """
+        tasks = self._sessions.get(key)
+        if not tasks:
+            return
+        self._touched[key] = time.monotonic()
+        wanted = {outline_key(topic) for topic in topics}
+        dropped = [okey for okey in tasks if okey not in wanted]
+        self._cancel(tasks.pop(okey) for okey in dropped)
+
+    def claim(self, key: str, topics: List) -> Dict[str, asyncio.Task]:
+        """
+        Hand over the sections matching `topics` to the caller, keyed by the topic_key()
+        of the topic each is claimed for, and cancel the rest.
+        """
+        tasks = self._sessions.pop(key, None) or {}
+        self._touched.pop(key, None)
+        claimed = {}
+        for topic in topics:
+            task = tasks.pop(outline_key(topic), None)
+            if task is not None:
+                claimed[topic_key(topic)] = task
+        self._cancel(tasks.values())
+        self.stats["reused"] += len(claimed)
+        return claimed
+
+    def discard(self, key: str) -> None:
+        """
+        Cancel whatever is left for `key`; used as a session expiry listener.
+        """
+        tasks = self._sessions.pop(key, None)
+        self._touched.pop(key, None)
+        if tasks:
+            logger.info(f"Discarding {len(tasks)} speculative sections for {key}")
+            self._cancel(tasks.values())
+
+    def shutdown(self) -> None:
+        for key in list(self._sessions):
+            self.discard(key)
+
+    def get_stats(self) -> dict:
+        self._expire_idle()
+        in_flight = sum(1 for tasks in self._sessions.values() for task in tasks.values() if not task.done())
+        return {**self.stats, "sessions": len(self._sessions), "active_sessions": self.active_sessions(),
+                "in_flight": in_flight}
+
+
+content_speculator = ContentSpeculator()
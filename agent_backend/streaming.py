@@ -0,0 +1,133 @@
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from schemas import ContentTopic
+from agent_runner import stream_agent
+from content_generation import topic_content_prompt, topic_key, CONTENT_CONCURRENCY, CONTENT_TOPIC_RETRIES, CONTENT_RETRY_BASE_DELAY
+from llm_limiter import LLMOverloaded, is_final
+from deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Stop nginx from buffering the stream
+}
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Format one Server-Sent Event. Pydantic models are serialized with model_dump.
+    """
+    if hasattr(data, "model_dump"):
+        data = data.model_dump()
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def error_event(error: Exception, detail: str) -> tuple:
+    """
+    The (event, data) ending a failed stream: `overloaded` (with retry_after) when the LLM
+    limiter turned the work away, `deadline_exceeded` past the request deadline, else `error`.
+    """
+    if isinstance(error, LLMOverloaded):
+        return "overloaded", {"detail": detail, "retry_after": error.retry_after}
+    if isinstance(error, DeadlineExceeded):
+        return "deadline_exceeded", {"detail": detail}
+    return "error", {"detail": detail}
+
+
+class SubtopicTracker:
+    """
+    Attribute streamed JSON text deltas to subtopics.
+
+    The structured output is streamed as JSON, so the current subtopic index is the
+    number of "sub_topic_title" keys seen so far minus one (None while the model is
+    still writing the main description).
+    """
+
+    MARKER = '"sub_topic_title"'
+
+    def __init__(self):
+        self.count = 0
+        self._tail = ""
+
+    def feed(self, delta: str) -> Optional[int]:
+        text = self._tail + delta
+        self.count += text.count(self.MARKER)
+        # Keep enough of the end to catch a marker split across deltas
+        self._tail = text[-(len(self.MARKER) - 1):]
+        return self.count - 1 if self.count else None
+
+
+async def stream_content_events(topics: List, concurrency: Optional[int] = None,
+                                buckets: Optional[Dict[str, Optional[str]]] = None, words: Optional[int] = None):
+    """
+    Generate content for each topic concurrently and yield (event, data) tuples:
+    topic_started, delta (with topic_index/subtopic_index), topic_retry,
+    topic_finished and finally content (the validated ContentTopic) or an error_event().
+    `buckets` and `words` are as for generate_content_parallel.
+    """
+    buckets = buckets or {}
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, concurrency or CONTENT_CONCURRENCY))
+    sections = [None] * len(topics)
+    errors = []
+
+    async def produce(index, topic):
+        try:
+            async with semaphore:
+                await queue.put(("topic_started", {"topic_index": index, "topic": topic.topic}))
+                prompt = topic_content_prompt(topic, buckets.get(topic_key(topic)), words)
+                attempt = 0
+                while True:
+                    tracker = SubtopicTracker()
+                    try:
+                        async for kind, payload in stream_agent("topic_content_writer_agent", prompt):
+                            if kind == "delta":
+                                await queue.put(("delta", {
+                                    "topic_index": index,
+                                    "subtopic_index": tracker.feed(payload),
+                                    "text": payload,
+                                }))
+                            elif kind == "final":
+                                sections[index] = payload
+                        break
+                    except (asyncio.CancelledError, DeadlineExceeded):
+                        raise
+                    except Exception as e:
+                        if attempt >= CONTENT_TOPIC_RETRIES or is_final(e):
+                            raise
+                        attempt += 1
+                        logger.warning(f"Streaming content failed for topic '{topic.topic}': {str(e)}; retrying")
+                        # Clients should discard deltas already received for this topic
+                        await queue.put(("topic_retry", {"topic_index": index, "attempt": attempt}))
+                        await asyncio.sleep(CONTENT_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+                await queue.put(("topic_finished", {"topic_index": index, "section": sections[index].model_dump()}))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Streaming content failed for topic '{topic.topic}': {str(e)}", exc_info=True)
+            errors.append(e)
+            await queue.put(("topic_failed", {"topic_index": index, "detail": str(e)}))
+        finally:
+            queue.put_nowait(None)
+
+    tasks = [asyncio.create_task(produce(i, topic)) for i, topic in enumerate(topics)]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+                continue
+            yield item
+        if errors:
+            yield error_event(errors[0], f"Content generation failed for {len(errors)} topic(s): {str(errors[0])}")
+        else:
+            yield "content", ContentTopic(topic=sections)
+    finally:
+        # Client disconnected or the stream finished early: stop outstanding work
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# The backend's modules import each other by bare name, as when run from agent_backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep caches, the question bank and sessions out of the working tree, never call OpenAI,
+# and don't spawn render workers at startup
+os.environ.setdefault("CRAMPLAN_CACHE_DIR", tempfile.mkdtemp(prefix="cramplan-tests-"))
+os.environ.setdefault("OPENAI_API_KEY", "test-not-used")
+os.environ.setdefault("OPENAI_AGENTS_DISABLE_TRACING", "1")
+os.environ.setdefault("CRAMPLAN_RENDER_WARM_UP", "false")
@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+
+import cache as cache_module
+from cache import MemoryLRU, DiskStore, TieredCache
+
+
+def test_memory_lru_evicts_least_recently_used():
+    memory = MemoryLRU(max_entries=2)
+    memory.set("a", 1)
+    memory.set("b", 2)
+    assert memory.get("a") == 1  # a is now the most recently used
+    memory.set("c", 3)
+    assert memory.get("b") is None
+    assert memory.get("a") == 1
+    assert memory.get("c") == 3
+
+
+def test_memory_lru_evicts_to_fit_max_bytes():
+    memory = MemoryLRU(max_entries=10, max_bytes=10)
+    memory.set("a", b"x" * 4)
+    memory.set("b", b"x" * 4)
+    memory.set("c", b"x" * 4)
+    assert memory.get("a") is None
+    assert memory.total_bytes == 8
+    # A value larger than the whole tier is not stored at all
+    memory.set("huge", b"x" * 11)
+    assert memory.get("huge") is None
+    assert len(memory) == 2
+
+
+def test_disk_store_expires_entries_after_ttl(tmp_path):
+    disk = DiskStore(str(tmp_path), ttl=60, max_bytes=1024)
+    disk.set("key", b"value")
+    assert disk.get("key") == b"value"
+    old = time.time() - 120
+    os.utime(tmp_path / "key.bin", (old, old))
+    assert disk.get("key") is None
+    assert not (tmp_path / "key.bin").exists()
+
+
+def test_disk_store_evicts_least_recently_used_to_fit(tmp_path):
+    disk = DiskStore(str(tmp_path), ttl=0, max_bytes=10)
+    disk.set("a", b"x" * 4)
+    disk.set("b", b"x" * 4)
+    now = time.time()
+    os.utime(tmp_path / "a.bin", (now - 20, now - 20))
+    os.utime(tmp_path / "b.bin", (now - 30, now - 30))
+    assert disk.get("a") is not None  # touched: b is now the least recently used
+    disk.set("c", b"x" * 4)
+    assert disk.get("b") is None
+    assert disk.get("a") is not None
+    assert disk.get("c") is not None
+
+
+def test_tiered_cache_promotes_disk_hits_to_memory(tmp_path):
+    cache = TieredCache("test", MemoryLRU(max_entries=1), DiskStore(str(tmp_path), ttl=0, max_bytes=1 << 20))
+    cache.set("a", {"value": 1})
+    cache.set("b", {"value": 2})  # evicts a from memory; it stays on disk
+    assert cache.memory.get("a") is None
+    assert cache.get("a") == {"value": 1}
+    assert cache.stats["disk_hits"] == 1
+    assert cache.memory.get("a") == {"value": 1}
+    assert cache.get("a") == {"value": 1}
+    assert cache.stats["memory_hits"] == 1
+
+
+def test_tiered_cache_delete_and_corrupt_entries(tmp_path):
+    cache = TieredCache("test", MemoryLRU(max_entries=4), DiskStore(str(tmp_path), ttl=0, max_bytes=1 << 20))
+    cache.set("a", "value")
+    cache.delete("a")
+    assert cache.get("a") is None
+    assert not (tmp_path / "a.bin").exists()
+
+    # An unreadable disk entry counts as a miss and is removed
+    (tmp_path / "bad.bin").write_bytes(b"not a pickle")
+    assert cache.get("bad") is None
+    assert cache.stats["errors"] == 1
+    assert not (tmp_path / "bad.bin").exists()
+
+
+def test_disk_store_only_scans_when_over_budget(tmp_path, monkeypatch):
+    disk = DiskStore(str(tmp_path), ttl=0, max_bytes=100)
+    disk.set("a", b"x" * 10)  # first write counts what's already there
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(cache_module.os, "listdir", lambda path: scans.append(path) or listdir(path))
+    for key in "bcdefghi":
+        disk.set(key, b"x" * 10)
+    disk.set("a", b"x" * 20)  # overwriting replaces the entry's size
+    assert scans == []
+    assert disk.total_bytes == 100
+    disk.set("j", b"x" * 10)
+    assert len(scans) == 1
+    # Eviction leaves headroom so the next writes don't scan again
+    assert disk.total_bytes <= 90
+    disk.delete("j")
+    assert disk.total_bytes == sum(f.stat().st_size for f in tmp_path.iterdir())
+
+
+def test_tiered_cache_clear_empties_both_tiers(tmp_path):
+    cache = TieredCache("test", MemoryLRU(max_entries=4), DiskStore(str(tmp_path), ttl=0, max_bytes=1 << 20))
+    cache.set("a", "value")
+    cache.clear()
+    assert cache.get("a") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_tiered_cache_async_access(tmp_path):
+    cache = TieredCache("test", MemoryLRU(max_entries=1), DiskStore(str(tmp_path), ttl=0, max_bytes=1 << 20))
+
+    async def scenario():
+        await cache.aset("a", {"value": 1})
+        await cache.aset("b", {"value": 2})  # evicts a from memory
+        from_disk = await cache.aget("a")
+        await cache.adelete("a")
+        return from_disk, await cache.aget("a")
+
+    assert asyncio.run(scenario()) == ({"value": 1}, None)
+    assert cache.stats["disk_hits"] == 1
+    assert not (tmp_path / "a.bin").exists()
@@ -0,0 +1,129 @@
+import asyncio
+import uuid
+
+import httpx2
+import pytest
+
+import api
+import content_generation
+import deadline as deadline_module
+from content_generation import generate_content_parallel, topic_key
+from deadline import (Deadline, DeadlineExceeded, content_targets, parse_deadline, skip_curation,
+                      CONTENT_ESTIMATE, CURATE_ESTIMATE, DEGRADED_CONTENT_WORDS, DEGRADED_SUBTOPICS,
+                      SHORT_CONTENT_ESTIMATE)
+from fake_llm import FakeModel, install_fake_model
+from schemas import ContentMain, Topic
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(deadline_module, "time", clock)
+    return clock
+
+
+def test_parse_deadline_prefers_the_query_parameter(clock):
+    assert parse_deadline("30", 10).budget == 10
+    assert parse_deadline("30", None).budget == 30
+    assert parse_deadline(None, None) is None
+    with pytest.raises(ValueError):
+        parse_deadline("soon", None)
+    with pytest.raises(ValueError):
+        parse_deadline(None, 0)
+
+
+def test_deadline_runs_out(clock):
+    deadline = Deadline(10)
+    clock.now += 4
+    assert deadline.remaining() == 6
+    deadline.check("content")
+    clock.now += 6
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded, match="before content"):
+        deadline.check("content")
+
+
+def test_stages_are_cut_as_the_deadline_nears(clock):
+    assert not skip_curation(None)
+    assert content_targets(None) == (None, None, [])
+
+    deadline = Deadline(CURATE_ESTIMATE + CONTENT_ESTIMATE)
+    assert not skip_curation(deadline)
+    assert content_targets(deadline) == (None, None, [])
+
+    clock.now += CURATE_ESTIMATE
+    assert skip_curation(deadline)
+    assert content_targets(deadline) == (None, None, [])
+
+    clock.now += CONTENT_ESTIMATE - SHORT_CONTENT_ESTIMATE
+    assert content_targets(deadline) == (DEGRADED_CONTENT_WORDS, None, ["short_content"])
+
+    clock.now += 1
+    assert content_targets(deadline) == (DEGRADED_CONTENT_WORDS, DEGRADED_SUBTOPICS,
+                                         ["short_content", "fewer_subtopics"])
+
+
+def section(topic, words=None) -> ContentMain:
+    return ContentMain(topic_title=topic.topic, main_description=f"words={words}", subtopics=[])
+
+
+def test_short_content_does_not_reuse_full_length_prefetched_sections(monkeypatch):
+    topics = [Topic(topic=f"Topic {i}", description="About it", subtopics=["A", "B"]) for i in range(2)]
+    generated = []
+
+    async def fake_generate(topic, bucket=None, retries=0, words=None):
+        generated.append((topic.topic, words))
+        return section(topic, words)
+
+    monkeypatch.setattr(content_generation, "generate_topic_content", fake_generate)
+
+    async def scenario():
+        never = asyncio.Event()
+
+        async def full_length(topic):
+            await never.wait()
+            return section(topic)
+
+        prefetched = {topic_key(topic): asyncio.ensure_future(full_length(topic)) for topic in topics}
+        content = await asyncio.wait_for(
+            generate_content_parallel(topics, prefetched=prefetched, words=DEGRADED_CONTENT_WORDS), 5)
+        await asyncio.sleep(0)
+        return content, [future.cancelled() for future in prefetched.values()]
+
+    content, cancelled = asyncio.run(scenario())
+    assert [main.main_description for main in content.topic] == [f"words={DEGRADED_CONTENT_WORDS}"] * 2
+    assert sorted(generated) == [("Topic 0", DEGRADED_CONTENT_WORDS), ("Topic 1", DEGRADED_CONTENT_WORDS)]
+    assert cancelled == [True, True]
+
+
+def test_flow_near_its_deadline_is_degraded(monkeypatch):
+    # Speculation starts full-length sections for the whole outline; none may be used
+    monkeypatch.setattr(api, "SPECULATIVE_CONTENT_DEFAULT", True)
+    flow = {"request": {"subject": f"Deadline test {uuid.uuid4().hex}"},
+            "quiz_submission": {"answers": [{"question_index": 0, "answer": "A"}]}}
+
+    async def scenario():
+        install_fake_model(FakeModel(latency=0, tokens_per_second=0))
+        reused = api.content_speculator.get_stats()["reused"]
+        async with api.lifespan(api.app):
+            transport = httpx2.ASGITransport(app=api.app)
+            async with httpx2.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post("/complete-flow", params={"deadline": SHORT_CONTENT_ESTIMATE - 10},
+                                             json=flow)
+            return response, api.content_speculator.get_stats()["reused"] - reused
+
+    response, reused = asyncio.run(scenario())
+    assert response.status_code == 200
+    result = response.json()
+    assert result["degradations"] == ["skipped_curation", "short_content", "fewer_subtopics"]
+    assert [len(topic["subtopics"]) for topic in result["content"]["topic"]] == \
+        [DEGRADED_SUBTOPICS] * len(result["content"]["topic"])
+    assert reused == 0
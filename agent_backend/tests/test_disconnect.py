@@ -0,0 +1,169 @@
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import api
+import pipeline
+from disconnect import CLIENT_CLOSED_REQUEST, cancel_on_disconnect
+from fake_llm import FakeModel, install_fake_model
+
+
+class FakeRequest:
+    """
+    Just enough of a Request for cancel_on_disconnect: the client goes away once `gone` is set.
+    """
+
+    def __init__(self):
+        self.gone = asyncio.Event()
+        self.url = SimpleNamespace(path="/test")
+
+    async def receive(self):
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+
+def test_returns_the_result_when_the_client_stays():
+    async def scenario():
+        request = FakeRequest()
+
+        async def work():
+            await asyncio.sleep(0)
+            return "done"
+
+        return await cancel_on_disconnect(request, work())
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_disconnect_cancels_the_work_and_answers_499():
+    async def scenario():
+        request = FakeRequest()
+        started = asyncio.Event()
+        cleaned_up = []
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cleaned_up.append(True)
+                raise
+
+        async def leave():
+            await started.wait()
+            request.gone.set()
+
+        asyncio.ensure_future(leave())
+        with pytest.raises(HTTPException) as raised:
+            await cancel_on_disconnect(request, work())
+        return raised.value, cleaned_up
+
+    error, cleaned_up = asyncio.run(scenario())
+    assert error.status_code == CLIENT_CLOSED_REQUEST
+    # The work was cancelled and allowed to clean up before the 499
+    assert cleaned_up == [True]
+
+
+def test_cancelling_the_caller_cancels_the_work_even_after_a_disconnect():
+    async def scenario():
+        request = FakeRequest()
+        started = asyncio.Event()
+        cancelled = []
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        caller = asyncio.ensure_future(cancel_on_disconnect(request, work()))
+        await started.wait()
+        # The server notices the disconnect too and cancels the request before the
+        # caller has seen its own watcher finish
+        request.gone.set()
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+        return list(cancelled)  # before asyncio.run cancels whatever is left
+
+    assert asyncio.run(scenario()) == [True]
+
+
+async def post_flow(body: bytes, disconnect: asyncio.Event) -> int:
+    """
+    POST /complete-flow straight through the ASGI app, disconnecting once `disconnect` is set.
+    """
+    sent = []
+    status = {}
+
+    async def receive():
+        if not sent:
+            sent.append(True)
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/complete-flow", "raw_path": b"/complete-flow", "query_string": b"",
+             "root_path": "", "headers": [(b"content-type", b"application/json"),
+                                          (b"content-length", str(len(body)).encode())],
+             "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80), "app": api.app}
+    await api.app(scope, receive, send)
+    return status.get("code")
+
+
+def test_cancelled_flow_is_checkpointed_and_resumed(monkeypatch):
+    monkeypatch.setattr(api, "SPECULATIVE_CONTENT_DEFAULT", False)
+    subject = f"Disconnect test {uuid.uuid4().hex}"
+    flow = {"request": {"subject": subject}, "quiz_submission": {"answers": [{"question_index": 0, "answer": "A"}]}}
+    key = api.flow_checkpoint_key(api.TopicRequest(**flow["request"]),
+                                   api.QuizSubmission(**flow["quiz_submission"]))
+    calls = {"outline_topics": 0, "write_content": 0}
+    outline_topics = pipeline.outline_topics
+    write_content = pipeline.write_content
+
+    async def counting_outline(*args, **kwargs):
+        calls["outline_topics"] += 1
+        return await outline_topics(*args, **kwargs)
+
+    async def scenario():
+        install_fake_model(FakeModel(latency=0, tokens_per_second=0))
+        content_started = asyncio.Event()
+        never = asyncio.Event()
+
+        async def stalled_content(*args, **kwargs):
+            calls["write_content"] += 1
+            content_started.set()
+            await never.wait()
+
+        monkeypatch.setattr(pipeline, "outline_topics", counting_outline)
+        monkeypatch.setattr(pipeline, "write_content", stalled_content)
+        body = json.dumps(flow).encode()
+        async with api.lifespan(api.app):
+            # The client leaves while content is being written
+            cancelled = await post_flow(body, content_started)
+            checkpoint = api.response_cache.get(key)
+
+            monkeypatch.setattr(pipeline, "write_content", write_content)
+            retried = await post_flow(body, never)
+            return cancelled, checkpoint, retried
+
+    cancelled, checkpoint, retried = asyncio.run(scenario())
+    assert cancelled == CLIENT_CLOSED_REQUEST
+    assert set(checkpoint) == {"topics", "quiz", "understanding", "curated_topics"}
+    assert retried == 200
+    # The retry picked up after the checkpointed stages, then dropped the checkpoint
+    assert calls == {"outline_topics": 1, "write_content": 1}
+    assert api.response_cache.get(key) is None
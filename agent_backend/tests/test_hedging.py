@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+
+from hedging import Hedger, percentile
+
+AGENT = "test_agent"
+
+
+def make_hedger(min_samples: int = 3, delay: float = 0.01, budget_burst: float = 5) -> Hedger:
+    """
+    A hedger for AGENT that already has `min_samples` latencies of `delay` seconds.
+    """
+    hedger = Hedger(agents={AGENT}, pct=95, min_samples=min_samples, min_delay=0, window=10,
+                    budget_ratio=0.05, budget_burst=budget_burst)
+    for _ in range(min_samples):
+        hedger._observe(AGENT, delay)
+    return hedger
+
+
+class Calls:
+    """
+    A call that sleeps for the next of `delays` each time it's made, recording how each attempt ended.
+    """
+
+    def __init__(self, *delays: float):
+        self.delays = list(delays)
+        self.outcomes = []
+
+    async def __call__(self):
+        attempt = len(self.outcomes)
+        self.outcomes.append("started")
+        try:
+            await asyncio.sleep(self.delays[attempt])
+        except asyncio.CancelledError:
+            self.outcomes[attempt] = "cancelled"
+            raise
+        self.outcomes[attempt] = "finished"
+        return attempt
+
+
+def released(log: list):
+    async def admit():
+        return lambda: log.append("released")
+    return admit
+
+
+def test_percentile_is_nearest_rank():
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile(range(1, 101), 95) == 95
+    assert percentile([7], 99) == 7
+
+
+def test_no_hedge_until_enough_latencies_are_known():
+    hedger = make_hedger(min_samples=3)
+    hedger._latencies[AGENT].clear()
+    hedger._observe(AGENT, 0.01)
+    assert hedger.hedge_delay(AGENT) is None
+    calls = Calls(0.05)
+    assert asyncio.run(hedger.run(AGENT, AGENT, calls)) == 0
+    assert calls.outcomes == ["finished"]
+    assert hedger.stats[AGENT]["fired"] == 0
+    # The primary's latency is sampled
+    assert len(hedger._latencies[AGENT]) == 2
+
+
+def test_agents_not_enabled_are_not_hedged():
+    hedger = make_hedger()
+    calls = Calls(0.05)
+    assert asyncio.run(hedger.run("other_agent", AGENT, calls)) == 0
+    assert calls.outcomes == ["finished"]
+    assert hedger.stats == {}
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    hedger = make_hedger()
+    calls = Calls(3600, 0)
+    log = []
+
+    async def scenario():
+        result = await hedger.run(AGENT, AGENT, calls, admit=released(log))
+        await asyncio.sleep(0)
+        return result, list(calls.outcomes)
+
+    result, outcomes = asyncio.run(scenario())
+    assert result == 1
+    assert outcomes == ["cancelled", "finished"]
+    assert log == ["released"]
+    assert hedger.stats[AGENT] == {"calls": 1, "fired": 1, "won": 1, "budget_exhausted": 0, "throttled": 0}
+    assert hedger.budget == pytest.approx(5 - 1)
+    # The cancelled primary counts as at least as slow as it got
+    assert max(hedger._latencies[AGENT]) >= 0.01
+
+
+def test_hedge_loses_to_the_primary_and_gives_back_its_slot():
+    hedger = make_hedger()
+    calls = Calls(0.05, 3600)
+    log = []
+
+    async def scenario():
+        result = await hedger.run(AGENT, AGENT, calls, admit=released(log))
+        await asyncio.sleep(0)
+        return result, list(calls.outcomes), list(log)
+
+    result, outcomes, log = asyncio.run(scenario())
+    assert result == 0
+    assert outcomes == ["finished", "cancelled"]
+    assert log == ["released"]
+    assert hedger.stats[AGENT]["won"] == 0
+
+
+def test_a_failed_hedge_waits_for_the_primary():
+    hedger = make_hedger()
+    outcomes = []
+
+    async def call():
+        if outcomes:
+            outcomes.append("failed")
+            raise ValueError("bad output")
+        outcomes.append("started")
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert asyncio.run(hedger.run(AGENT, AGENT, call)) == "primary"
+    assert outcomes == ["started", "failed"]
+
+
+def test_no_hedge_without_budget():
+    hedger = make_hedger(budget_burst=0)
+    calls = Calls(0.05, 0)
+    admitted = []
+
+    async def admit():
+        admitted.append(True)
+        return lambda: None
+
+    assert asyncio.run(hedger.run(AGENT, AGENT, calls, admit=admit)) == 0
+    assert calls.outcomes == ["finished"]
+    assert admitted == []
+    assert hedger.stats[AGENT]["budget_exhausted"] == 1
+
+
+def test_no_hedge_when_the_limiter_has_no_room():
+    hedger = make_hedger()
+    calls = Calls(0.05, 0)
+
+    async def admit():
+        return None
+
+    assert asyncio.run(hedger.run(AGENT, AGENT, calls, admit=admit)) == 0
+    assert calls.outcomes == ["finished"]
+    assert hedger.stats[AGENT]["throttled"] == 1
+    assert hedger.stats[AGENT]["fired"] == 0
+    # A hedge that wasn't fired doesn't spend the budget
+    assert hedger.budget == 5
+
+
+def test_cancelling_the_caller_cancels_both_calls():
+    hedger = make_hedger()
+    calls = Calls(3600, 3600)
+    log = []
+
+    async def scenario():
+        task = asyncio.ensure_future(hedger.run(AGENT, AGENT, calls, admit=released(log)))
+        while len(calls.outcomes) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        return list(calls.outcomes), list(log)
+
+    outcomes, log = asyncio.run(scenario())
+    assert outcomes == ["cancelled", "cancelled"]
+    assert log == ["released"]
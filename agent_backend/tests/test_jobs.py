@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+
+import jobs
+from jobs import JobManager, JobQueueFull, SUCCEEDED, FAILED, CANCELLED
+
+
+async def wait_until(predicate, timeout: float = 1.0):
+    for _ in range(int(timeout / 0.005)):
+        if predicate():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("condition not reached")
+
+
+def test_higher_priority_runs_first_and_ties_keep_submission_order():
+    async def scenario():
+        manager = JobManager(concurrency=1)
+        manager.start()
+        order = []
+        release = asyncio.Event()
+
+        async def blocker(job):
+            await release.wait()
+
+        def recorder(name):
+            async def run(job):
+                order.append(name)
+            return run
+
+        manager.submit("test", [], blocker)
+        await asyncio.sleep(0)  # the only worker is now busy
+        for name, priority in (("low", 0), ("high", 5), ("mid-1", 1), ("mid-2", 1)):
+            manager.submit("test", [], recorder(name), priority=priority)
+        release.set()
+        await wait_until(lambda: len(order) == 4)
+        await manager.stop()
+        return order
+
+    assert asyncio.run(scenario()) == ["high", "mid-1", "mid-2", "low"]
+
+
+def test_cancel_queued_and_running_jobs():
+    async def scenario():
+        manager = JobManager(concurrency=1)
+        manager.start()
+        started = asyncio.Event()
+        ran = []
+
+        async def long_running(job):
+            started.set()
+            await asyncio.sleep(10)
+
+        async def quick(job):
+            ran.append(job.id)
+
+        running = manager.submit("test", [], long_running)
+        queued = manager.submit("test", [], quick)
+        after = manager.submit("test", [], quick)
+        await started.wait()
+        manager.cancel(queued.id)
+        manager.cancel(running.id)
+        await wait_until(lambda: after.status == SUCCEEDED)
+        await manager.stop()
+        return running, queued, after, ran
+
+    running, queued, after, ran = asyncio.run(scenario())
+    assert running.status == CANCELLED
+    assert queued.status == CANCELLED
+    # The worker survives cancelling its job and goes on with the next one
+    assert ran == [after.id]
+
+
+def test_cancelled_queued_jobs_free_their_queue_place():
+    async def scenario():
+        manager = JobManager(concurrency=1, max_queued=2)
+        manager.start()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def blocker(job):
+            started.set()
+            await release.wait()
+
+        async def quick(job):
+            pass
+
+        manager.submit("test", [], blocker)
+        await started.wait()
+        first = manager.submit("test", [], quick)
+        manager.submit("test", [], quick)
+        with pytest.raises(JobQueueFull):
+            manager.submit("test", [], quick)
+        manager.cancel(first.id)
+        assert manager.get_stats()["queued"] == 1
+        # The cancelled job's place goes to a new submission right away
+        last = manager.submit("test", [], quick)
+        release.set()
+        await wait_until(lambda: last.status == SUCCEEDED)
+        queued = manager.get_stats()["queued"]
+        await manager.stop()
+        return first, queued
+
+    first, queued = asyncio.run(scenario())
+    assert first.status == CANCELLED
+    # Dequeuing the cancelled entry doesn't uncount it a second time
+    assert queued == 0
+
+
+def test_failed_job_records_its_error():
+    async def scenario():
+        manager = JobManager(concurrency=1)
+        manager.start()
+
+        async def broken(job):
+            job.stage_started("render")
+            raise ValueError("render failed")
+
+        job = manager.submit("test", ["render"], broken)
+        await wait_until(lambda: job.status == FAILED)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.error == "render failed"
+    assert job.to_dict()["stages"]["render"]["status"] == "running"
+
+
+def test_queue_limit_rejects_with_retry_after():
+    async def scenario():
+        manager = JobManager(concurrency=1, max_queued=2)
+        manager.start()
+        release = asyncio.Event()
+
+        async def blocker(job):
+            await release.wait()
+
+        manager.submit("test", [], blocker)
+        await asyncio.sleep(0)
+        manager.submit("test", [], blocker)
+        manager.submit("test", [], blocker)
+        with pytest.raises(JobQueueFull) as rejected:
+            manager.submit("test", [], blocker)
+        release.set()
+        await manager.stop()
+        return rejected.value
+
+    assert asyncio.run(scenario()).retry_after == jobs.JOB_RETRY_AFTER
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_finished_jobs_are_purged_after_retention(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs, "time", clock)
+
+    async def scenario():
+        manager = JobManager(concurrency=1, retention=60)
+        manager.start()
+        release = asyncio.Event()
+
+        async def quick(job):
+            pass
+
+        async def blocker(job):
+            await release.wait()
+
+        done = manager.submit("test", [], quick)
+        await wait_until(lambda: done.status == SUCCEEDED)
+        unfinished = manager.submit("test", [], blocker)
+        clock.now += 30
+        manager.submit("test", [], quick)
+        kept = done.id in manager.jobs
+        clock.now += 31
+        manager.submit("test", [], quick)
+        purged = done.id not in manager.jobs
+        still_running = unfinished.id in manager.jobs
+        release.set()
+        await manager.stop()
+        return kept, purged, still_running
+
+    assert asyncio.run(scenario()) == (True, True, True)
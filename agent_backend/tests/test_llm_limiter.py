@@ -0,0 +1,173 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import llm_limiter
+from llm_limiter import LLMLimiter, LLMOverloaded, TokenBucket, is_final
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_limiter, "time", clock)
+    return clock
+
+
+def make_limiter(requests_per_minute: float = 60, tokens_per_minute: float = 6000,
+                 admission_timeout: float = 5, max_waiting: int = 2) -> LLMLimiter:
+    limiter = LLMLimiter()
+    limiter.request_bucket = TokenBucket(requests_per_minute)
+    limiter.token_bucket = TokenBucket(tokens_per_minute)
+    limiter.admission_timeout = admission_timeout
+    limiter.max_waiting = max_waiting
+    return limiter
+
+
+AGENT = SimpleNamespace(name="test_agent")
+
+
+def test_bucket_goes_into_debt_and_refills(clock):
+    bucket = TokenBucket(60)  # one token per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    # Reserving into debt returns how long the debt takes to refill
+    assert bucket.reserve(3) == pytest.approx(3.0)
+    clock.now += 4
+    assert bucket.wait_time(1) == pytest.approx(0.0)
+    # Refill never exceeds one minute's worth
+    clock.now += 3600
+    assert bucket.wait_time(60) == 0.0
+    assert bucket.tokens == 60
+
+
+def test_refund_returns_unused_tokens(clock):
+    bucket = TokenBucket(600)
+    bucket.reserve(500)
+    bucket.refund(400)
+    assert bucket.tokens == pytest.approx(500)
+    bucket.refund(-200)
+    assert bucket.tokens == pytest.approx(300)
+
+
+def test_admits_within_budget(clock):
+    limiter = make_limiter()
+
+    async def scenario():
+        async with limiter.admit(AGENT, 100):
+            pass
+
+    asyncio.run(scenario())
+    assert limiter.stats["admitted"] == 1
+    assert limiter.stats["throttled_seconds"] == 0.0
+    assert limiter.request_bucket.tokens == 59
+    assert limiter.token_bucket.tokens == 5900
+
+
+def test_exhausted_budget_is_rejected_with_retry_after(clock):
+    limiter = make_limiter(requests_per_minute=60, tokens_per_minute=600, admission_timeout=5)
+    limiter.token_bucket.reserve(600)
+
+    async def scenario():
+        # 85 tokens at 10 per second: 8.5s away, past the admission timeout
+        async with limiter.admit(AGENT, 85):
+            pass
+
+    with pytest.raises(LLMOverloaded) as raised:
+        asyncio.run(scenario())
+    assert raised.value.retry_after == 9
+    assert limiter.stats["rejected"] == 1
+    # A rejected call doesn't spend any budget or keep its slot
+    assert limiter.token_bucket.tokens == pytest.approx(0)
+    assert not limiter._semaphore(AGENT.name).locked()
+
+
+def test_short_budget_wait_is_throttled_not_rejected(clock, monkeypatch):
+    limiter = make_limiter(requests_per_minute=60, tokens_per_minute=600, admission_timeout=5)
+    limiter.token_bucket.reserve(600)
+    slept = []
+
+    async def fake_sleep(delay):
+        slept.append(delay)
+
+    monkeypatch.setattr(llm_limiter.asyncio, "sleep", fake_sleep)
+
+    async def scenario():
+        async with limiter.admit(AGENT, 20):
+            pass
+
+    asyncio.run(scenario())
+    assert slept == [pytest.approx(2.0)]
+    assert limiter.stats["admitted"] == 1
+    assert limiter.stats["throttled_seconds"] == pytest.approx(2.0)
+
+
+def test_full_wait_list_is_rejected(clock, monkeypatch):
+    monkeypatch.setenv("CRAMPLAN_LLM_CONCURRENCY_TEST_AGENT", "1")
+    limiter = make_limiter(admission_timeout=3.5, max_waiting=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit(AGENT, 1):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert limiter._waiting[AGENT.name] == 1
+        with pytest.raises(LLMOverloaded) as raised:
+            async with limiter.admit(AGENT, 1):
+                pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return raised.value
+
+    error = asyncio.run(scenario())
+    assert error.retry_after == 4
+    assert limiter.stats["rejected"] == 1
+    assert limiter.stats["admitted"] == 2
+
+
+def test_retry_after_is_rounded_up_to_whole_seconds():
+    assert LLMOverloaded("busy", 0.1).retry_after == 1
+    assert LLMOverloaded("busy", 2.0).retry_after == 2
+    assert LLMOverloaded("busy", 2.01).retry_after == 3
+
+
+def test_rejections_are_final():
+    assert is_final(LLMOverloaded("busy", 1))
+    assert not is_final(ValueError("bad output"))
+
+
+def test_extra_requests_are_only_admitted_with_headroom(clock, monkeypatch):
+    monkeypatch.setenv("CRAMPLAN_LLM_CONCURRENCY_TEST_AGENT", "1")
+    limiter = make_limiter(requests_per_minute=60, tokens_per_minute=600)
+
+    async def scenario():
+        release = await limiter.admit_extra(AGENT, 100)
+        # Its slot is taken until released
+        assert await limiter.admit_extra(AGENT, 100) is None
+        release()
+        limiter.token_bucket.reserve(limiter.token_bucket.tokens)
+        # No budget without waiting
+        return release, await limiter.admit_extra(AGENT, 100)
+
+    release, rejected = asyncio.run(scenario())
+    assert release is not None
+    assert rejected is None
+    assert limiter.stats["admitted"] == 1
+    assert limiter.request_bucket.tokens == 59
+    assert not limiter._semaphore(AGENT.name).locked()
@@ -0,0 +1,127 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+import model_router
+from agent_runner import run_agent
+from fake_llm import FakeModel, install_fake_model
+from model_router import ModelRouter
+
+AGENT = SimpleNamespace(name="test_agent", instructions="")
+
+
+class Limiter:
+    def __init__(self):
+        self.charged = []
+
+    async def charge(self, agent, tokens):
+        self.charged.append(agent.name)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = Limiter()
+    monkeypatch.setattr(model_router, "llm_limiter", limiter)
+    return limiter
+
+
+def make_router(slo: float = 0.05, fallback="fast") -> ModelRouter:
+    router = ModelRouter()
+    router._routes[AGENT.name] = {"tier": "quality", "max_tokens": None, "slo": slo, "fallback": fallback}
+    # The "routed agent" a call gets is just its tier
+    router.agent_for = lambda agent, tier: tier
+    return router
+
+
+def tier_delays(**delays):
+    """
+    A Runner.run stand-in that takes `delays[tier]` seconds and records which tiers were called.
+    """
+    calls = []
+
+    async def run(tier, input_prompt):
+        calls.append(tier)
+        delay = delays[tier]
+        if isinstance(delay, BaseException):
+            raise delay
+        await asyncio.sleep(delay)
+        return f"{tier} result"
+
+    return run, calls
+
+
+def test_call_within_slo_stays_on_its_tier(limiter):
+    router = make_router()
+    run, calls = tier_delays(quality=0, fast=0)
+    assert asyncio.run(router.run(run, AGENT, "prompt", "/test")) == ("quality result", "quality")
+    assert calls == ["quality"]
+    assert limiter.charged == []
+    assert router.stats[AGENT.name] == {"served": {"quality": 1}, "slo_misses": 0, "fallbacks": 0}
+
+
+def test_call_past_slo_fails_over_to_the_fallback_tier(limiter):
+    router = make_router(slo=0.05)
+    run, calls = tier_delays(quality=3600, fast=0)
+    assert asyncio.run(router.run(run, AGENT, "prompt", "/test")) == ("fast result", "fast")
+    assert calls == ["quality", "fast"]
+    # The failover is another request against the rate budgets
+    assert limiter.charged == [AGENT.name]
+    assert router.stats[AGENT.name] == {"served": {"fast": 1}, "slo_misses": 1, "fallbacks": 1}
+
+
+def test_other_timeouts_propagate_without_failover(limiter):
+    router = make_router(slo=60)
+    run, calls = tier_delays(quality=TimeoutError("read timeout"), fast=0)
+    with pytest.raises(TimeoutError, match="read timeout"):
+        asyncio.run(router.run(run, AGENT, "prompt", "/test"))
+    assert calls == ["quality"]
+    assert limiter.charged == []
+    assert AGENT.name not in router.stats
+
+
+def test_outer_timeout_is_not_mistaken_for_the_slo(limiter):
+    router = make_router(slo=60)
+    run, calls = tier_delays(quality=3600, fast=0)
+
+    async def scenario():
+        # e.g. the request deadline expiring while the call is on its first tier
+        async with asyncio.timeout(0.05):
+            await router.run(run, AGENT, "prompt", "/test")
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(scenario())
+    assert calls == ["quality"]
+    assert limiter.charged == []
+
+
+def test_without_fallback_a_slow_call_is_only_recorded(limiter):
+    router = make_router(slo=0.01, fallback=None)
+    run, calls = tier_delays(quality=0.05)
+    assert asyncio.run(router.run(run, AGENT, "prompt", "/test")) == ("quality result", "quality")
+    assert calls == ["quality"]
+    assert router.stats[AGENT.name] == {"served": {"quality": 1}, "slo_misses": 1, "fallbacks": 0}
+
+
+def test_unknown_tiers_are_rejected(monkeypatch):
+    monkeypatch.setenv("CRAMPLAN_FALLBACK_TIER_TEST_AGENT", "cheapest")
+    with pytest.raises(ValueError, match="cheapest"):
+        model_router.agent_route(AGENT.name)
+    monkeypatch.setenv("CRAMPLAN_FALLBACK_TIER_TEST_AGENT", "none")
+    assert model_router.agent_route(AGENT.name)["fallback"] is None
+
+
+def test_slow_agent_fails_over_with_the_fake_llm(monkeypatch):
+    agent_name = "main_topic_outline_agent"
+    monkeypatch.setitem(model_router.model_router._routes, agent_name,
+                        {"tier": "quality", "max_tokens": None, "slo": 0.05, "fallback": "fast"})
+    model = FakeModel(latency=0.2, tokens_per_second=0)
+    install_fake_model(model)
+    served = model_router.model_router.stats.get(agent_name, {}).get("served", {}).get("fast", 0)
+
+    topics = asyncio.run(run_agent(agent_name, f"Failover test {uuid.uuid4().hex}"))
+    assert topics.list_of_topics
+    # The first call was cancelled at the SLO and the fallback tier answered
+    assert model.calls == 2
+    assert model_router.model_router.stats[agent_name]["served"]["fast"] == served + 1
@@ -0,0 +1,44 @@
+import asyncio
+from types import SimpleNamespace
+
+import openai_client
+from openai_client import OpenAIClientPool, pool_stats
+
+
+def connection(idle: bool):
+    return SimpleNamespace(is_idle=lambda: idle)
+
+
+def request(queued: bool):
+    return SimpleNamespace(is_queued=lambda: queued)
+
+
+def test_pool_stats_counts_connections_and_requests():
+    pool = SimpleNamespace(connections=[connection(True), connection(False)],
+                           _requests=[request(False), request(True), request(True)])
+    assert pool_stats(pool) == {"connections": 2, "active_connections": 1, "idle_connections": 1,
+                                "active_requests": 1, "queued_requests": 2}
+
+
+def test_stats_leave_out_pool_details_the_pool_does_not_expose(monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_CONNECTIONS", 4)
+    clients = OpenAIClientPool()
+    assert "active_connections" not in clients.get_stats()
+
+    clients._pool = SimpleNamespace(connections=[connection(False)])  # no request list
+    assert pool_stats(clients._pool) is None
+    stats = clients.get_stats()
+    assert "active_connections" not in stats
+    assert stats["connections_opened"] == 0
+
+    clients._pool._requests = [request(False)]
+    assert clients.get_stats()["utilization"] == 0.25
+
+
+def test_real_transport_pool_is_counted():
+    clients = OpenAIClientPool()
+    clients.client
+    stats = clients.get_stats()
+    asyncio.run(clients.aclose())
+    assert stats["connections"] == 0
+    assert stats["queued_requests"] == 0
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+import session_store
+from session_store import SessionStore, MemorySessionBackend, SQLiteSessionBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        backend = MemorySessionBackend()
+    else:
+        backend = SQLiteSessionBackend(str(tmp_path / "sessions.sqlite3"))
+    yield SessionStore(backend, ttl=100)
+    if request.param == "sqlite":
+        backend.close()
+
+
+def test_reads_slide_the_expiry(store, clock):
+    async def scenario():
+        session_id = await store.create(subject="Algebra")
+        clock.now += 80
+        first = await store.get(session_id)
+        clock.now += 80  # 160s after creation, but only 80s after the last read
+        second = await store.get(session_id)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == {"subject": "Algebra"}
+    assert second == {"subject": "Algebra"}
+
+
+def test_updates_merge_fields_and_slide_the_expiry(store, clock):
+    async def scenario():
+        session_id = await store.create(subject="Algebra")
+        clock.now += 80
+        await store.update(session_id, scores={"Vectors": 50.0})
+        clock.now += 80
+        return await store.get(session_id)
+
+    assert asyncio.run(scenario()) == {"subject": "Algebra", "scores": {"Vectors": 50.0}}
+
+
+def test_expired_session_is_gone_and_listeners_are_told(store, clock):
+    expired = []
+    store.add_expiry_listener(expired.append)
+
+    async def scenario():
+        session_id = await store.create(subject="Algebra")
+        clock.now += 101
+        return session_id, await store.get(session_id)
+
+    session_id, data = asyncio.run(scenario())
+    assert data is None
+    assert expired == [session_id]
+    assert store.stats["misses"] == 1
+
+
+def test_eviction_and_delete_notify_listeners(store, clock):
+    expired = []
+    store.add_expiry_listener(expired.append)
+
+    async def scenario():
+        stale = await store.create(subject="Stale")
+        clock.now += 60
+        fresh = await store.create(subject="Fresh")
+        clock.now += 60
+        evicted = store.evict_expired()
+        await store.delete(fresh)
+        return stale, fresh, evicted
+
+    stale, fresh, evicted = asyncio.run(scenario())
+    assert evicted == [stale]
+    assert store.stats["evicted"] == 1
+    # evict_expired runs in a worker thread in run_eviction, which notifies afterwards
+    assert expired == [fresh]
+
+
+def test_failing_listener_does_not_break_the_others(store, clock):
+    notified = []
+
+    def broken(session_id):
+        raise RuntimeError("listener failed")
+
+    store.add_expiry_listener(broken)
+    store.add_expiry_listener(notified.append)
+
+    async def scenario():
+        session_id = await store.create(subject="Algebra")
+        await store.delete(session_id)
+        return session_id
+
+    assert notified == [asyncio.run(scenario())]
+
+
+def test_background_eviction_notifies_listeners(store, clock):
+    expired = []
+    store.add_expiry_listener(expired.append)
+
+    async def scenario():
+        session_id = await store.create(subject="Algebra")
+        clock.now += 101
+        eviction = asyncio.create_task(store.run_eviction(interval=0.01))
+        for _ in range(100):
+            if expired:
+                break
+            await asyncio.sleep(0.01)
+        eviction.cancel()
+        return session_id
+
+    assert expired == [asyncio.run(scenario())]
@@ -0,0 +1,112 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def factory():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", factory) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert calls == 1
+    assert results == ["result"] * 5
+    assert flight.stats == {"executed": 1, "coalesced": 4, "abandoned": 0}
+    assert flight.in_flight == 0
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def factory(value):
+            await asyncio.sleep(0)
+            return value
+
+        return flight, await asyncio.gather(flight.do("a", lambda: factory(1)), flight.do("b", lambda: factory(2)))
+
+    flight, results = asyncio.run(scenario())
+    assert results == [1, 2]
+    assert flight.stats["executed"] == 2
+
+
+def test_cancelled_waiter_leaves_call_running_for_others():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def factory():
+            await release.wait()
+            return "done"
+
+        leaving = asyncio.create_task(flight.do("key", factory))
+        staying = asyncio.create_task(flight.do("key", factory))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return flight, leaving, await staying
+
+    flight, leaving, result = asyncio.run(scenario())
+    assert leaving.cancelled()
+    assert result == "done"
+    assert flight.stats["abandoned"] == 0
+
+
+def test_call_is_cancelled_once_every_waiter_is_gone():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def factory():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("key", factory)) for _ in range(2)]
+        await started.wait()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flight
+
+    flight = asyncio.run(scenario())
+    assert flight.stats["abandoned"] == 1
+    assert flight.in_flight == 0
+
+
+def test_failure_reaches_every_waiter_and_is_not_remembered():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = 0
+
+        async def factory():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0)
+            if attempts == 1:
+                raise ValueError("boom")
+            return "recovered"
+
+        first = await asyncio.gather(flight.do("key", factory), flight.do("key", factory), return_exceptions=True)
+        second = await flight.do("key", factory)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in first)
+    assert second == "recovered"
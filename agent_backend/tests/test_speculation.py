@@ -0,0 +1,160 @@
+import asyncio
+import uuid
+
+import httpx2
+import pytest
+
+import api
+import speculation
+from content_generation import topic_key
+from fake_llm import FakeModel, install_fake_model
+from schemas import Topic
+from speculation import ContentSpeculator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(speculation, "time", clock)
+    return clock
+
+
+def topic(title: str, *subtopics: str, description: str = "About it") -> Topic:
+    return Topic(topic=title, description=description, subtopics=list(subtopics or ("A", "B")))
+
+
+def make_speculator(**kwargs) -> ContentSpeculator:
+    """
+    A speculator whose sections are the topic's title, once `release` is set
+    (immediately when it's None); sections that get cancelled are recorded.
+    """
+    speculator = ContentSpeculator(**{"max_sessions": 2, "max_topics": 8, "concurrency": 4, "idle_ttl": 60, **kwargs})
+    speculator.release = None
+    speculator.cancelled = []
+
+    async def generate(topic, bucket=None):
+        try:
+            if speculator.release is not None:
+                await speculator.release.wait()
+        except asyncio.CancelledError:
+            speculator.cancelled.append(topic.topic)
+            raise
+        return topic.topic
+
+    speculator._generate = generate
+    return speculator
+
+
+def test_claim_reuses_sections_for_rewritten_descriptions():
+    speculator = make_speculator()
+    outline = [topic("Cell Biology", "Organelles", "Membranes"), topic("Genetics")]
+    curated = [topic("cell  biology", "organelles", "Membranes", description="Rewritten by curation")]
+
+    async def scenario():
+        assert speculator.start("session", outline) == 2
+        claimed = speculator.claim("session", curated)
+        return {key: await task for key, task in claimed.items()}, speculator.get_stats()
+
+    claimed, stats = asyncio.run(scenario())
+    # Keyed by the topic it was claimed for, not the one it was started for
+    assert claimed == {topic_key(curated[0]): "Cell Biology"}
+    assert stats["reused"] == 1
+    assert stats["wasted"] == 1
+    assert stats["sessions"] == 0
+
+
+def test_sections_for_changed_subtopics_are_not_claimed():
+    speculator = make_speculator()
+
+    async def scenario():
+        speculator.release = asyncio.Event()
+        speculator.start("session", [topic("Genetics", "Mendel", "DNA")])
+        await asyncio.sleep(0)
+        claimed = speculator.claim("session", [topic("Genetics", "Mendel", "Epigenetics")])
+        await asyncio.sleep(0)
+        return claimed, list(speculator.cancelled)
+
+    claimed, cancelled = asyncio.run(scenario())
+    assert claimed == {}
+    assert cancelled == ["Genetics"]
+    assert speculator.stats["wasted"] == 1
+
+
+def test_retain_cancels_sections_curation_dropped():
+    speculator = make_speculator()
+    outline = [topic("Cells"), topic("Genetics"), topic("Ecology")]
+
+    async def scenario():
+        speculator.release = asyncio.Event()
+        speculator.start("session", outline)
+        await asyncio.sleep(0)
+        speculator.retain("session", [outline[0], outline[2]])
+        await asyncio.sleep(0)
+        cancelled = list(speculator.cancelled)
+        speculator.release.set()
+        claimed = speculator.claim("session", outline)
+        return cancelled, sorted([await task for task in claimed.values()])
+
+    cancelled, claimed = asyncio.run(scenario())
+    assert cancelled == ["Genetics"]
+    assert claimed == ["Cells", "Ecology"]
+
+
+def test_only_sessions_still_generating_count_toward_the_cap():
+    speculator = make_speculator(max_sessions=1)
+
+    async def scenario():
+        speculator.release = asyncio.Event()
+        assert speculator.start("first", [topic("Cells")]) == 1
+        assert speculator.start("second", [topic("Cells")]) == 0
+        speculator.release.set()
+        await asyncio.sleep(0)
+        return speculator.start("second", [topic("Cells")])
+
+    assert asyncio.run(scenario()) == 1
+    assert speculator.stats["rejected"] == 1
+
+
+def test_unclaimed_sections_expire_once_idle(clock):
+    speculator = make_speculator(idle_ttl=60)
+
+    async def scenario():
+        speculator.start("session", [topic("Cells")])
+        await asyncio.sleep(0)
+        clock.now += 59
+        before = speculator.get_stats()["sessions"]
+        clock.now += 1
+        return before, speculator.get_stats()
+
+    before, stats = asyncio.run(scenario())
+    assert before == 1
+    assert stats["sessions"] == 0
+    assert stats["expired"] == 1
+
+
+def test_flow_reuses_speculative_sections(monkeypatch):
+    monkeypatch.setattr(api, "SPECULATIVE_CONTENT_DEFAULT", True)
+    flow = {"request": {"subject": f"Speculation test {uuid.uuid4().hex}"},
+            "quiz_submission": {"answers": [{"question_index": 0, "answer": "A"}]}}
+
+    async def scenario():
+        model = FakeModel(latency=0, tokens_per_second=0)
+        install_fake_model(model)
+        reused = api.content_speculator.get_stats()["reused"]
+        async with api.lifespan(api.app):
+            transport = httpx2.ASGITransport(app=api.app)
+            async with httpx2.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post("/complete-flow", json=flow)
+            return response, api.content_speculator.get_stats()["reused"] - reused
+
+    response, reused = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert reused == len(response.json()["content"]["topic"])